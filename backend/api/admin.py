@@ -1,7 +1,7 @@
 # api/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, OutboundEmail, PriorityRule
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -17,4 +17,19 @@ class CustomUserAdmin(UserAdmin):
         (None, {'fields': ('role',)}),
     )
 
-admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(CustomUser, CustomUserAdmin)
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
+
+class PriorityRuleAdmin(admin.ModelAdmin):
+    list_display = ['pattern', 'priority', 'is_active', 'updated_at']
+    list_editable = ['priority', 'is_active']
+    list_filter = ['priority', 'is_active']
+    search_fields = ['pattern']
+
+admin.site.register(PriorityRule, PriorityRuleAdmin)
@@ -5,16 +5,39 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
-        from django.db.models.signals import post_save
-        from .models import ChatMessage, CustomUser, Grievance
+        from django.db.models.signals import post_delete, post_save, pre_save
+        from .models import ChatMessage, CustomUser, Grievance, PriorityRule
         from .signals import (
             send_chat_notification, 
             send_profile_update_notification, 
-            create_user_conversation
+            create_user_conversation,
+            revoke_chat_access,
+            revoke_chat_access_on_delete,
+            invalidate_websocket_user,
+            decrement_grievance_counters,
+            update_grievance_search_index,
+            remove_grievance_search_index,
+            refresh_priority_rules,
+            detect_new_image_uploads,
+            process_new_image_uploads
         )
-        
-        print("--- ApiConfig.ready() IS RUNNING ---")
-        
+
         post_save.connect(send_chat_notification, sender=ChatMessage)
         post_save.connect(send_profile_update_notification, sender=CustomUser)
-        post_save.connect(create_user_conversation, sender=CustomUser)
\ No newline at end of file
+        post_save.connect(create_user_conversation, sender=CustomUser)
+        post_save.connect(revoke_chat_access, sender=CustomUser)
+        post_delete.connect(revoke_chat_access_on_delete, sender=CustomUser)
+        post_save.connect(invalidate_websocket_user, sender=CustomUser)
+        post_delete.connect(invalidate_websocket_user, sender=CustomUser)
+        post_delete.connect(decrement_grievance_counters, sender=Grievance)
+        post_save.connect(update_grievance_search_index, sender=Grievance)
+        post_delete.connect(remove_grievance_search_index, sender=Grievance)
+        post_save.connect(refresh_priority_rules, sender=PriorityRule)
+        post_delete.connect(refresh_priority_rules, sender=PriorityRule)
+        for model in (Grievance, CustomUser):
+            pre_save.connect(detect_new_image_uploads, sender=model)
+            post_save.connect(process_new_image_uploads, sender=model)
+
+        # Send whatever a previous process left in the outbox (api.mail_queue)
+        from .mail_queue import start_worker_for_server
+        start_worker_for_server()
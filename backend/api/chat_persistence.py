@@ -0,0 +1,373 @@
+# backend/api/chat_persistence.py
+
+"""
+Write-behind persistence for chat messages (CHAT_WRITE_BEHIND = True).
+
+The consumer gets the message's id and timestamp up front from
+prepare_message(), broadcasts straight away, and hands the row to the
+process-wide ChatMessageWriter. The writer thread collects rows for up to
+CHAT_FLUSH_INTERVAL_MS or CHAT_FLUSH_MAX_BATCH rows and inserts them with one
+bulk_create per window.
+
+IDs come from the table's own sequence on PostgreSQL (a block of nextval()s
+per round trip), so pre-assigned ids never collide with other writers. SQLite
+has no sequence; a process-local counter seeded from MAX(id) is used there,
+which is only safe with a single writer process (the development setup).
+
+If a flush fails, the batch is appended to a JSONL file in CHAT_SPOOL_DIR and
+fsync'd; spooled batches are re-inserted with ignore_conflicts on the next
+successful flush and at startup. Because ids are fixed before the first
+attempt, a replay never duplicates a message. Replayed rows were already
+broadcast, so they get no notifications.
+
+A batch the database rejects as data (e.g. a message for a conversation that
+was deleted meanwhile) is retried row by row; only the rows that still fail
+go to dead-<pid>.jsonl in the same directory, with the error, and are never
+retried. Anything else (the database is down) spools the rest of the batch.
+
+bulk_create() does not send post_save, so the writer calls the chat
+notification and read-cursor updates explicitly after each flush.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatMessage, Conversation, ConversationReadCursor
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def write_behind_enabled():
+    return _setting('CHAT_WRITE_BEHIND', False)
+
+
+# --- ID allocation --------------------------------------------------
+
+class MessageIdAllocator:
+    """Hands out ChatMessage ids without a round trip per message."""
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or _setting('CHAT_ID_BLOCK_SIZE', 100)
+        self._ids = []
+        self._next_local = None  # SQLite/other backends: next id to hand out
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Next id, or None when the block is used up and refill() must run."""
+        with self._lock:
+            if self._ids:
+                return self._ids.pop()
+            if self._next_local is not None:
+                value = self._next_local
+                self._next_local += 1
+                return value
+        return None
+
+    def refill(self):
+        """Fetch more ids (database access; call from sync code)."""
+        table = ChatMessage._meta.db_table
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                    [table, self.block_size],
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+            with self._lock:
+                # pop() takes from the end, so keep the lowest id last
+                self._ids = sorted(ids + self._ids, reverse=True)
+            return
+        current = ChatMessage.objects.aggregate(top=Max('id'))['top'] or 0
+        with self._lock:
+            if self._next_local is None:
+                self._next_local = current + 1
+
+
+def next_message_id(allocator):
+    message_id = allocator.take()
+    while message_id is None:
+        allocator.refill()
+        message_id = allocator.take()
+    return message_id
+
+
+# --- Spool ----------------------------------------------------------
+
+def _spool_dir():
+    return _setting('CHAT_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'chat_spool'))
+
+
+def _row_to_json(message):
+    return {
+        'id': message.id,
+        'conversation_id': message.conversation_id,
+        'user_id': message.user_id,
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+
+def _row_from_json(data):
+    return ChatMessage(
+        id=data['id'],
+        conversation_id=data['conversation_id'],
+        user_id=data['user_id'],
+        message=data['message'],
+        timestamp=parse_datetime(data['timestamp']),
+    )
+
+
+def _append_jsonl(name, rows):
+    directory = _spool_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}-{os.getpid()}.jsonl')
+    with open(path, 'a', encoding='utf-8') as fh:
+        for row in rows:
+            fh.write(json.dumps(row) + '\n')
+        fh.flush()
+        os.fsync(fh.fileno())
+    return path
+
+
+def spool(messages):
+    """Durably append a failed batch to this process's spool file."""
+    path = _append_jsonl('chat', [_row_to_json(message) for message in messages])
+    logger.error("Spooled %s chat message(s) to %s", len(messages), path)
+    return path
+
+
+def dead_letter(failures):
+    """Set aside (message, error) pairs the database will never accept."""
+    path = _append_jsonl('dead', [{**_row_to_json(message), 'error': str(error)} for message, error in failures])
+    logger.error("Moved %s unstorable chat message(s) to %s: %s",
+                 len(failures), path, [message.id for message, _ in failures])
+    return path
+
+
+def _bulk_insert(messages, ignore_conflicts=False):
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(messages, ignore_conflicts=ignore_conflicts)
+        # Foreign keys are checked at commit; check now, so a bad row fails
+        # here even when this runs inside an outer transaction
+        connection.check_constraints(table_names=[ChatMessage._meta.db_table])
+
+
+def insert_rows(messages, ignore_conflicts=False):
+    """
+    Insert the batch, falling back to one row at a time if the database
+    rejects it. Returns (inserted, failures) where failures are
+    (message, error) pairs for rows that can never be stored. Errors other
+    than bad data are raised, so the caller can spool and retry.
+    """
+    try:
+        _bulk_insert(messages, ignore_conflicts)
+        return list(messages), []
+    except (IntegrityError, DataError):
+        pass
+    inserted, failures = [], []
+    for message in messages:
+        try:
+            _bulk_insert([message], ignore_conflicts)
+        except (IntegrityError, DataError) as error:
+            failures.append((message, error))
+        else:
+            inserted.append(message)
+    return inserted, failures
+
+
+def replay_spool():
+    """Insert every spooled message; files are removed once their rows are in. Returns the count."""
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(_spool_dir(), 'chat-*.jsonl'))):
+        # Claim the file first so two processes never replay it together.
+        claimed = f'{path}.replaying-{os.getpid()}'
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue
+        try:
+            with open(claimed, encoding='utf-8') as fh:
+                messages = [_row_from_json(json.loads(line)) for line in fh if line.strip()]
+            inserted, failures = insert_rows(messages, ignore_conflicts=True)
+            if failures:
+                dead_letter(failures)
+        except Exception:
+            logger.exception("Replaying %s failed; it will be retried", path)
+            os.rename(claimed, path)
+            continue
+        os.remove(claimed)
+        replayed += len(inserted)
+        logger.info("Replayed %s spooled chat message(s) from %s", len(inserted), path)
+    return replayed
+
+
+# --- Writer ---------------------------------------------------------
+
+def _after_insert(messages):
+    """What post_save would have done: notify recipients, advance sender cursors."""
+    from .signals import send_chat_notification
+
+    conversations = Conversation.objects.in_bulk({m.conversation_id for m in messages})
+    newest = {}
+    for message in messages:
+        message.conversation = conversations[message.conversation_id]
+        send_chat_notification(sender=ChatMessage, instance=message, created=True)
+        key = (message.user_id, message.conversation_id)
+        if key not in newest or (message.timestamp, message.id) > (newest[key].timestamp, newest[key].id):
+            newest[key] = message
+    for (user_id, conversation_id), message in newest.items():
+        ConversationReadCursor.objects.advance(message.user, conversation_id, message)
+
+
+def insert_batch(messages):
+    """Store the batch; unstorable rows are dead-lettered. Returns the rows stored."""
+    inserted, failures = insert_rows(messages)
+    if failures:
+        dead_letter(failures)
+    # The rows are committed; a failure from here on must not spool them again.
+    if inserted:
+        try:
+            _after_insert(inserted)
+        except Exception:
+            logger.exception("Post-insert work failed for %s chat message(s)", len(inserted))
+    return inserted
+
+
+class ChatMessageWriter(threading.Thread):
+    """Daemon thread that bulk-inserts queued messages in short windows."""
+
+    def __init__(self):
+        super().__init__(name='chat-message-writer', daemon=True)
+        self.queue = queue.Queue()
+        self.interval = _setting('CHAT_FLUSH_INTERVAL_MS', 50) / 1000.0
+        self.max_batch = _setting('CHAT_FLUSH_MAX_BATCH', 200)
+        self._pending = 0  # submitted but not yet written or spooled
+        self._pending_changed = threading.Condition()
+        self._has_spool = True  # check for leftovers from a previous run
+
+    def submit(self, message):
+        with self._pending_changed:
+            self._pending += 1
+        self.queue.put(message)
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far has been written (or spooled)."""
+        with self._pending_changed:
+            return self._pending_changed.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def write(self, batch):
+        close_old_connections()
+        try:
+            insert_batch(batch)
+        except Exception:
+            logger.exception("Flushing %s chat message(s) failed; spooling them", len(batch))
+            try:
+                spool(batch)
+                self._has_spool = True
+            except Exception:
+                logger.exception("Could not spool %s chat message(s); they are lost: %s",
+                                 len(batch), [m.id for m in batch])
+            return
+        if self._has_spool:
+            self._has_spool = False
+            try:
+                replay_spool()
+            except Exception:
+                self._has_spool = True
+                logger.exception("Chat spool replay failed")
+
+    def run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self.write(batch)
+            finally:
+                close_old_connections()
+                with self._pending_changed:
+                    self._pending -= len(batch)
+                    self._pending_changed.notify_all()
+
+
+_writer = None
+_allocator = None
+_state_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _state_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = ChatMessageWriter()
+            _writer.start()
+            atexit.register(_writer.flush, 5)
+    return _writer
+
+
+def get_allocator():
+    global _allocator
+    with _state_lock:
+        if _allocator is None:
+            _allocator = MessageIdAllocator()
+    return _allocator
+
+
+def _build_message(message_id, conversation_id, user, text):
+    return ChatMessage(
+        id=message_id,
+        conversation_id=conversation_id,
+        user=user,
+        message=text,
+        timestamp=timezone.now(),
+    )
+
+
+def prepare_message(conversation_id, user, text):
+    """
+    Build an unsaved ChatMessage with its final id and timestamp. May touch
+    the database (to refill the id block), so call it from sync code.
+    """
+    return _build_message(next_message_id(get_allocator()), conversation_id, user, text)
+
+
+def take_prepared_message(conversation_id, user, text):
+    """
+    Like prepare_message() but never touches the database: returns None when
+    the id block is used up and prepare_message() has to refill it.
+    """
+    message_id = get_allocator().take()
+    if message_id is None:
+        return None
+    return _build_message(message_id, conversation_id, user, text)
+
+
+def write_behind(message):
+    get_writer().submit(message)
@@ -1,74 +1,145 @@
 # backend/api/consumers.py
+import asyncio
 import json
-import time # Added for notification consumer example
+import logging
+from urllib.parse import parse_qs
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 # Import models *outside* the async function for clarity
-from .models import Conversation, ChatMessage, CustomUser
+from .models import Conversation, ChatMessage, ConversationReadCursor, CustomUser, NotificationLog
+from .notifications import STAFF_STREAM, targets_for
+from .presence import amark_offline, amark_online
+from .chat_persistence import prepare_message, take_prepared_message, write_behind, write_behind_enabled
+from . import metrics
+
+# Per-connection and per-message detail is DEBUG; see LOGGING in settings
+logger = logging.getLogger(__name__)
+
+
+def chat_message_event(payload):
+    """Group event for one chat message, with the client frame pre-serialized."""
+    return {
+        'type': 'chat_message', # This key calls ChatConsumer.chat_message
+        'frame': json.dumps({
+            'type': 'chat_message', # Let frontend know this is a chat message
+            'payload': payload      # The actual message data
+        }),
+    }
+
+
+def avatar_url(user):
+    """Thumbnail URL for chat avatars, falling back to the original upload."""
+    for field in ('profile_image_thumbnail', 'profile_image'):
+        image = getattr(user, field, None)
+        if image:
+            return image.url
+    return None
+
+class PresenceMixin:
+    """Registers the socket in api.presence from accept() until disconnect."""
+
+    async def mark_online(self):
+        self.presence_registered = True
+        await amark_online(self.user, self.channel_name)
+
+    async def mark_offline(self):
+        if getattr(self, 'presence_registered', False):
+            self.presence_registered = False
+            await amark_offline(self.user, self.channel_name)
+
+
+class ConnectionMetricsMixin:
+    """Counts handshakes (accepted or rejected), disconnects and open sockets in api.metrics."""
+    metrics_label = None
+
+    def accepted(self):
+        self.metrics_accepted = True
+        metrics.ws_connects.inc(self.metrics_label, 'accepted')
+        metrics.ws_open.inc(self.metrics_label)
+
+    async def reject(self):
+        metrics.ws_connects.inc(self.metrics_label, 'rejected')
+        await self.close()
+
+    def closed(self):
+        metrics.ws_disconnects.inc(self.metrics_label)
+        if getattr(self, 'metrics_accepted', False):
+            self.metrics_accepted = False
+            metrics.ws_open.dec(self.metrics_label)
+
+
+class ChatConsumer(ConnectionMetricsMixin, PresenceMixin, AsyncWebsocketConsumer):
+    metrics_label = 'chat'
 
-class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         # Get user from scope (populated by middleware like TokenAuthMiddleware)
         self.user = self.scope.get('user', None)
-        print(f"ChatConsumer: Attempting connect. User from scope: {self.user}") # <-- Debug Log
+        logger.debug("ChatConsumer: connect attempt by %s", self.user)
 
         # Check authentication first
         if not self.user or not self.user.is_authenticated:
-            print("ChatConsumer: User not authenticated. Closing connection.") # <-- Debug Log
-            await self.close()
+            logger.debug("ChatConsumer: user not authenticated, closing")
+            await self.reject()
             return
 
         # Get conversation ID from URL kwargs
         self.conversation_id = self.scope['url_route']['kwargs'].get('conversation_id', None)
-        print(f"ChatConsumer: Conversation ID from URL: {self.conversation_id}") # <-- Debug Log
 
         if not self.conversation_id:
-            print("ChatConsumer: Conversation ID missing in URL. Closing connection.") # <-- Debug Log
-            await self.close()
+            logger.debug("ChatConsumer: conversation id missing in URL, closing")
+            await self.reject()
             return
 
         # Define the group name specific to this conversation
         self.room_group_name = f'chat_{self.conversation_id}'
-        print(f"ChatConsumer: Set room group name: {self.room_group_name}") # <-- Debug Log
+        # Opt-in micro-batching of broadcast frames (see queue_frame)
+        query = parse_qs(self.scope.get('query_string', b'').decode('utf-8'))
+        self.batch_window = 0
+        if query.get('batch', ['0'])[0] == '1':
+            self.batch_window = max(0, getattr(settings, 'CHAT_BATCH_WINDOW_MS', 5)) / 1000.0
+        self.outbox = []
+        self.flush_task = None
 
         # --- Permission Check ---
         # Check if the authenticated user is allowed to join this specific chat conversation.
         try:
-            print("ChatConsumer: Checking permissions...") # <-- Debug Log
             has_permission = await self.check_chat_permissions()
             if not has_permission:
-                print(f"ChatConsumer: Permission DENIED for user {self.user.id} on convo {self.conversation_id}. Closing.") # <-- Debug Log
-                await self.close()
+                logger.info("ChatConsumer: permission denied for user %s on conversation %s", self.user.id, self.conversation_id)
+                await self.reject()
                 return
-            print(f"ChatConsumer: Permission GRANTED for user {self.user.id}.") # <-- Debug Log
-        except Exception as e:
+        except Exception:
             # Catch any unexpected error during the permission check
-            print(f"ChatConsumer: EXCEPTION during permission check: {e}. Closing.") # <-- Debug Log
-            await self.close()
+            logger.exception("ChatConsumer: permission check failed for conversation %s", self.conversation_id)
+            await self.reject()
             return
         # --- End Permission Check ---
 
-        # Join the conversation's channel group
+        # Join the conversation's channel group, plus this user's group so a
+        # role change can revoke the access cached above (chat_access_changed)
+        self.user_group_name = f'chat_user_{self.user.id}'
         try:
-            print(f"ChatConsumer: Adding channel {self.channel_name} to group {self.room_group_name}") # <-- Debug Log
             await self.channel_layer.group_add(
                 self.room_group_name,
                 self.channel_name
             )
-            print("ChatConsumer: Successfully added to group.") # <-- Debug Log
-        except Exception as e:
+            await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        except Exception:
             # Catch errors during group_add (e.g., Redis connection issue)
-            print(f"ChatConsumer: EXCEPTION during group_add: {e}. Closing.") # <-- Debug Log
-            await self.close()
+            logger.exception("ChatConsumer: group_add failed for %s", self.room_group_name)
+            await self.reject()
             return
 
         # Accept the WebSocket connection
-        print("ChatConsumer: Accepting connection.") # <-- Debug Log
         await self.accept()
-        print("ChatConsumer: Connection accepted successfully.") # <-- Debug Log
+        self.accepted()
+        await self.mark_online()
+        logger.debug("ChatConsumer: user %s joined %s", self.user.id, self.room_group_name)
 
     async def disconnect(self, close_code):
-        print(f"ChatConsumer: Disconnecting channel {self.channel_name} from group {getattr(self, 'room_group_name', 'N/A')}") # <-- Debug Log
+        if getattr(self, 'flush_task', None) is not None:
+            self.flush_task.cancel() # the socket is gone; drop anything still held
         # Leave room group - Use getattr for safety in case room_group_name wasn't set (e.g., connect failed early)
         if hasattr(self, 'room_group_name'):
             try:
@@ -76,46 +147,53 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     self.room_group_name,
                     self.channel_name
                 )
-                print("ChatConsumer: Successfully discarded from group.") # <-- Debug Log
-            except Exception as e:
-                # Log errors during group_discard (less critical than connect errors)
-                print(f"ChatConsumer: EXCEPTION during group_discard: {e}") # <-- Debug Log
-        print(f"ChatConsumer: Disconnected with code {close_code}") # <-- Debug Log
+                if hasattr(self, 'user_group_name'):
+                    await self.channel_layer.group_discard(self.user_group_name, self.channel_name)
+            except Exception:
+                # Less critical than connect errors: the group entry expires anyway
+                logger.warning("ChatConsumer: group_discard failed for %s", self.room_group_name, exc_info=True)
+        await self.mark_offline()
+        if getattr(self, 'last_sent_message', None) is not None:
+            try:
+                await self.advance_read_cursor()
+            except Exception:
+                logger.exception("ChatConsumer: could not advance read cursor for user %s", self.user.id)
+        self.closed()
+        logger.debug("ChatConsumer: disconnected with code %s", close_code)
 
     async def receive(self, text_data):
-        print(f"ChatConsumer: Received raw data: {text_data}") # <-- Debug Log
         try:
             # Attempt to parse the incoming JSON data
             data = json.loads(text_data)
+            if data.get('type') == 'heartbeat':
+                await self.mark_online() # Keeps this socket in the presence registry
+                return
+            metrics.ws_messages_received.inc('chat')
             # Expecting a structure like {'message': 'The message text'}
             message_text = data.get('message', None)
 
             # Validate the message content
             if not message_text or not isinstance(message_text, str) or not message_text.strip():
-                print("ChatConsumer: Received invalid or empty message content.") # <-- Debug Log
+                logger.debug("ChatConsumer: invalid or empty message from user %s", self.user.id)
                 # Optionally send an error back to the client
                 await self.send(text_data=json.dumps({'type': 'error', 'message': 'Invalid message content.'}))
                 return
 
-            print(f"ChatConsumer: Parsed message: '{message_text.strip()}'") # <-- Debug Log
-
             # Save the message to the database asynchronously
-            print("ChatConsumer: Attempting to save message...") # <-- Debug Log
-            saved_message_info = await self.save_message(message_text.strip()) # Use strip() to remove leading/trailing whitespace
+            saved_message_info = await self.persist_message(message_text.strip()) # Use strip() to remove leading/trailing whitespace
 
             # Check if saving was successful
             if not saved_message_info:
-                 print("ChatConsumer: Failed to save message (save_message returned None).") # <-- Debug Log
                  await self.send(text_data=json.dumps({'type': 'error', 'message': 'Failed to save message.'}))
                  return
-            print(f"ChatConsumer: Message saved (ID: {saved_message_info['id']}).") # <-- Debug Log
 
             # Prepare user data for the broadcast payload
             user_data = {
                 'id': self.user.id,
                 'name': self.user.name or self.user.username, # Use name, fallback to username
                  # Safely get profile image URL - check if image field exists and has a value
-                 'profile_image': self.user.profile_image.url if hasattr(self.user, 'profile_image') and self.user.profile_image else None
+                 # Prefer the small avatar rendition once it has been generated
+                 'profile_image': avatar_url(self.user)
             }
 
             # Prepare the full payload structure expected by the frontend
@@ -127,44 +205,76 @@ class ChatConsumer(AsyncWebsocketConsumer):
             }
 
             # Send the message to the room group (broadcast)
-            print(f"ChatConsumer: Broadcasting message to group {self.room_group_name}") # <-- Debug Log
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message', # This key calls the 'chat_message' method below
-                    'payload': broadcast_payload # Send the structured data
-                }
-            )
-            print("ChatConsumer: Broadcast sent.") # <-- Debug Log
+            with metrics.channel_layer_send_seconds.time('chat'):
+                await self.channel_layer.group_send(self.room_group_name, chat_message_event(broadcast_payload))
+            metrics.ws_messages_broadcast.inc('chat')
+            logger.debug("ChatConsumer: message %s broadcast to %s", saved_message_info['id'], self.room_group_name)
 
         # Handle potential errors during receive
         except json.JSONDecodeError:
-            print("ChatConsumer: Received invalid JSON.") # <-- Debug Log
+            logger.debug("ChatConsumer: invalid JSON from user %s", self.user.id)
             await self.send(text_data=json.dumps({'type': 'error', 'message': 'Invalid JSON format.'}))
         except KeyError as e:
-             print(f"ChatConsumer: Received JSON missing expected key: {e}") # <-- Debug Log
              await self.send(text_data=json.dumps({'type': 'error', 'message': f"JSON missing '{e}' key."}))
-        except Exception as e:
+        except Exception:
              # Catch any other unexpected errors during processing
-             print(f"ChatConsumer: EXCEPTION during receive: {e}") # <-- Debug Log
+             logger.exception("ChatConsumer: error handling a message from user %s", self.user.id)
              await self.send(text_data=json.dumps({'type': 'error', 'message': 'An internal error occurred while processing your message.'}))
 
 
     # Method called when a message is received from the channel group layer
     async def chat_message(self, event):
-        payload = event.get('payload', None)
-        print(f"ChatConsumer: Handling broadcast event. Payload: {payload}") # <-- Debug Log
-        if payload:
+        # The sender serialized the frame once for every socket in the group
+        frame = event.get('frame')
+        if frame is None and event.get('payload'):
+            frame = chat_message_event(event['payload'])['frame']
+        if frame:
+            if self.batch_window:
+                await self.queue_frame(frame)
+                return
             # Send the structured payload to the WebSocket client
-            print("ChatConsumer: Sending message payload to client.") # <-- Debug Log
-            await self.send(text_data=json.dumps({
-                'type': 'chat_message', # Let frontend know this is a chat message
-                'payload': payload      # The actual message data
-            }))
-            print("ChatConsumer: Message payload sent to client.") # <-- Debug Log
+            await self.send(text_data=frame)
         else:
              # This shouldn't happen if group_send is always correct
-             print("ChatConsumer: Received chat_message event with missing payload.") # <-- Debug Log
+             logger.warning("ChatConsumer: chat_message event without a frame or payload")
+
+    # --- Batched delivery (?batch=1) ---
+    # Frames are held for CHAT_BATCH_WINDOW_MS and sent as one JSON array
+    # frame, joined as text so nothing is serialized again.
+
+    async def queue_frame(self, frame):
+        self.outbox.append(frame)
+        if len(self.outbox) >= getattr(settings, 'CHAT_BATCH_MAX_EVENTS', 50):
+            await self.flush_outbox()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_outbox_later())
+
+    async def flush_outbox_later(self):
+        await asyncio.sleep(self.batch_window)
+        self.flush_task = None
+        await self.flush_outbox()
+
+    async def flush_outbox(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        frames, self.outbox = self.outbox, []
+        if frames:
+            await self.send(text_data='[' + ','.join(frames) + ']')
+
+    # Sent to chat_user_<id> by signals.revoke_chat_access when the user's role
+    # or active flag changes; re-checks the access cached at connect time.
+    async def chat_access_changed(self, event):
+        self.user.role = event.get('role', self.user.role)
+        self.user.is_active = event.get('is_active', self.user.is_active)
+        if not self.has_cached_access():
+            logger.info("ChatConsumer: access revoked for user %s on conversation %s", self.user.id, self.conversation_id)
+            await self.close(code=4403)
+
+    def has_cached_access(self):
+        if not self.user.is_active:
+            return False
+        return self.user.id == self.conversation_owner_id or self.user.role in ['admin', 'grievance_cell']
 
     # --- Database Operations ---
 
@@ -173,119 +283,203 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """
         Checks if the current user has permission to access the chat.
         Allows the conversation owner and admin/grievance_cell roles.
+        The conversation (with its owner) is cached on the consumer for the
+        life of the socket, so saving messages needs no further lookups.
         Runs in a sync context suitable for Django ORM.
         """
         try:
-            print(f"ChatConsumer DB Check: Looking for Conversation {self.conversation_id}") # <-- Debug Log
             # Fetch the conversation and its related user in one query
             conversation = Conversation.objects.select_related('user').get(id=self.conversation_id)
-            print(f"ChatConsumer DB Check: Found conversation belonging to user ID {conversation.user.id} ({conversation.user.username})") # <-- Debug Log
-
-            # Check if the connected user (self.user) is the owner OR has a privileged role
-            is_owner = self.user.id == conversation.user.id
-            is_privileged = self.user.role in ['admin', 'grievance_cell']
-
-            if is_owner or is_privileged:
-                print(f"ChatConsumer DB Check: Permission GRANTED (User: {self.user.id}, Role: {self.user.role}, Is Owner: {is_owner}, Is Privileged: {is_privileged})") # <-- Debug Log
-                return True
-            else:
-                print(f"ChatConsumer DB Check: Permission DENIED (User: {self.user.id}, Role: {self.user.role}, Is Owner: {is_owner}, Is Privileged: {is_privileged})") # <-- Debug Log
-                return False
+            self.conversation = conversation
+            self.conversation_owner_id = conversation.user_id
+
+            # The connected user (self.user) must be the owner OR have a privileged role
+            allowed = self.has_cached_access()
+            logger.debug(
+                "ChatConsumer: access %s for user %s (role %s) on conversation %s owned by %s",
+                'granted' if allowed else 'denied', self.user.id, self.user.role,
+                self.conversation_id, self.conversation_owner_id,
+            )
+            return allowed
         except Conversation.DoesNotExist:
             # Handle case where the conversation ID is invalid
-            print(f"ChatConsumer DB Check: Conversation {self.conversation_id} DoesNotExist.") # <-- Debug Log
+            logger.debug("ChatConsumer: conversation %s does not exist", self.conversation_id)
             return False
-        except Exception as e:
+        except Exception:
             # Log any other unexpected database errors
-            print(f"ChatConsumer DB Check: EXCEPTION during permission check: {e}") # <-- Debug Log
+            logger.exception("ChatConsumer: permission lookup failed for conversation %s", self.conversation_id)
             return False # Deny permission on unexpected errors
 
+    async def persist_message(self, message_text):
+        """
+        Save the message and return the broadcast details. With
+        CHAT_WRITE_BEHIND the id and timestamp are assigned here and the row is
+        written by the background writer (api.chat_persistence), so the
+        broadcast does not wait for the database.
+        """
+        if not write_behind_enabled():
+            return await self.save_message(message_text)
+        conversation_id = self.conversation.id
+        message = take_prepared_message(conversation_id, self.user, message_text)
+        if message is None:
+            # Id block used up: refilling it needs the database
+            message = await database_sync_to_async(prepare_message)(conversation_id, self.user, message_text)
+        write_behind(message)
+        return {
+            'id': message.id,
+            'message': message.message,
+            'timestamp': message.timestamp.isoformat()
+        }
+
     @database_sync_to_async
     def save_message(self, message_text):
         """
-        Saves a chat message to the database.
+        Saves a chat message to the database: a single INSERT, using the
+        conversation cached by check_chat_permissions.
         Returns a dictionary with message details or None on failure.
         Runs in a sync context suitable for Django ORM.
         """
         try:
-            print(f"ChatConsumer DB Save: Attempting to save message for convo {self.conversation_id} by user {self.user.id} ({self.user.username})") # <-- Debug Log
-            # Fetch the conversation instance to link the message to
-            conversation_instance = Conversation.objects.get(id=self.conversation_id)
             # self.user is the authenticated user instance from the scope
             new_msg = ChatMessage.objects.create(
                 user=self.user,
-                conversation=conversation_instance,
+                conversation=self.conversation,
                 message=message_text
             )
-            print(f"ChatConsumer DB Save: Message saved successfully (ID: {new_msg.id}).") # <-- Debug Log
+            # The sender has read everything up to their own message; the
+            # cursor is moved once, on disconnect, rather than per message
+            self.last_sent_message = new_msg
             # Return details needed for the broadcast payload
             return {
                 'id': new_msg.id,
                 'message': new_msg.message,
                 'timestamp': new_msg.timestamp.isoformat() # Use standard ISO format
             }
-        except Conversation.DoesNotExist:
-             # Handle error if the conversation doesn't exist when trying to save
-             print(f"ChatConsumer DB Save: ERROR - Conversation {self.conversation_id} not found.") # <-- Debug Log
-             return None
-        except Exception as e:
-            # Log any other errors during the database operation
-            print(f"ChatConsumer DB Save: EXCEPTION during message save: {e}") # <-- Debug Log
+        except Exception:
+            # Log any errors during the database operation (e.g. the
+            # conversation was deleted while the socket was open)
+            logger.exception("ChatConsumer: could not save message in conversation %s", self.conversation_id)
             return None
 
+    @database_sync_to_async
+    def advance_read_cursor(self):
+        ConversationReadCursor.objects.advance(self.user, self.conversation.id, self.last_sent_message)
+
 
 # --- NotificationConsumer ---
-# (Using the version from your last code snippet, with added basic logging)
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(ConnectionMetricsMixin, PresenceMixin, AsyncWebsocketConsumer):
+    """
+    Pushes api.notifications events. Every event carries its stream ('user'
+    or 'staff') and sequence number; a client that reconnects with
+    ?seq_user=<n>&seq_staff=<m> first gets the events it missed from
+    NotificationLog, then a {'type': 'resume'} frame with the current
+    sequence numbers, then live events. 'resync' in that frame lists streams
+    whose gap could not be replayed (pruned, or over NOTIFICATION_REPLAY_LIMIT);
+    only those need a full refetch.
+    """
+
+    metrics_label = 'notification'
+
     async def connect(self):
         self.user = self.scope.get('user', None)
-        print(f"NotificationConsumer: Attempting connect. User: {self.user}") # <-- ADDED
+        logger.debug("NotificationConsumer: connect attempt by %s", self.user)
 
         if not self.user or not self.user.is_authenticated:
-            print("NotificationConsumer: User not authenticated. Closing.") # <-- ADDED
-            await self.close()
+            logger.debug("NotificationConsumer: user not authenticated, closing")
+            await self.reject()
             return
 
-        # Define group name based on role or path
-        # Example: Separate group for admins/GC members
-        if self.user.role in ['admin', 'grievance_cell']:
-             self.room_group_name = "admin_notifications" # Specific group for admins
-        else:
-             # Example: Group per user ID (more scalable but requires targeted sending)
-             # self.room_group_name = f"user_{self.user.id}_notifications"
-             # Example: Simple group for all regular users
-             self.room_group_name = f"user_notifications_{self.user.id}" # User-specific seems better for targeted updates
-
+        # Every user gets their own group; staff also join admin_notifications,
+        # so a staff-wide event is one group_send (see api.notifications)
+        targets = targets_for(self.user)
+        self.group_names = [group for _, group in targets]
+        # Client-facing stream names
+        self.stream_names = {stream: 'staff' if stream == STAFF_STREAM else 'user' for stream, _ in targets}
 
-        print(f"NotificationConsumer: Joining group: {self.room_group_name}") # <-- ADDED
         try:
-            await self.channel_layer.group_add(
-                self.room_group_name,
-                self.channel_name
-            )
+            # Join before reading the log, so nothing falls between replay and live
+            for group_name in self.group_names:
+                await self.channel_layer.group_add(group_name, self.channel_name)
             await self.accept()
-            print(f"NotificationConsumer: Connection accepted for group {self.room_group_name}.") # <-- ADDED
-        except Exception as e:
-             print(f"NotificationConsumer: EXCEPTION during group_add/accept: {e}. Closing.") # <-- ADDED
+            self.accepted()
+            await self.mark_online()
+            logger.debug("NotificationConsumer: user %s joined %s", self.user.id, self.group_names)
+        except Exception:
+             logger.exception("NotificationConsumer: group_add/accept failed for user %s", self.user.id)
              await self.close()
+             return
+        await self.replay_missed()
+
+    def requested_seqs(self):
+        """{stream: last seq the client saw} from ?seq_user= / ?seq_staff=."""
+        query = parse_qs(self.scope.get('query_string', b'').decode('utf-8'))
+        seqs = {}
+        for stream, name in self.stream_names.items():
+            try:
+                seqs[stream] = int(query[f'seq_{name}'][0])
+            except (KeyError, ValueError):
+                seqs[stream] = None
+        return seqs
+
+    async def replay_missed(self):
+        heads, missed, resync = await self.load_missed(self.requested_seqs())
+        # Live events up to these seqs are already covered by the replay
+        self.seqs = heads
+        for entry in missed:
+            if entry.exclude_user_id == self.user.id:
+                continue
+            await self.send(text_data=json.dumps({
+                'type': entry.event_type,
+                'payload': entry.payload,
+                'stream': self.stream_names[entry.stream],
+                'seq': entry.seq,
+            }))
+        await self.send(text_data=json.dumps({
+            'type': 'resume',
+            'seqs': {self.stream_names[stream]: seq for stream, seq in heads.items()},
+            'resync': [self.stream_names[stream] for stream in resync],
+        }))
 
+    @database_sync_to_async
+    def load_missed(self, requested):
+        heads = NotificationLog.objects.heads(list(requested))
+        limit = getattr(settings, 'NOTIFICATION_REPLAY_LIMIT', 200)
+        missed, resync = [], []
+        for stream, last_seen in requested.items():
+            if last_seen is None or last_seen >= heads[stream]:
+                continue
+            entries = list(
+                NotificationLog.objects.filter(stream=stream, seq__gt=last_seen, seq__lte=heads[stream])
+                .order_by('seq')[:limit]
+            )
+            complete = bool(entries) and entries[0].seq == last_seen + 1 and entries[-1].seq == heads[stream]
+            if complete:
+                missed.extend(entries)
+            else:
+                resync.append(stream)
+        return heads, missed, resync
 
     async def disconnect(self, close_code):
-        print(f"NotificationConsumer: Disconnecting from group {getattr(self, 'room_group_name', 'N/A')}") # <-- ADDED
-        if hasattr(self, 'room_group_name'):
+        for group_name in getattr(self, 'group_names', []):
              try:
-                await self.channel_layer.group_discard(
-                    self.room_group_name,
-                    self.channel_name
-                )
-             except Exception as e:
-                 print(f"NotificationConsumer: EXCEPTION during group_discard: {e}") # <-- ADDED
-        print(f"NotificationConsumer: Disconnected with code {close_code}") # <-- ADDED
-
-    # Usually notifications are sent *from* the server, not received *to* it via WebSocket
+                await self.channel_layer.group_discard(group_name, self.channel_name)
+             except Exception:
+                 logger.warning("NotificationConsumer: group_discard failed for %s", group_name, exc_info=True)
+        await self.mark_offline()
+        self.closed()
+        logger.debug("NotificationConsumer: disconnected with code %s", close_code)
+
+    # Usually notifications are sent *from* the server; clients only send heartbeats
     async def receive(self, text_data):
-        print(f"NotificationConsumer: Received data (usually not expected): {text_data}") # <-- ADDED
-        pass # Not typically used for server-sent notifications
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict) and data.get('type') == 'heartbeat':
+            await self.mark_online() # Keeps this socket in the presence registry
+            return
+        metrics.ws_messages_received.inc('notification')
+        logger.debug("NotificationConsumer: unexpected client frame from user %s", self.user.id)
 
     # This method is called when a message is sent to the group (e.g., from signals.py)
     # The 'type' in group_send must match this method name ('notify')
@@ -293,15 +487,20 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         message_payload = event.get('payload', {})
         # Use a more descriptive key for the event type coming from the signal
         message_type = event.get('event_type', 'generic_notification')
-        print(f"NotificationConsumer: Handling broadcast event. Type: {message_type}, Payload: {message_payload}") # <-- ADDED
-
+        stream, seq = event.get('stream'), event.get('seq')
+        if seq is not None and stream in self.seqs:
+            if seq <= self.seqs[stream]:
+                return # already sent by replay_missed()
+            self.seqs[stream] = seq
+        if event.get('exclude_user_id') == self.user.id:
+            return # e.g. a staff member's own chat message in admin_notifications
         # Send the structured data to the WebSocket client
-        print("NotificationConsumer: Sending notification payload to client.") # <-- ADDED
         try:
             await self.send(text_data=json.dumps({
                 'type': message_type, # Pass the specific type to the frontend
-                'payload': message_payload
+                'payload': message_payload,
+                'stream': self.stream_names.get(stream),
+                'seq': seq, # Sent back as ?seq_<stream>= on reconnect
             }))
-            print("NotificationConsumer: Notification sent to client.") # <-- ADDED
-        except Exception as e:
-             print(f"NotificationConsumer: EXCEPTION during send: {e}") # <-- ADDED
\ No newline at end of file
+        except Exception:
+             logger.exception("NotificationConsumer: could not send %s to user %s", message_type, self.user.id)
@@ -0,0 +1,130 @@
+# backend/api/exports.py
+
+"""
+Streaming grievance exports.
+
+Rows are read with QuerySet.iterator(chunk_size=...), which uses a
+server-side cursor on PostgreSQL and prefetches comments one chunk at a time,
+and are encoded into output as they are read. Memory use depends on the
+chunk size, not on how many grievances are exported.
+"""
+
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+CSV_COLUMNS = [
+    'id', 'title', 'description', 'status', 'priority', 'created_at', 'updated_at',
+    'submitted_by_id', 'submitted_by_username', 'submitted_by_name', 'submitted_by_email',
+    'assigned_to_id', 'assigned_to_name', 'comment_count', 'comments',
+]
+
+# Encoded rows are grouped so each chunk handed to the server is a few KB
+# rather than one tiny write per grievance.
+ROWS_PER_WRITE = 100
+
+
+def _user_fields(prefix, user):
+    if user is None:
+        return {f'{prefix}_id': None, f'{prefix}_username': None, f'{prefix}_name': None, f'{prefix}_email': None}
+    return {
+        f'{prefix}_id': user.id,
+        f'{prefix}_username': user.username,
+        f'{prefix}_name': user.name,
+        f'{prefix}_email': user.college_email,
+    }
+
+
+def grievance_record(grievance):
+    """Flat dict for one grievance (expects comments and users to be preloaded)."""
+    record = {
+        'id': grievance.id,
+        'title': grievance.title,
+        'description': grievance.description,
+        'status': grievance.status,
+        'priority': grievance.priority,
+        'created_at': grievance.created_at,
+        'updated_at': grievance.updated_at,
+    }
+    record.update(_user_fields('submitted_by', grievance.submitted_by))
+    assigned = _user_fields('assigned_to', grievance.assigned_to)
+    record['assigned_to_id'] = assigned['assigned_to_id']
+    record['assigned_to_name'] = assigned['assigned_to_name']
+    record['comments'] = [
+        {
+            'id': comment.id,
+            'user_id': comment.user_id,
+            'user_name': comment.user.name or comment.user.username,
+            'comment_text': comment.comment_text,
+            'timestamp': comment.timestamp,
+        }
+        for comment in grievance.comments.all()
+    ]
+    record['comment_count'] = len(record['comments'])
+    return record
+
+
+class _Echo:
+    """csv.writer target that hands back each encoded line instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def _batched(lines):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= ROWS_PER_WRITE:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def csv_lines(queryset, chunk_size):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for grievance in queryset.iterator(chunk_size=chunk_size):
+        record = grievance_record(grievance)
+        record['created_at'] = record['created_at'].isoformat()
+        record['updated_at'] = record['updated_at'].isoformat()
+        record['comments'] = json.dumps(record['comments'], cls=DjangoJSONEncoder)
+        yield writer.writerow([record[column] for column in CSV_COLUMNS])
+
+
+def ndjson_lines(queryset, chunk_size):
+    for grievance in queryset.iterator(chunk_size=chunk_size):
+        yield json.dumps(grievance_record(grievance), cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv; charset=utf-8', 'csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson', 'ndjson'),
+}
+
+
+async def _aiter_sync(iterator):
+    # Under ASGI a sync iterator would be buffered in full before sending.
+    # Pull each chunk on the sync thread instead (the same thread every
+    # time, so the database cursor stays on its connection).
+    sentinel = object()
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await step(iterator, sentinel)
+        if chunk is sentinel:
+            break
+        yield chunk
+
+
+def export_response(request, queryset, export_format, chunk_size, filename='grievances'):
+    line_factory, content_type, extension = EXPORT_FORMATS[export_format]
+    content = _batched(line_factory(queryset, chunk_size))
+    if isinstance(request, ASGIRequest):
+        content = _aiter_sync(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
@@ -1,13 +1,15 @@
-import os
-import tempfile
 import logging
+import mimetypes
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 from django.conf import settings
-from io import BytesIO # Use BytesIO to avoid temp files
 
 load_dotenv()
 
@@ -17,114 +19,177 @@ CLIENT_SECRET = os.environ.get('CLIENT_SECRET')
 REFRESH_TOKEN = os.environ.get('REFRESH_TOKEN')
 PARENT_ID = os.environ.get('FOLDER_ID') # Folder ID from .env
 
+# Resumable uploads must send chunks in multiples of 256 KiB
+CHUNK_ALIGNMENT = 256 * 1024
+
 logger = logging.getLogger(__name__)
-_drive_service = None
 
-def get_drive_service():
-    """Authenticates and returns the Drive API service client."""
-    global _drive_service
-    if _drive_service:
-        return _drive_service
+# Credentials are shared (one token refresh for the process); the service
+# object is not thread-safe (httplib2), so each thread builds and keeps its own.
+_credentials = None
+_credentials_lock = threading.Lock()
+_local = threading.local()
+
+# Bounded pool for upload_many(), created on first use; each of its threads
+# uploads with its own service from get_drive_service().
+_executor = None
+_executor_lock = threading.Lock()
 
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def get_credentials():
+    global _credentials
     if not all([CLIENT_ID, CLIENT_SECRET, REFRESH_TOKEN]):
         logger.error("Drive API Error: CLIENT_ID, CLIENT_SECRET, or REFRESH_TOKEN is missing from .env")
         return None
+    with _credentials_lock:
+        if _credentials is None:
+            # The constructor, not from_authorized_user_info(), which always
+            # replaces token_uri with Google's.
+            _credentials = Credentials(
+                token=None,
+                refresh_token=REFRESH_TOKEN,
+                token_uri=_setting('GOOGLE_DRIVE_TOKEN_URI', 'https://oauth2.googleapis.com/token'),
+                client_id=CLIENT_ID,
+                client_secret=CLIENT_SECRET,
+                scopes=SCOPES,
+            )
+    return _credentials
 
-    creds = Credentials.from_authorized_user_info(
-        info={
-            'client_id': CLIENT_ID,
-            'client_secret': CLIENT_SECRET,
-            'refresh_token': REFRESH_TOKEN,
-            'token_uri': 'https://oauth2.googleapis.com/token'
-        },
-        scopes=SCOPES
-    )
-    
-    try:
-        service = build('drive', 'v3', credentials=creds, cache_discovery=False)
-        logger.info("Google Drive service built successfully.")
-        _drive_service = service
+
+def get_drive_service():
+    """Returns this thread's Drive API client, building it on first use."""
+    service = getattr(_local, 'service', None)
+    if service is not None:
         return service
-    except HttpError as error:
-        logger.error(f'Google Drive service build error: {error}')
+
+    creds = get_credentials()
+    if creds is None:
         return None
+    client_options = {}
+    endpoint = _setting('GOOGLE_DRIVE_API_ENDPOINT', None)
+    if endpoint:
+        client_options['api_endpoint'] = endpoint
+    try:
+        # static_discovery uses the discovery document bundled with
+        # google-api-python-client, so building never hits the network.
+        service = build(
+            'drive', 'v3', credentials=creds,
+            static_discovery=True, cache_discovery=False,
+            client_options=client_options or None,
+        )
     except Exception as e:
-        logger.error(f"An unexpected error occurred building Drive service: {e}")
+        logger.error("An unexpected error occurred building Drive service: %s", e)
         return None
+    logger.info("Google Drive service built for thread %s.", threading.current_thread().name)
+    _local.service = service
+    return service
 
-def upload_file_and_get_link(file_object, filename):
+
+def _media_body(file_object, filename, mimetype=None):
     """
-    Uploads a Django UploadedFile, makes public, returns webViewLink.
-    This version avoids temp files by using MediaIoBaseUpload.
+    Stream the upload from where it already is: the temporary file for large
+    Django uploads, the open file object otherwise. Small files go in a
+    single multipart request; larger ones are sent in resumable chunks.
+    """
+    chunk_size = _setting('GOOGLE_DRIVE_CHUNK_SIZE', 8 * 1024 * 1024)
+    chunk_size = max(CHUNK_ALIGNMENT, chunk_size - chunk_size % CHUNK_ALIGNMENT)
+    mimetype = (
+        mimetype or getattr(file_object, 'content_type', None)
+        or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    )
+    size = getattr(file_object, 'size', None)
+    resumable = size is None or size > chunk_size
+
+    if hasattr(file_object, 'temporary_file_path'):
+        return MediaFileUpload(
+            file_object.temporary_file_path(), mimetype=mimetype,
+            chunksize=chunk_size, resumable=resumable,
+        )
+    stream = getattr(file_object, 'file', file_object)
+    stream.seek(0)
+    return MediaIoBaseUpload(stream, mimetype=mimetype, chunksize=chunk_size, resumable=resumable)
+
+
+def upload_media(media_body, filename, parent_id=None):
+    """
+    Create the file and return its metadata ({'id', 'webViewLink'}) in the
+    same request, then make it public unless the folder already is.
     """
     service = get_drive_service()
     if not service:
         logger.error("Cannot upload: Drive service is unavailable.")
         return None
-    if not PARENT_ID:
+    parent_id = parent_id or PARENT_ID
+    if not parent_id:
         logger.error("Cannot upload: FOLDER_ID (PARENT_ID) is not set in .env")
         return None
 
-    file_metadata = {'name': filename, 'parents': [PARENT_ID]}
-    buffer = None
-    
-    try:
-        # Read the file content into a BytesIO buffer
-        file_content = file_object.read()
-        buffer = BytesIO(file_content)
-        
-        media_body = MediaIoBaseUpload(
-            buffer,
-            mimetype=file_object.content_type or 'application/octet-stream',
-            resumable=True
-        )
-        
-        logger.info(f"Uploading '{filename}' ({len(file_content)} bytes) to Drive folder '{PARENT_ID}'.")
-        
-        request = service.files().create(
-            body=file_metadata,
-            media_body=media_body,
-            fields='id' # Get ID first
-        )
-        
+    request = service.files().create(
+        body={'name': filename, 'parents': [parent_id]},
+        media_body=media_body,
+        fields='id,webViewLink',
+    )
+    if media_body.resumable():
         response = None
         while response is None:
-            status, response = request.next_chunk()
-            if status: logger.info(f"Upload progress: {int(status.progress() * 100)}%")
+            status, response = request.next_chunk(num_retries=3)
+            if status: logger.debug("Upload progress for '%s': %d%%", filename, status.progress() * 100)
+    else:
+        response = request.execute(num_retries=3)
 
-        file_id = response.get('id')
-        logger.info(f"File uploaded. ID: {file_id}")
-        if not file_id: return None
+    file_id = response.get('id')
+    logger.info("File '%s' uploaded. ID: %s", filename, file_id)
+    if not file_id:
+        return None
 
-        # Make public (from your generate_public_url function)
+    # GOOGLE_DRIVE_SET_PUBLIC_PERMISSION=False when the folder is already shared
+    # with "anyone with the link": files inherit it and this call can be skipped.
+    if _setting('GOOGLE_DRIVE_SET_PUBLIC_PERMISSION', True):
         try:
-            permission = {'role': 'reader', 'type': 'anyone'}
-            service.permissions().create(fileId=file_id, body=permission).execute()
-            logger.info(f"Public read permission set for {file_id}.")
+            service.permissions().create(
+                fileId=file_id, body={'role': 'reader', 'type': 'anyone'}, fields='id',
+            ).execute(num_retries=3)
         except HttpError as error:
-            logger.error(f"Error setting permissions for {file_id}: {error}")
-            pass # Continue anyway, link might still be accessible
+            logger.error("Error setting permissions for %s: %s", file_id, error)
+            # Continue anyway, link might still be accessible
+    return response
 
-        # Get links (from your generate_public_url function)
-        try:
-            file_meta = service.files().get(
-                fileId=file_id,
-                fields='webViewLink, webContentLink' # Get both links
-            ).execute()
-            
-            # Use webViewLink as it's more reliable for viewing
-            view_link = file_meta.get('webViewLink') 
-            logger.info(f"Returning webViewLink for {file_id}: {view_link}")
-            return view_link
-        except HttpError as error:
-             logger.error(f"Error fetching webViewLink for {file_id}: {error}")
-             return None
 
+def upload_file_and_get_link(file_object, filename):
+    """
+    Uploads a Django UploadedFile (or any seekable file object), makes it
+    public and returns its webViewLink, or None on failure.
+    """
+    try:
+        response = upload_media(_media_body(file_object, filename), filename)
     except HttpError as error:
-        logger.error(f"HTTP error during upload: {error}")
+        logger.error("HTTP error during upload of '%s': %s", filename, error)
         return None
     except Exception as e:
-        logger.error(f"Unexpected error during upload: {e}")
+        logger.error("Unexpected error during upload of '%s': %s", filename, e)
         return None
-    finally:
-         if buffer: buffer.close() # Clean up the buffer
\ No newline at end of file
+    return response.get('webViewLink') if response else None
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting('GOOGLE_DRIVE_UPLOAD_WORKERS', 4),
+                thread_name_prefix='drive-upload',
+            )
+    return _executor
+
+
+def upload_many(files):
+    """
+    Upload several (file_object, filename) pairs concurrently on the shared,
+    bounded upload pool. Returns the links (or None) in input order.
+    """
+    futures = [_get_executor().submit(upload_file_and_get_link, f, name) for f, name in files]
+    return [future.result() for future in futures]
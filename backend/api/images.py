@@ -0,0 +1,256 @@
+# backend/api/images.py
+
+"""
+Image processing pipeline for uploaded evidence and profile images.
+
+When a new file is assigned to one of the PIPELINES source fields, the
+pre_save/post_save receivers in signals.py schedule process_renditions() to
+run after the transaction commits, on a small thread pool (or inline when
+IMAGE_PROCESSING_ASYNC is False). Processing:
+
+  1. validates the file (decodable, within IMAGE_MAX_PIXELS),
+  2. applies the EXIF orientation and re-encodes the original without any
+     metadata (GPS, camera data), downscaling it to IMAGE_MAX_DIMENSION,
+  3. writes fixed-size renditions (IMAGE_RENDITIONS) to their own fields.
+
+Results are written with a conditional UPDATE so a newer upload that landed
+meanwhile is never overwritten, and no model signals fire again. The
+uploaded original is then deleted unless another row still uses the same
+file, so its metadata does not stay on disk.
+"""
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, models, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# model label -> source field -> {rendition name: rendition field}
+PIPELINES = {
+    'api.Grievance': {
+        'evidence_image': {'thumbnail': 'evidence_thumbnail', 'preview': 'evidence_preview'},
+    },
+    'api.CustomUser': {
+        'profile_image': {'thumbnail': 'profile_image_thumbnail', 'preview': 'profile_image_preview'},
+    },
+}
+
+DEFAULT_RENDITIONS = {
+    # (width, height), and whether to centre-crop to exactly that size
+    'thumbnail': {'size': (160, 160), 'crop': True},
+    'preview': {'size': (1024, 1024), 'crop': False},
+}
+
+# Formats the original is re-encoded in; anything else becomes PNG.
+ORIGINAL_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def load_image(fileobj):
+    """Decode and validate an image; raises InvalidImage."""
+    max_pixels = _setting('IMAGE_MAX_PIXELS', 40_000_000)
+    try:
+        probe = Image.open(fileobj)
+        width, height = probe.size
+        if width * height > max_pixels:
+            raise InvalidImage(f'{width}x{height} exceeds the {max_pixels} pixel limit')
+        probe.verify()
+        # verify() leaves the image unusable, so decode again for real.
+        fileobj.seek(0)
+        image = Image.open(fileobj)
+        image.load()
+    except InvalidImage:
+        raise
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e))
+    return image
+
+
+def _flatten(image, keep_alpha):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return image.convert('RGBA') if keep_alpha else _on_white(image.convert('RGBA'))
+    return image.convert('RGB')
+
+
+def _on_white(image):
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def encode_original(image, source_format):
+    """Re-encode without metadata; returns (bytes, extension)."""
+    image_format = source_format if source_format in ORIGINAL_FORMATS else 'PNG'
+    max_dimension = _setting('IMAGE_MAX_DIMENSION', 2560)
+    image = _flatten(image, keep_alpha=image_format != 'JPEG')
+    if max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=85, method=4)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue(), ORIGINAL_FORMATS[image_format]
+
+
+def render(image, spec):
+    image = _flatten(image, keep_alpha=True)
+    size = tuple(spec['size'])
+    if spec.get('crop'):
+        image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    else:
+        image = image.copy()
+        image.thumbnail(size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', quality=_setting('IMAGE_RENDITION_QUALITY', 80), method=4)
+    return buffer.getvalue()
+
+
+def process_renditions(model_label, pk, field_name, source_name):
+    """Process one uploaded image. Safe to call repeatedly or after a newer upload."""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+    source = getattr(instance, field_name)
+    if not source or source.name != source_name:
+        return  # deleted or replaced since this job was scheduled
+
+    source_field = model._meta.get_field(field_name)
+    storage = source_field.storage
+    renditions = PIPELINES[model_label][field_name]
+    specs = _setting('IMAGE_RENDITIONS', DEFAULT_RENDITIONS)
+
+    try:
+        with storage.open(source_name, 'rb') as fh:
+            image = load_image(fh)
+            source_format = image.format
+            image = ImageOps.exif_transpose(image)
+    except InvalidImage as e:
+        logger.warning("Rejecting %s %s.%s (%s): %s", model_label, pk, field_name, source_name, e)
+        cleared = {field_name: None, **{field: None for field in renditions.values()}}
+        if model.objects.filter(pk=pk, **{field_name: source_name}).update(**cleared):
+            _delete_unreferenced(storage, [source_name], keep=())
+        return
+
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    original_bytes, extension = encode_original(image, source_format)
+    created = {
+        field_name: storage.save(source_field.generate_filename(instance, stem + extension), ContentFile(original_bytes))
+    }
+    for key, field in renditions.items():
+        rendition_field = model._meta.get_field(field)
+        name = rendition_field.generate_filename(instance, f'{stem}_{key}.webp')
+        created[field] = rendition_field.storage.save(name, ContentFile(render(image, specs[key])))
+
+    previous = [getattr(instance, field).name for field in renditions.values() if getattr(instance, field)]
+    with transaction.atomic():
+        updated = model.objects.filter(pk=pk, **{field_name: source_name}).update(**created)
+    if updated:
+        _delete_unreferenced(storage, [source_name, *previous], keep=created.values())
+        logger.info("Processed %s %s.%s -> %s", model_label, pk, field_name, created)
+    else:
+        # A newer upload replaced the source while we worked; drop our output.
+        _delete_unreferenced(storage, created.values(), keep=())
+
+
+def is_referenced(storage, name):
+    """Whether any row's file field in `storage` points at `name`."""
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and field.storage is storage:
+                if model._default_manager.filter(**{field.name: name}).exists():
+                    return True
+    return False
+
+
+def _delete_unreferenced(storage, names, keep):
+    """
+    Delete replaced files right away, above all the uploaded original with its
+    EXIF data. Content-addressed storage shares one file between identical
+    uploads, so there a file is only removed once no row refers to it.
+    """
+    shared = getattr(storage, 'shares_files', False)
+    keep = set(keep)
+    for name in names:
+        if name and name not in keep:
+            if shared and is_referenced(storage, name):
+                continue
+            try:
+                storage.delete(name)
+            except Exception as e:
+                logger.warning("Could not delete %s: %s", name, e)
+
+
+# --- Scheduling -----------------------------------------------------
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_setting('IMAGE_PROCESSING_WORKERS', 2),
+                thread_name_prefix='image-pipeline',
+            )
+    return _executor
+
+
+def _run_job(*args):
+    try:
+        process_renditions(*args)
+    except Exception:
+        logger.exception("Image processing failed for %s", args)
+    finally:
+        close_old_connections()
+
+
+def _submit(*args):
+    if _setting('IMAGE_PROCESSING_ASYNC', True):
+        _get_executor().submit(_run_job, *args)
+    else:
+        process_renditions(*args)
+
+
+def prepare_renditions(instance):
+    """
+    pre_save hook: note which source fields received a new upload, and clear
+    renditions whose source was removed. Returns the field names to process.
+    """
+    pending = []
+    for field_name, renditions in PIPELINES.get(instance._meta.label, {}).items():
+        source = getattr(instance, field_name)
+        if source and not source._committed:
+            pending.append(field_name)
+        elif not source:
+            for field in renditions.values():
+                setattr(instance, field, None)
+    return pending
+
+
+def schedule_renditions(instance, field_names):
+    """post_save hook: process the new uploads once the transaction commits."""
+    for field_name in field_names:
+        args = (instance._meta.label, instance.pk, field_name, getattr(instance, field_name).name)
+        transaction.on_commit(lambda args=args: _submit(*args))
+
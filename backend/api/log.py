@@ -0,0 +1,48 @@
+# backend/api/log.py
+
+"""
+Logging helpers wired up by settings.LOGGING.
+
+The WebSocket code logs per-connection and per-message detail at DEBUG with
+%-style arguments, so with the default INFO level a call is one level check
+and nothing is formatted. SampledFilter thins out DEBUG and INFO records
+(LOG_SAMPLE_RATE) when that detail is switched on under load; warnings and
+errors always pass. JsonFormatter writes one JSON object per line, including
+any fields passed through `extra=`.
+"""
+
+import json
+import logging
+import random
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class SampledFilter(logging.Filter):
+    """Keeps a `rate` fraction of records below WARNING."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
@@ -0,0 +1,229 @@
+# backend/api/mail_queue.py
+
+"""
+Outbound email queue.
+
+Views call enqueue_email(), which only inserts an OutboundEmail row and, once
+the surrounding transaction commits, wakes the in-process worker thread. The
+worker claims due rows in batches and sends each batch over a single SMTP
+connection, retrying failures with exponential backoff.
+
+process_email_queue() is the whole send step and can be called directly
+(tests, the `process_email_queue` management command, cron). Server
+processes also start the worker from ApiConfig.ready() (see
+start_worker_for_server), so rows left pending or due for retry by a
+previous process are sent after a restart without waiting for the next
+email to be queued.
+"""
+
+import logging
+import os
+import sys
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _from_address(from_email=None):
+    return from_email or getattr(settings, 'EMAIL_HOST_USER', None) or settings.DEFAULT_FROM_EMAIL
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """Queue one email; returns the OutboundEmail row (None if there are no recipients)."""
+    rows = enqueue_emails([(subject, message, recipient_list)], from_email=from_email)
+    return rows[0] if rows else None
+
+
+def enqueue_emails(messages, from_email=None):
+    """
+    Queue many emails with a single INSERT. `messages` is an iterable of
+    (subject, body, recipient_list) tuples; entries without any recipient
+    address are skipped.
+    """
+    rows = []
+    for subject, body, recipients in messages:
+        recipients = [address for address in recipients if address]
+        if not recipients:
+            continue
+        rows.append(OutboundEmail(
+            subject=subject[:255],
+            body=body,
+            from_email=_from_address(from_email) or '',
+            recipients=recipients,
+        ))
+    if not rows:
+        return []
+    rows = OutboundEmail.objects.bulk_create(rows)
+    transaction.on_commit(wake_worker)
+    return rows
+
+
+def retry_delay(attempts):
+    """Backoff before retry number `attempts` (1-based), capped."""
+    base = _setting('EMAIL_QUEUE_BACKOFF_SECONDS', 30)
+    cap = _setting('EMAIL_QUEUE_MAX_BACKOFF_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * (2 ** max(0, attempts - 1))))
+
+
+def _claim_batch(batch_size):
+    """
+    Lease up to `batch_size` due rows to this worker. Claimed rows stay
+    PENDING but are hidden until the lease expires, so rows held by a worker
+    that dies are picked up again later without any cleanup.
+    """
+    lease = timedelta(seconds=_setting('EMAIL_QUEUE_LEASE_SECONDS', 300))
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboundEmail.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='PENDING', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if rows:
+            OutboundEmail.objects.filter(id__in=[row.id for row in rows]).update(
+                attempts=F('attempts') + 1,
+                next_attempt_at=now + lease,
+            )
+    for row in rows:
+        row.attempts += 1
+    return rows
+
+
+def _record_failure(row, error):
+    max_attempts = _setting('EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    row.last_error = str(error)[:2000]
+    if row.attempts >= max_attempts:
+        row.status = 'FAILED'
+        logger.error("Giving up on email #%s after %s attempts: %s", row.id, row.attempts, error)
+    else:
+        row.next_attempt_at = timezone.now() + retry_delay(row.attempts)
+        logger.warning("Email #%s failed (attempt %s), retrying at %s: %s", row.id, row.attempts, row.next_attempt_at, error)
+    row.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+
+
+def _send_batch(rows, connection):
+    sent = 0
+    try:
+        connection.open()
+    except Exception as e:
+        for row in rows:
+            _record_failure(row, e)
+        return 0
+    try:
+        for row in rows:
+            message = EmailMessage(
+                subject=row.subject,
+                body=row.body,
+                from_email=_from_address(row.from_email),
+                to=row.recipients,
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                _record_failure(row, e)
+                continue
+            row.status = 'SENT'
+            row.sent_at = timezone.now()
+            row.last_error = ''
+            row.save(update_fields=['status', 'sent_at', 'last_error'])
+            sent += 1
+    finally:
+        try:
+            connection.close()
+        except Exception as e:
+            logger.warning("Error closing email connection: %s", e)
+    return sent
+
+
+def process_email_queue(batch_size=None, max_batches=None, connection=None):
+    """
+    Send due emails until the queue is drained (or `max_batches` is reached).
+    Each batch reuses one backend connection. Returns the number sent.
+    """
+    batch_size = batch_size or _setting('EMAIL_QUEUE_BATCH_SIZE', 50)
+    sent = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = _claim_batch(batch_size)
+        if not rows:
+            break
+        batches += 1
+        sent += _send_batch(rows, connection or get_connection(fail_silently=False))
+    return sent
+
+
+def pending_count():
+    return OutboundEmail.objects.filter(status='PENDING').count()
+
+
+class EmailQueueWorker(threading.Thread):
+    """Daemon thread that drains the queue when woken, and polls for retries."""
+
+    def __init__(self):
+        super().__init__(name='email-queue-worker', daemon=True)
+        self._wakeup = threading.Event()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def run(self):
+        poll_interval = _setting('EMAIL_QUEUE_POLL_SECONDS', 30)
+        while True:
+            self._wakeup.wait(timeout=poll_interval)
+            self._wakeup.clear()
+            try:
+                close_old_connections()
+                process_email_queue()
+            except Exception:
+                logger.exception("Email queue worker iteration failed")
+            finally:
+                close_old_connections()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake_worker():
+    """Start the worker on first use and nudge it to drain the queue."""
+    global _worker
+    if not _setting('EMAIL_QUEUE_WORKER_ENABLED', True):
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = EmailQueueWorker()
+            _worker.start()
+    _worker.wake()
+
+
+def start_worker_for_server(argv=None):
+    """
+    Start the worker in processes that serve requests: runserver's serving
+    child, and servers loading backend.asgi / backend.wsgi, which turn on
+    EMAIL_QUEUE_START_WORKER. Anything else (migrate, test, shell, pytest,
+    scripts calling django.setup()) gets no worker unless that flag is set.
+    """
+    if _setting('EMAIL_QUEUE_START_WORKER', False):
+        wake_worker()
+        return
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 2 or os.path.basename(argv[0]) not in ('manage.py', 'django-admin') or argv[1] != 'runserver':
+        return
+    # With the autoreloader only the child (RUN_MAIN) serves requests
+    if '--noreload' in argv or os.environ.get('RUN_MAIN') == 'true':
+        wake_worker()
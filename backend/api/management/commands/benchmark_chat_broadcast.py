@@ -0,0 +1,95 @@
+# backend/api/management/commands/benchmark_chat_broadcast.py
+
+import asyncio
+import json
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.consumers import ChatConsumer, chat_message_event
+from api.models import Conversation, CustomUser
+
+# legacy: the event carries the payload and every socket runs json.dumps (the old path)
+MODES = ('legacy', 'unbatched', 'batched')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures WebSocket frames and CPU time per chat message delivered through "
+        "ChatConsumer.chat_message: per-socket serialization (legacy), the frame serialized once "
+        "per group message (unbatched), and ?batch=1 micro-batching (batched). Messages are "
+        "broadcast straight into the group (no database writes) over an in-memory channel "
+        "layer. Creates a throwaway user and conversation and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500, help='Messages broadcast per mode.')
+        parser.add_argument('--subscribers', type=int, default=10, help='Sockets in the conversation.')
+        parser.add_argument('--burst', type=int, default=10, help='Messages sent back to back before yielding.')
+        parser.add_argument('--mode', choices=MODES + ('all',), default='all')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        user = CustomUser.objects.create_user(username=f'bench-{tag}', password=uuid.uuid4().hex, role='student')
+        conversation, _ = Conversation.objects.get_or_create(user=user)
+        modes = MODES if options['mode'] == 'all' else (options['mode'],)
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 100000}}}
+        # Deleting the user also notifies the channel layer, so keep it in memory throughout.
+        with override_settings(CHANNEL_LAYERS=layers):
+            try:
+                for mode in modes:
+                    result = asyncio.run(self._run(user, conversation, mode, options))
+                    self._report(mode, options, *result)
+            finally:
+                user.delete()  # cascades to the conversation
+
+    async def _run(self, user, conversation, mode, options):
+        path = f'/ws/chat/{conversation.id}/' + ('?batch=1' if mode == 'batched' else '')
+        sockets = []
+        for _ in range(options['subscribers']):
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), path)
+            communicator.scope['user'] = user
+            communicator.scope['url_route'] = {'kwargs': {'conversation_id': str(conversation.id)}}
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise RuntimeError('Benchmark socket was refused')
+            sockets.append(communicator)
+
+        layer = get_channel_layer()
+        group = f'chat_{conversation.id}'
+        count = options['messages']
+        expected = count * len(sockets)
+        payload = {'user': {'id': user.id, 'name': user.username, 'profile_image': None}, 'message': 'x' * 120}
+
+        start_cpu, start = time.process_time(), time.perf_counter()
+        for i in range(count):
+            message = {**payload, 'id': i, 'timestamp': f'{i}'}
+            if mode == 'legacy':
+                await layer.group_send(group, {'type': 'chat_message', 'payload': message})
+            else:
+                await layer.group_send(group, chat_message_event(message))
+            if (i + 1) % options['burst'] == 0:
+                await asyncio.sleep(0)
+        frames = delivered = 0
+        while delivered < expected:
+            for communicator in sockets:
+                while not await communicator.receive_nothing(timeout=0.05, interval=0.001):
+                    data = json.loads(await communicator.receive_from())
+                    frames += 1
+                    delivered += len(data) if isinstance(data, list) else 1
+        cpu, elapsed = time.process_time() - start_cpu, time.perf_counter() - start
+
+        for communicator in sockets:
+            await communicator.disconnect()
+        return count, frames, delivered, cpu, elapsed
+
+    def _report(self, mode, options, count, frames, delivered, cpu, elapsed):
+        self.stdout.write(
+            f"{mode:>10}: {count} messages x {options['subscribers']} sockets -> {frames} frames "
+            f"({frames / count:.2f} per message), CPU {cpu * 1e6 / delivered:.1f} us per delivered message, "
+            f"{elapsed:.2f}s wall"
+        )
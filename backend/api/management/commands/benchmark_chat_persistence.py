@@ -0,0 +1,79 @@
+# backend/api/management/commands/benchmark_chat_persistence.py
+
+import asyncio
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api.chat_persistence import get_writer
+from api.consumers import ChatConsumer
+from api.models import ChatMessage, Conversation, CustomUser
+
+MODES = ('sync', 'write-behind')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures sustained chat messages per second through ChatConsumer.persist_message, "
+        "with the per-message save path and with CHAT_WRITE_BEHIND batching. Creates a "
+        "throwaway user and conversation in the configured database and deletes them afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Messages per mode.')
+        parser.add_argument('--senders', type=int, default=10, help='Concurrent senders (consumers).')
+        parser.add_argument('--mode', choices=MODES + ('both',), default='both')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        user = CustomUser.objects.create_user(username=f'bench-{tag}', password=uuid.uuid4().hex, role='student')
+        conversation, _ = Conversation.objects.get_or_create(user=user)
+        modes = MODES if options['mode'] == 'both' else (options['mode'],)
+        # Notifications go to an in-process layer so the benchmark needs no Redis.
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        # Deleting the user also notifies the channel layer, so keep it in memory throughout.
+        with override_settings(CHANNEL_LAYERS=layers):
+            try:
+                for mode in modes:
+                    with override_settings(CHAT_WRITE_BEHIND=(mode == 'write-behind')):
+                        self._report(mode, *self._run(user, conversation, options['messages'], options['senders']))
+            finally:
+                user.delete()  # cascades to the conversation and its messages
+
+    def _run(self, user, conversation, count, senders):
+        def consumer():
+            instance = ChatConsumer()
+            instance.user = user
+            instance.conversation_id = str(conversation.id)
+            # What check_chat_permissions caches on connect
+            instance.conversation = conversation
+            instance.conversation_owner_id = conversation.user_id
+            return instance
+
+        async def send(instance, n, sender):
+            for i in range(n):
+                await instance.persist_message(f'benchmark message {sender}-{i}')
+
+        async def main():
+            per_sender = [count // senders + (1 if i < count % senders else 0) for i in range(senders)]
+            await asyncio.gather(*(send(consumer(), n, i) for i, n in enumerate(per_sender)))
+
+        before = ChatMessage.objects.filter(conversation=conversation).count()
+        start = time.perf_counter()
+        asyncio.run(main())
+        acknowledged = time.perf_counter() - start
+        get_writer().flush()
+        durable = time.perf_counter() - start
+        stored = ChatMessage.objects.filter(conversation=conversation).count() - before
+        return count, acknowledged, durable, stored
+
+    def _report(self, mode, count, acknowledged, durable, stored):
+        self.stdout.write(
+            f"{mode:>12}: {count} messages, acknowledged in {acknowledged:.2f}s "
+            f"({count / acknowledged:,.0f} msg/s), stored in {durable:.2f}s "
+            f"({count / durable:,.0f} msg/s), rows written: {stored}"
+        )
+        if stored != count:
+            self.stdout.write(self.style.WARNING(f"{mode}: expected {count} rows, found {stored}"))
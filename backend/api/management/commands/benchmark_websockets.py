@@ -0,0 +1,281 @@
+# backend/api/management/commands/benchmark_websockets.py
+
+import asyncio
+import json
+import os
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+import api.routing
+from api.chat_persistence import get_writer
+from api.middleware import TokenAuthMiddleware, user_cache
+from api.models import Conversation, CustomUser
+from api.serializers import MyTokenObtainPairSerializer
+
+# Marker in benchmark message text: "<MARK><send perf_counter> <sequence>"
+MARK = 'bench:'
+
+
+def percentiles(values):
+    """p50/p90/p99/max in milliseconds, or None when nothing was measured."""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+    return {'count': len(ordered), 'p50': at(0.50), 'p90': at(0.90), 'p99': at(0.99), 'max': at(1.0)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-tests the WebSocket path end to end: opens authenticated chat and notification "
+        "sockets through TokenAuthMiddleware, sends chat messages at a fixed rate across several "
+        "conversations, and reports connect latency, delivery latency percentiles and throughput. "
+        "Runs against a throwaway test database. Results are written as JSON so runs from "
+        "different commits can be compared (--compare)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversations', type=int, default=10, help='Student conversations (M).')
+        parser.add_argument('--sockets', type=int, default=50, help='Chat sockets in total (N), spread over the conversations.')
+        parser.add_argument('--notification-sockets', type=int, default=5, help='Staff notification sockets.')
+        parser.add_argument('--rate', type=float, default=100.0, help='Chat messages per second, all conversations together.')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds to send for.')
+        parser.add_argument('--layer', choices=('memory', 'redis'), default='memory')
+        parser.add_argument('--redis-url', default='redis://127.0.0.1:6379', help='Channel layer for --layer redis.')
+        parser.add_argument('--batch', action='store_true', help='Open chat sockets with ?batch=1.')
+        parser.add_argument('--write-behind', action='store_true', help='Run with CHAT_WRITE_BEHIND.')
+        parser.add_argument('--coalesce-ms', type=int, default=0, help='NOTIFICATION_COALESCE_WINDOW_MS for the run.')
+        parser.add_argument('--output', default=None, help='JSON results path (default: benchmark_results/websockets-<commit>-<time>.json).')
+        parser.add_argument('--compare', default=None, help='Earlier results JSON to print deltas against.')
+
+    def handle(self, *args, **options):
+        if options['sockets'] < options['conversations']:
+            raise CommandError('--sockets must be at least --conversations (one owner socket each).')
+        overrides = {
+            'CHANNEL_LAYERS': self._channel_layers(options),
+            'CHAT_WRITE_BEHIND': options['write_behind'],
+            'NOTIFICATION_COALESCE_WINDOW_MS': options['coalesce_ms'],
+            'EMAIL_QUEUE_WORKER_ENABLED': False,
+        }
+        old_name = connection.settings_dict['NAME']
+        # A throwaway database: the run creates users and thousands of messages
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                user_cache.clear()
+                results = asyncio.run(self._run(options))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        results['config'] = {key: options[key] for key in (
+            'conversations', 'sockets', 'notification_sockets', 'rate', 'duration',
+            'layer', 'batch', 'write_behind', 'coalesce_ms',
+        )}
+        results['commit'] = self._commit()
+        results['recorded_at'] = datetime.now(dt_timezone.utc).isoformat()
+        path = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmark_results',
+            f"websockets-{results['commit'] or 'unknown'}-{datetime.now():%Y%m%d-%H%M%S}.json",
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+
+        self._report(results)
+        if options['compare']:
+            self._compare(results, options['compare'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
+
+    def _channel_layers(self, options):
+        if options['layer'] == 'redis':
+            try:
+                import channels_redis  # noqa: F401
+            except ImportError:
+                raise CommandError('--layer redis needs channels_redis installed.')
+            return {'default': {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                'CONFIG': {'hosts': [options['redis_url']]},
+            }}
+        return {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': 100000}}}
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    # --- Setup -----------------------------------------------------------
+
+    def _create_users(self, options):
+        tag = uuid.uuid4().hex[:6]
+        per_conversation = -(-options['sockets'] // options['conversations'])
+        staff_needed = max(per_conversation - 1, options['notification_sockets'])
+        staff = [
+            CustomUser.objects.create_user(username=f'bench-staff-{tag}-{i}', password=tag, role='admin')
+            for i in range(staff_needed)
+        ]
+        conversations = []
+        for i in range(options['conversations']):
+            student = CustomUser.objects.create_user(username=f'bench-student-{tag}-{i}', password=tag, role='student')
+            conversation, _ = Conversation.objects.get_or_create(user=student)
+            conversations.append((conversation.id, student))
+        token = lambda user: str(MyTokenObtainPairSerializer.get_token(user).access_token)
+        # (conversation_id, token) per chat socket: each conversation's owner first, then staff
+        chat_sockets = []
+        for index in range(options['sockets']):
+            conversation_id, student = conversations[index % len(conversations)]
+            slot = index // len(conversations)
+            chat_sockets.append((conversation_id, token(student if slot == 0 else staff[slot - 1])))
+        notification_tokens = [token(user) for user in staff[:options['notification_sockets']]]
+        return chat_sockets, notification_tokens
+
+    # --- Run -------------------------------------------------------------
+
+    async def _connect(self, application, path, latencies):
+        communicator = WebsocketCommunicator(application, path)
+        start = time.perf_counter()
+        connected, _ = await communicator.connect(timeout=10)
+        latencies.append(time.perf_counter() - start)
+        if not connected:
+            raise CommandError(f'Socket refused: {path.split("?")[0]}')
+        return communicator
+
+    async def _read(self, communicator, stop, delivery, notification, counters):
+        while not stop.is_set():
+            # receive_from() cancels the application when it times out; poll instead
+            if await communicator.receive_nothing(timeout=0.1, interval=0.001):
+                continue
+            text = await communicator.receive_from()
+            received = time.perf_counter()
+            counters['frames'] += 1
+            data = json.loads(text)
+            for event in data if isinstance(data, list) else [data]:
+                payload = event.get('payload') or {}
+                body = payload.get('message') if event.get('type') == 'chat_message' else payload.get('preview')
+                if not body or not body.startswith(MARK):
+                    continue
+                sent = float(body[len(MARK):].split()[0])
+                (delivery if event.get('type') == 'chat_message' else notification).append(received - sent)
+
+    async def _run(self, options):
+        chat_sockets, notification_tokens = await database_sync_to_async(self._create_users)(options)
+        application = TokenAuthMiddleware(URLRouter(api.routing.websocket_urlpatterns))
+        query = '&batch=1' if options['batch'] else ''
+
+        chat_connect, notification_connect = [], []
+        chats = []
+        for conversation_id, token in chat_sockets:
+            path = f'/ws/chat/{conversation_id}/?token={token}{query}'
+            chats.append((conversation_id, await self._connect(application, path, chat_connect)))
+        notifications = []
+        for token in notification_tokens:
+            socket = await self._connect(application, f'/ws/notifications/?token={token}', notification_connect)
+            await socket.receive_from(timeout=5)  # the 'resume' frame
+            notifications.append(socket)
+
+        stop = asyncio.Event()
+        delivery, notification = [], []
+        chat_counters, notification_counters = {'frames': 0}, {'frames': 0}
+        readers = [asyncio.ensure_future(self._read(s, stop, delivery, notification, chat_counters)) for _, s in chats]
+        readers += [
+            asyncio.ensure_future(self._read(s, stop, delivery, notification, notification_counters))
+            for s in notifications
+        ]
+
+        # Senders rotate over every chat socket, so students and staff both send
+        interval = 1.0 / options['rate']
+        total = int(options['rate'] * options['duration'])
+        start = time.perf_counter()
+        for sequence in range(total):
+            due = start + sequence * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            _, sender = chats[sequence % len(chats)]
+            await sender.send_to(text_data=json.dumps({'message': f'{MARK}{time.perf_counter()} {sequence}'}))
+        send_seconds = time.perf_counter() - start
+
+        # Wait for deliveries to stop arriving (or give up after 10s)
+        expected = sum(1 for index in range(total) for cid, _ in chats if cid == chats[index % len(chats)][0])
+        deadline = time.perf_counter() + 10
+        while len(delivery) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*readers)
+        for _, socket in chats:
+            await socket.disconnect()
+        for socket in notifications:
+            await socket.disconnect()
+        if options['write_behind']:
+            await asyncio.get_running_loop().run_in_executor(None, get_writer().flush, 10)
+
+        return {
+            'connect_ms': {'chat': percentiles(chat_connect), 'notification': percentiles(notification_connect)},
+            'delivery_ms': percentiles(delivery),
+            'notification_ms': percentiles(notification),
+            'messages_sent': total,
+            'deliveries_expected': expected,
+            'deliveries': len(delivery),
+            'chat_frames': chat_counters['frames'],
+            'notification_frames': notification_counters['frames'],
+            'send_rate': round(total / send_seconds, 1) if send_seconds else None,
+            'deliveries_per_second': round(len(delivery) / elapsed, 1) if elapsed else None,
+        }
+
+    # --- Output ----------------------------------------------------------
+
+    def _report(self, results):
+        def line(label, stats):
+            if not stats:
+                return f"{label:>22}: -"
+            return (f"{label:>22}: p50 {stats['p50']}ms  p90 {stats['p90']}ms  "
+                    f"p99 {stats['p99']}ms  max {stats['max']}ms  (n={stats['count']})")
+
+        self.stdout.write(line('chat connect', results['connect_ms']['chat']))
+        self.stdout.write(line('notification connect', results['connect_ms']['notification']))
+        self.stdout.write(line('chat delivery', results['delivery_ms']))
+        self.stdout.write(line('notification delivery', results['notification_ms']))
+        self.stdout.write(
+            f"{'throughput':>22}: {results['messages_sent']} sent at {results['send_rate']} msg/s, "
+            f"{results['deliveries']}/{results['deliveries_expected']} delivered "
+            f"({results['deliveries_per_second']}/s) in {results['chat_frames']} frames"
+        )
+        if results['deliveries'] < results['deliveries_expected']:
+            self.stdout.write(self.style.WARNING('Some deliveries did not arrive within 10s of the last send.'))
+
+    def _compare(self, results, path):
+        with open(path, encoding='utf-8') as fh:
+            before = json.load(fh)
+        self.stdout.write(f"Compared with {path} ({before.get('commit')}):")
+        rows = [
+            ('chat connect p50', ('connect_ms', 'chat', 'p50')),
+            ('chat delivery p50', ('delivery_ms', 'p50')),
+            ('chat delivery p99', ('delivery_ms', 'p99')),
+            ('notification p99', ('notification_ms', 'p99')),
+            ('deliveries/s', ('deliveries_per_second',)),
+        ]
+        for label, keys in rows:
+            old, new = before, results
+            for key in keys:
+                old = (old or {}).get(key)
+                new = (new or {}).get(key)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+            self.stdout.write(f"{label:>22}: {old} -> {new} ({change})")
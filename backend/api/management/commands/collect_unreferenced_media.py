@@ -0,0 +1,57 @@
+# backend/api/management/commands/collect_unreferenced_media.py
+
+import os
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes uploaded files that no database row refers to any more. "
+        "Content-addressed storage shares one file between identical uploads, "
+        "so files are only removed here, never when a single row lets go of one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List files without deleting them.')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Skip files modified in the last N seconds (uploads whose row is not committed yet).',
+        )
+
+    def _file_fields(self):
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField) and field.storage is default_storage:
+                    yield model, field
+
+    def handle(self, *args, **options):
+        referenced = set()
+        directories = set()
+        for model, field in self._file_fields():
+            directories.add(str(field.upload_to).split('/')[0])
+            names = model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            referenced.update(names.values_list(field.name, flat=True).iterator())
+
+        cutoff = time.time() - options['min_age']
+        root = default_storage.location
+        removed = kept = 0
+        for directory in sorted(d for d in directories if d):
+            for dirpath, _, filenames in os.walk(os.path.join(root, directory)):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    name = os.path.relpath(full_path, root).replace(os.sep, '/')
+                    if name in referenced or os.path.getmtime(full_path) > cutoff:
+                        kept += 1
+                        continue
+                    removed += 1
+                    self.stdout.write(name)
+                    if not options['dry_run']:
+                        default_storage.delete(name)
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} unreferenced file(s); {kept} kept."))
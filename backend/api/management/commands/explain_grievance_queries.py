@@ -0,0 +1,148 @@
+# backend/api/management/commands/explain_grievance_queries.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.request import Request
+
+from api.models import CustomUser, GrievanceStatCounter
+from api.pagination import GrievanceCursorPagination
+from api.views import GrievanceViewSet
+
+# Plan fragments (on lines naming the grievance table) that mean it is read
+# through an index, or scanned in full.
+INDEX_MARKERS = {
+    'postgresql': ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan', 'Bitmap Heap Scan'),
+    'sqlite': ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY', 'USING PRIMARY KEY'),
+}
+SCAN_MARKERS = {
+    'postgresql': ('Seq Scan',),
+    'sqlite': ('SCAN',),
+}
+# An explicit sort step means the index did not also satisfy ORDER BY.
+SORT_MARKERS = {
+    'postgresql': ('Sort  (', 'Incremental Sort'),
+    'sqlite': ('TEMP B-TREE FOR ORDER BY',),
+}
+TABLE = 'api_grievance'
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN for each query GrievanceViewSet issues (list per role and "
+        "status_filter, keyset page 2, ?search=, retrieve, stats) and reports whether it uses an index. "
+        "Exits non-zero when a query scans the table or needs a sort step."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan for every query.')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor not in INDEX_MARKERS:
+            self.stderr.write(f"Index detection is not implemented for the '{vendor}' backend; printing raw plans.")
+            options['verbose_plans'] = True
+
+        admin = CustomUser(pk=0, username='explain-admin', role='admin')
+        student = CustomUser(pk=0, username='explain-student', role='student')
+
+        # (name, plan, whether a sort step is expected)
+        results = []
+        for label, user in (('admin', admin), ('student', student)):
+            for status_filter in (None, 'unresolved', 'resolved', 'in_progress'):
+                name = f"list role={label} status_filter={status_filter or '-'}"
+                view = self._viewset(user, 'list', status_filter=status_filter)
+                results.append((name, self._first_page(view).explain(), False))
+            view = self._viewset(user, 'list')
+            results.append((f"list role={label} cursor page", self._seek_page(view).explain(), False))
+            # Relevance is computed per match, so ranked results are always
+            # sorted; what matters is that the matches come from the search index.
+            view = self._viewset(user, 'list', search='water leak')
+            results.append((f"list role={label} search", self._first_page(view).explain(), True))
+            # get_object() ends in get(), which drops the list ordering
+            queryset = self._viewset(user, 'retrieve').get_queryset().filter(pk=1).order_by()
+            results.append((f"retrieve role={label}", queryset.explain(), False))
+
+        # The stats action (staff only) reads the maintained counters
+        results.append(('stats', self._explain_executed(GrievanceStatCounter.objects.status_totals), False))
+
+        scans = sorts = 0
+        for name, plan, ranked in results:
+            verdict = self._classify(vendor, plan)
+            if verdict == 'SORT' and ranked:
+                verdict = 'RANKED'
+            scans += verdict == 'SCAN'
+            sorts += verdict == 'SORT'
+            style = {
+                'INDEX': self.style.SUCCESS, 'RANKED': self.style.SUCCESS, 'NONE': self.style.SUCCESS,
+                'SORT': self.style.WARNING, 'SCAN': self.style.ERROR,
+            }.get(verdict, str)
+            self.stdout.write(f"{style(f'{verdict:<6}')} {name}")
+            if options['verbose_plans'] or verdict in ('SCAN', 'SORT'):
+                for line in plan.splitlines():
+                    self.stdout.write(f"         {line}")
+
+        if scans or sorts:
+            raise CommandError(
+                f"{scans} query(ies) scan {TABLE} without an index, "
+                f"{sorts} need a sort step the index does not cover."
+            )
+        self.stdout.write(self.style.SUCCESS("All grievance queries use an index."))
+
+    def _viewset(self, user, action, **params):
+        # Set the ViewSet up exactly as it would be for this request.
+        django_request = APIRequestFactory().get('/api/grievances/', {k: v for k, v in params.items() if v})
+        force_authenticate(django_request, user=user)
+        view = GrievanceViewSet()
+        view.action = action
+        view.request = Request(django_request)
+        view.request.user = user
+        view.format_kwarg = None
+        view.kwargs = {}
+        return view
+
+    def _ordering(self, view):
+        return view.pagination_ordering or GrievanceCursorPagination.ordering
+
+    def _first_page(self, view):
+        return view.get_queryset().order_by(*self._ordering(view))[:GrievanceCursorPagination.page_size + 1]
+
+    def _seek_page(self, view):
+        paginator = GrievanceCursorPagination()
+        paginator.fields = self._ordering(view)
+        paginator.field_names = [f.lstrip('-') for f in paginator.fields]
+        paginator.descending = True
+        seek = paginator._seek_filter([timezone.now(), 2 ** 62], reverse=False)
+        return view.get_queryset().order_by(*paginator.fields).filter(seek)[:paginator.page_size + 1]
+
+    def _explain_executed(self, run):
+        # Calls that execute immediately (aggregates, list()): capture the SQL and EXPLAIN that.
+        with CaptureQueriesContext(connection) as ctx:
+            run()
+        sql = ctx.captured_queries[-1]['sql']
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            rows = cursor.fetchall()
+        return '\n'.join(' '.join(str(col) for col in row) for row in rows)
+
+    @staticmethod
+    def _classify(vendor, plan):
+        """
+        INDEX, SORT (index used but ORDER BY needs a sort step), SCAN, NONE
+        (the grievance table is not read at all), or '?'.
+        """
+        if vendor not in INDEX_MARKERS:
+            return '?'
+        lines = [line for line in plan.splitlines() if TABLE + ' ' in line + ' ' and 'api_grievancecomment' not in line]
+        if not lines:
+            return 'NONE'
+        if any(marker in line for line in lines for marker in INDEX_MARKERS[vendor]):
+            if any(marker in plan for marker in SORT_MARKERS[vendor]):
+                return 'SORT'
+            return 'INDEX'
+        if any(marker in line for line in lines for marker in SCAN_MARKERS[vendor]):
+            return 'SCAN'
+        return '?'
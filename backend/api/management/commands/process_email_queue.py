@@ -0,0 +1,30 @@
+# backend/api/management/commands/process_email_queue.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.mail_queue import pending_count, process_email_queue
+
+
+class Command(BaseCommand):
+    help = (
+        "Sends queued outbound emails in batches over one connection. Use --loop "
+        "to run as a standalone worker when EMAIL_QUEUE_WORKER is disabled."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting once drained.')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = process_email_queue(batch_size=options['batch_size'])
+            if sent or not options['loop']:
+                self.stdout.write(f"Sent {sent} email(s); {pending_count()} still pending.")
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
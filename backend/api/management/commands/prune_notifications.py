@@ -0,0 +1,34 @@
+# backend/api/management/commands/prune_notifications.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import NotificationLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes NotificationLog entries older than NOTIFICATION_LOG_RETENTION_DAYS. "
+        "Clients that were away longer are told to refetch instead of replaying. "
+        "Run it daily (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Override the retention period.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else getattr(settings, 'NOTIFICATION_LOG_RETENTION_DAYS', 7)
+        cutoff = timezone.now() - timedelta(days=days)
+        old = NotificationLog.objects.filter(created_at__lt=cutoff)
+        deleted = 0
+        while True:
+            # Short deletes so live appends are never blocked for long
+            ids = list(old.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += NotificationLog.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} notification(s) older than {days} day(s)."))
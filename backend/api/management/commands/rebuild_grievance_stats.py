@@ -0,0 +1,55 @@
+# backend/api/management/commands/rebuild_grievance_stats.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import GrievanceStatCounter
+from api.query_plans import grievance_counter_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes GrievanceStatCounter from the grievance table in one "
+        "conditional-aggregation pass and reports any drift it corrected."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without writing.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Lock the existing counters first so concurrent grievance writes
+            # wait for us and then apply their deltas on top of the new values.
+            current = {
+                (row.status, row.priority): row
+                for row in GrievanceStatCounter.objects.select_for_update()
+            }
+            snapshot = grievance_counter_snapshot()
+
+            drift = 0
+            for key in sorted(set(current) | set(snapshot)):
+                expected = snapshot.get(key, 0)
+                row = current.get(key)
+                actual = row.count if row else 0
+                if actual == expected:
+                    continue
+                drift += 1
+                self.stdout.write(f"{key[0]}/{key[1]}: counter={actual} actual={expected}")
+                if options['dry_run']:
+                    continue
+                if row:
+                    row.count = expected
+                    row.save(update_fields=['count'])
+                else:
+                    GrievanceStatCounter.objects.create(status=key[0], priority=key[1], count=expected)
+
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        total = sum(snapshot.values())
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(f"Counters match the grievance table ({total} grievances)."))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{drift} counter(s) drifted; run without --dry-run to fix."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Corrected {drift} counter(s) ({total} grievances)."))
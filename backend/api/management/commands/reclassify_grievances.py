@@ -0,0 +1,67 @@
+# backend/api/management/commands/reclassify_grievances.py
+
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Grievance, GrievanceStatCounter
+from api.priority import get_classifier, invalidate_classifier
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-applies the current PriorityRule set to existing grievances in "
+        "keyset-ordered batches, updating only rows whose priority changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--include-resolved', action='store_true', help='Also reclassify RESOLVED grievances.')
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them.')
+
+    def handle(self, *args, **options):
+        invalidate_classifier()
+        classifier = get_classifier()
+        self.stdout.write(f"Classifying with {classifier.rule_count} active rule(s).")
+
+        queryset = Grievance.objects.order_by('id')
+        if not options['include_resolved']:
+            queryset = queryset.exclude(status='RESOLVED')
+
+        last_id = 0
+        scanned = changed = 0
+        transitions = Counter()
+        while True:
+            batch = list(
+                queryset.filter(id__gt=last_id)
+                .only('id', 'title', 'description', 'priority', 'status')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            scanned += len(batch)
+
+            updates = []
+            deltas = Counter()
+            for grievance in batch:
+                priority = classifier.classify(grievance.title, grievance.description)
+                if priority == grievance.priority:
+                    continue
+                transitions[(grievance.priority, priority)] += 1
+                deltas[(grievance.status, grievance.priority)] -= 1
+                deltas[(grievance.status, priority)] += 1
+                grievance.priority = priority
+                updates.append(grievance)
+
+            changed += len(updates)
+            if updates and not options['dry_run']:
+                with transaction.atomic():
+                    # bulk_update bypasses Grievance.save(), so move the stats counters here
+                    Grievance.objects.bulk_update(updates, ['priority'])
+                    GrievanceStatCounter.objects.adjust_many(deltas)
+
+        for (old, new), count in sorted(transitions.items()):
+            self.stdout.write(f"  {old} -> {new}: {count}")
+        verb = 'would change' if options['dry_run'] else 'changed'
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} grievance(s); {verb} {changed}."))
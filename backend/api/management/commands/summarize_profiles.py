@@ -0,0 +1,84 @@
+# backend/api/management/commands/summarize_profiles.py
+
+import glob
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORT_KEYS = {'wall': 'p95_ms', 'queries': 'avg_queries', 'db': 'avg_db_ms', 'count': 'count'}
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarizes the request profiles written by api.profiling.ProfilingMiddleware per "
+        "endpoint: request count, p50/p95 wall time, average queries and database time, and "
+        "the call sites that most often ran one of the slowest statements. Reads "
+        "PROFILING_LOG_PATH and its rotated backups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Profile log (default: PROFILING_LOG_PATH).')
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='wall')
+        parser.add_argument('--limit', type=int, default=20, help='Endpoints to show.')
+        parser.add_argument('--origins', type=int, default=3, help='Slow-query call sites shown per endpoint.')
+
+    def handle(self, *args, **options):
+        path = options['path'] or getattr(settings, 'PROFILING_LOG_PATH', None)
+        if not path:
+            raise CommandError('No profile log: set PROFILING_LOG_PATH or pass --path.')
+        files = [f for f in [path] + sorted(glob.glob(f'{glob.escape(path)}.*')) if os.path.isfile(f)]
+        if not files:
+            raise CommandError(f'No profiles at {path}.')
+
+        profiles = defaultdict(list)
+        skipped = 0
+        for filename in files:
+            with open(filename, encoding='utf-8') as fh:
+                for line in fh:
+                    try:
+                        profile = json.loads(line)
+                    except ValueError:
+                        skipped += 1  # e.g. a line cut short by a crash
+                        continue
+                    profiles[(profile['method'], profile.get('route') or profile['path'])].append(profile)
+
+        rows = [self._summarize(endpoint, entries, options['origins']) for endpoint, entries in profiles.items()]
+        rows.sort(key=lambda row: row[SORT_KEYS[options['sort']]], reverse=True)
+        total = sum(row['count'] for row in rows)
+        self.stdout.write(f"{total} profiled request(s) over {len(rows)} endpoint(s) from {len(files)} file(s)")
+        for row in rows[:options['limit']]:
+            self.stdout.write(
+                f"\n{row['method']} {row['route']}  n={row['count']}  wall p50 {row['p50_ms']}ms "
+                f"p95 {row['p95_ms']}ms  queries avg {row['avg_queries']} max {row['max_queries']}  "
+                f"db avg {row['avg_db_ms']}ms"
+            )
+            for origin, count in row['origins']:
+                self.stdout.write(f"    slow query x{count}: {origin}")
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} unreadable line(s)."))
+
+    def _summarize(self, endpoint, entries, origins):
+        walls = sorted(entry['wall_ms'] for entry in entries)
+        queries = [entry['queries'] for entry in entries]
+        # Which code keeps showing up among the slowest statements
+        slow_origins = Counter(
+            query['origin'] or 'unknown' for entry in entries for query in entry.get('slowest', [])
+        )
+        return {
+            'method': endpoint[0],
+            'route': endpoint[1],
+            'count': len(entries),
+            'p50_ms': round(_percentile(walls, 0.50), 1),
+            'p95_ms': round(_percentile(walls, 0.95), 1),
+            'avg_queries': round(sum(queries) / len(queries), 1),
+            'max_queries': max(queries),
+            'avg_db_ms': round(sum(entry['db_ms'] for entry in entries) / len(entries), 1),
+            'origins': slow_origins.most_common(origins),
+        }
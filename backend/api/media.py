@@ -0,0 +1,209 @@
+# backend/api/media.py
+
+"""
+Serving uploaded media.
+
+Media is not public: grievance evidence and profile photos are personal
+data, and older uploads have guessable names. A request needs either a
+signed URL or an admin/grievance cell JWT. The storage (api.storage) signs
+every URL it hands out, so serializers and chat frames only ever expose
+links for files the API already let that user see. Signatures expire after
+between MEDIA_URL_TTL and twice that, and stay the same for a whole
+MEDIA_URL_TTL window so browsers can keep reusing their cached copy.
+
+Responses are cacheable by the browser only (private). Content-addressed
+files (api.storage) never change under a given name, so they are sent as
+immutable with the digest as their ETag; older, name-based uploads are
+revalidated on every use. The browser caches by full URL, query string
+included, so a cached copy is only found again while the API keeps handing
+out the same signature: max-age is MEDIA_URL_TTL, not a year. The price is
+one download per file per browser per window. Signing with an expiry
+derived from the content hash alone would let URLs repeat indefinitely,
+but then a leaked link would never stop working.
+
+MEDIA_SERVE_MODE picks who sends the bytes:
+  'django'           - this view streams the file, honouring Range requests
+  'x-accel-redirect' - nginx serves MEDIA_ACCEL_PREFIX + path (an `internal` location)
+  'x-sendfile'       - Apache/lighttpd serve the absolute file path
+In the proxy modes the worker only checks the file exists and sets headers;
+the proxy handles Range and conditional requests itself.
+"""
+
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .permissions import authenticated_user
+from .storage import content_digest
+
+REVALIDATE_CACHE_CONTROL = 'private, no-cache'
+STAFF_ROLES = ('admin', 'grievance_cell')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _url_ttl():
+    return max(1, getattr(settings, 'MEDIA_URL_TTL', 6 * 3600))
+
+
+def _signer():
+    return signing.Signer(salt='api.media')
+
+
+def _signature(name, expires):
+    return _signer().signature(f'{name}:{expires}')
+
+
+def signed_query(name, now=None):
+    """Query string authorizing MEDIA_URL/<name>; constant within one MEDIA_URL_TTL window."""
+    ttl = _url_ttl()
+    now = int(time.time() if now is None else now)
+    expires = (now // ttl + 2) * ttl
+    return urlencode({'expires': expires, 'signature': _signature(name, expires)})
+
+
+def _has_valid_signature(request, name):
+    try:
+        expires = int(request.GET.get('expires', ''))
+    except ValueError:
+        return False
+    if expires < time.time():
+        return False
+    return signing.constant_time_compare(request.GET.get('signature', ''), _signature(name, expires))
+
+
+def _is_staff(request):
+    """Admins and the grievance cell may read any file, with a session or a JWT."""
+    user = authenticated_user(request)
+    return user is not None and (user.is_superuser or getattr(user, 'role', None) in STAFF_ROLES)
+
+
+def _etag(path, stat):
+    digest = content_digest(path)
+    if digest:
+        return f'"{digest}"'
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison: W/"x" matches "x"
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag in candidates
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single satisfiable byte range, None to send
+    the whole file (no header, or a form we don't handle such as multiple
+    ranges), or False when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            block = fh.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _set_common_headers(response, path, stat, etag):
+    if content_digest(path) is not None:
+        # A signed URL changes every MEDIA_URL_TTL, so a longer lifetime would never be used
+        response['Cache-Control'] = f'private, max-age={_url_ttl()}, immutable'
+    else:
+        response['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    if not (_has_valid_signature(request, path) or _is_staff(request)):
+        return HttpResponseForbidden()
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag = _etag(path, stat)
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        return _set_common_headers(HttpResponseNotModified(), path, stat, etag)
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    mode = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(path.lstrip('/'))
+        return _set_common_headers(response, path, stat, etag)
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return _set_common_headers(response, path, stat, etag)
+
+    byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+    if_range = request.headers.get('If-Range')
+    if byte_range is not None and if_range and if_range.strip() != etag:
+        byte_range = None  # the client's partial copy is stale; send it all
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return _set_common_headers(response, path, stat, etag)
+    if byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        return _set_common_headers(response, path, stat, etag)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(_read_range(full_path, start, length), status=206, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    return _set_common_headers(response, path, stat, etag)
@@ -0,0 +1,305 @@
+# backend/api/metrics.py
+
+"""
+In-process metrics, exposed in the Prometheus text format at /api/metrics.
+
+Counters, gauges and histograms live in one registry per process; updating
+one is a dict lookup and an addition under a lock, cheap enough for the
+WebSocket hot paths. Each worker process reports its own numbers (scrape
+every process, or sum them in Prometheus). Gauges can also be computed at
+scrape time (email_queue_depth).
+
+RequestMetricsMiddleware records latency and database query counts for every
+REST request, labelled by the resolved URL name so the label set stays
+bounded. Set METRICS_ENABLED = False to turn all of it off. Scrapers send
+METRICS_TOKEN as "Authorization: Bearer <token>"; without a token the
+endpoint is only open when DEBUG is on.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers a cached WebSocket handshake up to a slow export request
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting('METRICS_ENABLED', True)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(value) for value in labels)
+
+    def samples(self):
+        """(suffix, label names, label values, extra labels, value) rows for render()."""
+        with self._lock:
+            items = list(self._values.items())
+        return [('', self.labelnames, key, (), value) for key, value in sorted(items)]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Set directly, or computed when scraped if `callback` is given."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        if not enabled():
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self.callback is not None:
+            self.set(self.callback())
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        if not enabled():
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket (not cumulative) counts, sum, count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[2] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items()]
+        rows = []
+        for key, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                rows.append(('_bucket', self.labelnames, key, (('le', _format_value(float(bound))),), cumulative))
+            rows.append(('_sum', self.labelnames, key, (), total))
+            rows.append(('_count', self.labelnames, key, (), count))
+        return rows
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception:
+                continue  # a failing scrape-time gauge should not hide the rest
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, names, values, extra, value in samples:
+                lines.append(f'{metric.name}{suffix}{_format_labels(names, values, extra)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        """Reset every value (tests)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+
+def _email_queue_depth():
+    from .models import OutboundEmail
+    return OutboundEmail.objects.filter(status='PENDING').count()
+
+
+# --- REST ---
+http_request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'REST request latency.', ('method', 'route', 'status'),
+)
+http_request_queries = registry.histogram(
+    'http_request_db_queries', 'Database queries per REST request.', ('route',), QUERY_COUNT_BUCKETS,
+)
+
+# --- WebSockets ---
+ws_connects = registry.counter(
+    'websocket_connects_total', 'WebSocket handshakes by consumer and outcome.', ('consumer', 'outcome'),
+)
+ws_disconnects = registry.counter('websocket_disconnects_total', 'Closed WebSocket connections.', ('consumer',))
+ws_open = registry.gauge('websocket_open_connections', 'Accepted WebSocket connections still open.', ('consumer',))
+ws_messages_received = registry.counter(
+    'websocket_messages_received_total', 'Frames received from clients (heartbeats excluded).', ('consumer',),
+)
+ws_messages_broadcast = registry.counter(
+    'websocket_messages_broadcast_total', 'Events published to channel layer groups.', ('kind',),
+)
+channel_layer_send_seconds = registry.histogram(
+    'channel_layer_send_seconds', 'Latency of channel layer group_send calls.', ('kind',),
+)
+
+# --- Email ---
+email_queue_depth = registry.gauge(
+    'email_queue_depth', 'Pending OutboundEmail rows.', callback=_email_queue_depth,
+)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class RequestMetricsMiddleware:
+    """Times each request and counts the queries it ran on the default database."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+        queries = _QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else 'unmatched'
+        http_request_seconds.observe(elapsed, request.method, route, response.status_code)
+        http_request_queries.observe(queries.count, route)
+        return response
+
+
+def metrics_view(request):
+    token = _setting('METRICS_TOKEN', None)
+    if token:
+        allowed = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    else:
+        allowed = settings.DEBUG
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -1,46 +1,173 @@
 # backend/api/middleware.py
 
+"""
+JWT authentication for WebSocket handshakes.
+
+The token is verified on every handshake, but the user behind it is served
+from a per-process cache of user snapshots keyed by id (WS_USER_CACHE_TTL
+seconds), so a reconnect storm after a deploy does not turn into one user
+query per socket. Cache hits never leave the event loop. Saving or deleting a
+CustomUser drops its snapshot in this process (signals.py); other processes
+pick up the change within the TTL. Open chat sockets are told about role
+changes separately (signals.revoke_chat_access).
+
+With WS_AUTH_USE_TOKEN_CLAIMS the user is built from the token's own claims
+(user_id, username, role, name; see MyTokenObtainPairSerializer) and the
+database is not touched at all. Such users carry no profile image, and a
+role change or deactivation only takes effect when the access token expires.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
 from urllib.parse import parse_qs
 from channels.db import database_sync_to_async # Crucial for DB access
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 # Use rest_framework_simplejwt's utilities for token validation
-from rest_framework_simplejwt.tokens import AccessToken 
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 
 User = get_user_model()
 
-@database_sync_to_async # Decorator to allow async calling of sync ORM code
-def get_user_from_token(token_key):
+# Handshake detail is DEBUG (one record per socket); see LOGGING in settings
+logger = logging.getLogger(__name__)
+
+# Everything the chat and notification consumers read from scope['user'],
+# in model field order as Model.from_db() expects
+SNAPSHOT_FIELDS = tuple(
+    f.attname for f in User._meta.concrete_fields
+    if f.attname in {
+        'id', 'username', 'email', 'name', 'role', 'is_active', 'is_staff', 'is_superuser',
+        'profile_image', 'profile_image_thumbnail',
+    }
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class UserSnapshotCache:
+    """Bounded, TTL'd map of user id -> snapshot values, safe across threads."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # user_id -> (expires_at, values)
+        self._generations = {}  # user_id -> bumped by invalidate()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            return entry[1]
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, user_id, values, generation):
+        """Store a snapshot unless the user was invalidated since `generation` was read."""
+        ttl = _setting('WS_USER_CACHE_TTL', 30)
+        with self._lock:
+            if ttl <= 0 or self._generations.get(user_id, 0) != generation:
+                return
+            self._entries[user_id] = (time.monotonic() + ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > _setting('WS_USER_CACHE_MAX_ENTRIES', 10000):
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserSnapshotCache()
+
+
+def invalidate_cached_user(user_id):
+    user_cache.invalidate(user_id)
+
+
+def _user_from_snapshot(values):
+    # A fresh instance per socket: consumers update their user in place
+    return User.from_db(User.objects.db, SNAPSHOT_FIELDS, values)
+
+
+def _user_from_claims(payload, user_id):
+    if not payload.get('role'):
+        return None
+    user = User(
+        id=user_id,
+        username=payload.get('username', ''),
+        name=payload.get('name', ''),
+        role=payload['role'],
+        is_active=True,
+    )
+    user._state.adding = False
+    user._state.db = User.objects.db
+    user._remember_access()
+    return user
+
+
+@database_sync_to_async
+def _load_snapshot(user_id):
+    generation = user_cache.generation(user_id)
+    values = User.objects.filter(id=user_id).values_list(*SNAPSHOT_FIELDS).first()
+    if values is not None:
+        user_cache.put(user_id, values, generation)
+    return values
+
+
+async def get_user_from_token(token_key):
     """
     Attempts to authenticate a user based on the provided JWT access token key.
-    Handles token validation and user lookup asynchronously.
+    Handles token validation; the user comes from the token claims, the
+    snapshot cache, or (on a miss) one query run off the event loop.
     """
+    user_id = None
     try:
         # Validate the token using Simple JWT's AccessToken class
         access_token = AccessToken(token_key)
         # Verify the token is valid (checks expiry, signature etc.)
-        access_token.verify() 
+        access_token.verify()
         # Get the user ID from the validated token payload
-        user_id = access_token.payload.get('user_id') 
+        user_id = access_token.payload.get('user_id')
         if user_id is None:
-            print("TokenAuthMiddleware: Token payload missing user_id")
+            logger.info("TokenAuthMiddleware: token payload missing user_id")
             return AnonymousUser()
+        user_id = int(user_id)
+
+        if _setting('WS_AUTH_USE_TOKEN_CLAIMS', False):
+            user = _user_from_claims(access_token.payload, user_id)
+            if user is not None:
+                return user
 
-        # Fetch the user from the database
-        user = User.objects.get(id=user_id)
-        print(f"TokenAuthMiddleware: Authenticated user: {user}")
-        return user
+        values = user_cache.get(user_id)
+        if values is None:
+            values = await _load_snapshot(user_id)
+        if values is None:
+            logger.info("TokenAuthMiddleware: user %s from token does not exist", user_id)
+            return AnonymousUser()
+        return _user_from_snapshot(values)
     except (InvalidToken, TokenError) as e:
         # Handle invalid token errors (expired, malformed, etc.)
-        print(f"TokenAuthMiddleware: Invalid token - {e}")
-        return AnonymousUser()
-    except User.DoesNotExist:
-        print(f"TokenAuthMiddleware: User specified in token does not exist (ID: {user_id})")
+        logger.debug("TokenAuthMiddleware: invalid token: %s", e)
         return AnonymousUser()
-    except Exception as e:
+    except Exception:
         # Catch any other unexpected errors during token processing
-        print(f"TokenAuthMiddleware: Unexpected error during token validation: {e}")
+        logger.exception("TokenAuthMiddleware: unexpected error during token validation")
         return AnonymousUser()
 
 class TokenAuthMiddleware:
@@ -58,16 +185,14 @@ class TokenAuthMiddleware:
         parsed_query = parse_qs(query_string)
         token = parsed_query.get('token', [None])[0] # Get the first token value if present
 
-        print(f"TokenAuthMiddleware: Incoming scope path: {scope.get('path')}") # Debug log
-
         if token:
-            print(f"TokenAuthMiddleware: Token found in query string. Attempting auth...") # Debug log
             # Asynchronously get the user associated with the token
-            scope['user'] = await get_user_from_token(token) 
+            scope['user'] = await get_user_from_token(token)
+            logger.debug("TokenAuthMiddleware: %s authenticated as %s", scope.get('path'), scope['user'])
         else:
             # If no token, default to AnonymousUser
-            print("TokenAuthMiddleware: No token found in query string.") # Debug log
+            logger.debug("TokenAuthMiddleware: no token for %s", scope.get('path'))
             scope['user'] = AnonymousUser()
 
         # Continue processing the request down the middleware chain
-        return await self.app(scope, receive, send)
\ No newline at end of file
+        return await self.app(scope, receive, send)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_customuser_designation_alter_grievance_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['-created_at', '-id'], name='grievance_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='grievance_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(fields=['submitted_by', '-created_at', '-id'], name='grievance_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(condition=models.Q(('status__in', ['SUBMITTED', 'PENDING'])), fields=['-created_at', '-id'], name='grievance_unresolved_idx'),
+        ),
+    ]
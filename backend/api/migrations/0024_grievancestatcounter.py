@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:38
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Grievance = apps.get_model('api', 'Grievance')
+    GrievanceStatCounter = apps.get_model('api', 'GrievanceStatCounter')
+    rows = Grievance.objects.order_by().values('status', 'priority').annotate(n=Count('id'))
+    GrievanceStatCounter.objects.bulk_create([
+        GrievanceStatCounter(status=row['status'], priority=row['priority'], count=row['n'])
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_grievance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrievanceStatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('priority', models.CharField(max_length=10)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('status', 'priority'), name='grievance_stat_counter_key')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Full-text search support for grievances (see api/search.py).
+# The search structures are backend-specific and live outside the model
+# state: a generated tsvector column + GIN index on PostgreSQL, an FTS5
+# table on SQLite. Other backends get nothing and search falls back to
+# icontains.
+
+from django.db import migrations
+
+
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE api_grievance ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX grievance_search_idx ON api_grievance USING GIN (search_vector)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS grievance_search_idx",
+    "ALTER TABLE api_grievance DROP COLUMN IF EXISTS search_vector",
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE api_grievance_fts USING fts5(title, description, tokenize='porter unicode61')",
+    "INSERT INTO api_grievance_fts (rowid, title, description) SELECT id, title, description FROM api_grievance",
+]
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS api_grievance_fts",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_outboundemail'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_REVERSE, 'sqlite': SQLITE_REVERSE}),
+        ),
+    ]
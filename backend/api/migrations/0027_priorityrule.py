@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:43
+
+from django.db import migrations, models
+
+# The keywords perform_create used to hard-code
+DEFAULT_HIGH_PRIORITY_KEYWORDS = ['urgent', 'emergency', 'harassment', 'threat', 'safety', 'abuse', 'immediate']
+
+
+def seed_rules(apps, schema_editor):
+    PriorityRule = apps.get_model('api', 'PriorityRule')
+    PriorityRule.objects.bulk_create(
+        [PriorityRule(pattern=keyword, priority='HIGH') for keyword in DEFAULT_HIGH_PRIORITY_KEYWORDS],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_grievance_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriorityRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pattern', models.CharField(help_text='A word or phrase, matched as whole words, case-insensitive.', max_length=200, unique=True)),
+                ('priority', models.CharField(choices=[('HIGH', 'High'), ('MEDIUM', 'Medium'), ('LOW', 'Low')], default='HIGH', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['pattern'],
+            },
+        ),
+        migrations.RunPython(seed_rules, migrations.RunPython.noop),
+    ]
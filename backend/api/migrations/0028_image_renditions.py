@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_priorityrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_image_preview',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='profile_images/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='profile_images/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='grievance',
+            name='evidence_preview',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='grievance_evidence/renditions/'),
+        ),
+        migrations.AddField(
+            model_name='grievance',
+            name='evidence_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='grievance_evidence/renditions/'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_image',
+            field=models.ImageField(blank=True, max_length=255, null=True, upload_to='profile_images/'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_image_preview',
+            field=models.ImageField(blank=True, editable=False, max_length=255, null=True, upload_to='profile_images/renditions/'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, max_length=255, null=True, upload_to='profile_images/renditions/'),
+        ),
+        migrations.AlterField(
+            model_name='grievance',
+            name='evidence_image',
+            field=models.ImageField(blank=True, max_length=255, null=True, upload_to='grievance_evidence/'),
+        ),
+        migrations.AlterField(
+            model_name='grievance',
+            name='evidence_preview',
+            field=models.ImageField(blank=True, editable=False, max_length=255, null=True, upload_to='grievance_evidence/renditions/'),
+        ),
+        migrations.AlterField(
+            model_name='grievance',
+            name='evidence_thumbnail',
+            field=models.ImageField(blank=True, editable=False, max_length=255, null=True, upload_to='grievance_evidence/renditions/'),
+        ),
+    ]
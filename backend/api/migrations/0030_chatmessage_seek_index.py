@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['conversation', '-timestamp', '-id'], name='chatmessage_conv_ts_idx'),
+        ),
+    ]
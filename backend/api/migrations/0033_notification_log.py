@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_chatmessage_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationStream',
+            fields=[
+                ('key', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('last_seq', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(max_length=50)),
+                ('seq', models.PositiveBigIntegerField()),
+                ('event_type', models.CharField(max_length=50)),
+                ('payload', models.JSONField(default=dict)),
+                ('exclude_user_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='notification_log_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('stream', 'seq'), name='notification_log_stream_seq_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_notification_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrievanceSearchEntry',
+            fields=[
+                ('grievance', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='api.grievance')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('document', models.TextField(db_column='api_grievance_fts', editable=False)),
+            ],
+            options={
+                'db_table': 'api_grievance_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_grievancesearchentry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='grievance',
+            name='grievance_unresolved_idx',
+        ),
+        migrations.AddField(
+            model_name='grievance',
+            name='is_unresolved',
+            field=models.GeneratedField(db_persist=True, expression=models.Q(('status__in', ('SUBMITTED', 'PENDING'))), output_field=models.BooleanField()),
+        ),
+        migrations.AddIndex(
+            model_name='grievance',
+            index=models.Index(condition=models.Q(('is_unresolved', True)), fields=['-created_at', '-id'], name='grievance_unresolved_idx'),
+        ),
+    ]
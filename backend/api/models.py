@@ -1,7 +1,9 @@
 # backend/api/models.py
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
@@ -16,12 +18,28 @@ class CustomUser(AbstractUser):
     admission_number = models.CharField(max_length=100, unique=True, null=True, blank=True)
     phone_number = models.CharField(max_length=15, null=True, blank=True)
     college_email = models.EmailField(max_length=255, unique=True, null=True, blank=True)
-    profile_image = models.ImageField(upload_to='profile_images/', null=True, blank=True)
+    # Stored under a content hash (api.storage), hence the longer max_length
+    profile_image = models.ImageField(upload_to='profile_images/', max_length=255, null=True, blank=True)
+    # Generated from profile_image by api.images off the request thread
+    profile_image_thumbnail = models.ImageField(upload_to='profile_images/renditions/', max_length=255, null=True, blank=True, editable=False)
+    profile_image_preview = models.ImageField(upload_to='profile_images/renditions/', max_length=255, null=True, blank=True, editable=False)
     designation = models.CharField(max_length=100, blank=True, null=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_access()
+        return instance
+
+    def _remember_access(self):
+        # The (role, is_active) open chat sockets were authorized against; see signals.revoke_chat_access
+        self._access_key = (self.__dict__.get('role'), self.__dict__.get('is_active'))
+
     def save(self, *args, **kwargs):
         if self.college_email:
             self.email = self.college_email
         super().save(*args, **kwargs)
+        self._remember_access()
 
 class Grievance(models.Model):
     STATUS_CHOICES = [
@@ -32,6 +50,9 @@ class Grievance(models.Model):
         ('ACTION_TAKEN', 'Action Taken'),
         ('RESOLVED', 'Resolved'),
     ]
+    # 'PENDING' predates the current choices but may still exist in old rows
+    LEGACY_STATUSES = ('PENDING',)
+    UNRESOLVED_STATUSES = ('SUBMITTED', 'PENDING')
     PRIORITY_CHOICES = [
         ('HIGH', 'High'),
         ('MEDIUM', 'Medium'),
@@ -43,10 +64,152 @@ class Grievance(models.Model):
     description = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='SUBMITTED')
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='LOW')
-    evidence_image = models.ImageField(upload_to='grievance_evidence/', null=True, blank=True)
+    # Stored under a content hash (api.storage), hence the longer max_length
+    evidence_image = models.ImageField(upload_to='grievance_evidence/', max_length=255, null=True, blank=True)
+    # Generated from evidence_image by api.images off the request thread
+    evidence_thumbnail = models.ImageField(upload_to='grievance_evidence/renditions/', max_length=255, null=True, blank=True, editable=False)
+    evidence_preview = models.ImageField(upload_to='grievance_evidence/renditions/', max_length=255, null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # What ?status_filter=unresolved and grievance_unresolved_idx test. SQLite
+    # only uses a partial index when the query repeats its condition, which
+    # `status IN (%s, %s)` with bound values never does; this column can be.
+    is_unresolved = models.GeneratedField(
+        expression=models.Q(status__in=UNRESOLVED_STATUSES),
+        output_field=models.BooleanField(),
+        db_persist=True,
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_counted_key()
+        return instance
+
+    def _remember_counted_key(self):
+        # The (status, priority) this row is currently counted under in GrievanceStatCounter
+        self._counted_key = (self.__dict__.get('status'), self.__dict__.get('priority'))
+
+    def save(self, *args, **kwargs):
+        # Keep GrievanceStatCounter in step with this row, in the same transaction
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            old_key = None
+            if not adding and (update_fields is None or {'status', 'priority'} & set(update_fields)):
+                # Read what the row is counted under now, locked until commit: this
+                # instance may be stale if another request changed the status since
+                # it was loaded, and its _counted_key would count the change twice.
+                old_key = (
+                    Grievance.objects.select_for_update()
+                    .filter(pk=self.pk).values_list('status', 'priority').first()
+                )
+            super().save(*args, **kwargs)
+            new_key = (self.status, self.priority)
+            if adding:
+                GrievanceStatCounter.objects.adjust_many({new_key: 1})
+            elif old_key is not None and old_key != new_key:
+                GrievanceStatCounter.objects.adjust_many({old_key: -1, new_key: 1})
+        self._remember_counted_key()
+
+    class Meta:
+        # Every list query orders by (-created_at, -id); these match the
+        # GrievanceViewSet filters so the first page is read straight off an index.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='grievance_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='grievance_status_created_idx'),
+            models.Index(fields=['submitted_by', '-created_at', '-id'], name='grievance_owner_created_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='grievance_unresolved_idx',
+                condition=models.Q(is_unresolved=True),
+            ),
+        ]
+
+class PriorityRule(models.Model):
+    """
+    Admin-editable keyword or phrase that raises a grievance's priority when it
+    appears as whole words in the title or description (see api.priority).
+    """
+    pattern = models.CharField(max_length=200, unique=True, help_text='A word or phrase, matched as whole words, case-insensitive.')
+    priority = models.CharField(max_length=10, choices=Grievance.PRIORITY_CHOICES, default='HIGH')
+    is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        ordering = ['pattern']
+
+    def __str__(self):
+        return f'{self.pattern} -> {self.priority}'
+
+class GrievanceSearchEntry(models.Model):
+    """
+    A grievance's row in the SQLite FTS5 table (created by migration 0026 and
+    kept in sync by api.search), mapped so searches can join it once.
+    """
+    grievance = models.OneToOneField(
+        Grievance, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='search_entry',
+    )
+    title = models.TextField()
+    description = models.TextField()
+    # FTS5's hidden column named after the table; the left side of MATCH
+    document = models.TextField(db_column='api_grievance_fts', editable=False)
+
+    class Meta:
+        managed = False
+        db_table = 'api_grievance_fts'
+
+class GrievanceStatCounterManager(models.Manager):
+    def adjust_many(self, deltas):
+        """
+        Apply {(status, priority): delta} to the counters. Call inside the
+        transaction that changes the grievances so the two never drift.
+        """
+        for (status, priority), delta in deltas.items():
+            if not delta:
+                continue
+            updated = self.filter(status=status, priority=priority).update(count=F('count') + delta)
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    self.create(status=status, priority=priority, count=delta)
+            except IntegrityError:
+                # Another transaction created the row first
+                self.filter(status=status, priority=priority).update(count=F('count') + delta)
+
+    def status_totals(self):
+        """Totals per status value (legacy ones included) plus 'total'."""
+        totals = {value: 0 for value, _label in Grievance.STATUS_CHOICES}
+        totals.update({value: 0 for value in Grievance.LEGACY_STATUSES})
+        for status, count in self.values_list('status', 'count'):
+            totals[status] = totals.get(status, 0) + count
+        totals['total'] = sum(totals.values())
+        return totals
+
+
+class GrievanceStatCounter(models.Model):
+    """
+    Running number of grievances per (status, priority), maintained by
+    Grievance.save() and the post_delete signal so the stats endpoint never
+    has to count the grievance table. `rebuild_grievance_stats` reconciles it.
+    """
+    status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=10)
+    count = models.BigIntegerField(default=0)
+
+    objects = GrievanceStatCounterManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['status', 'priority'], name='grievance_stat_counter_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.status}/{self.priority}: {self.count}'
+
 class Conversation(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='conversation')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -58,11 +221,60 @@ class ChatMessage(models.Model):
     conversation = models.ForeignKey(Conversation, related_name='messages', on_delete=models.CASCADE, null=True)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so write-behind rows (api.chat_persistence)
+    # keep the time they were received, not the time they were flushed
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Seek index for /conversations/{id}/messages/ (keyset on timestamp, id)
+            models.Index(fields=['conversation', '-timestamp', '-id'], name='chatmessage_conv_ts_idx'),
+        ]
 
     def __str__(self):
         return f'Message by {self.user.username}'
 
+class ConversationReadCursorManager(models.Manager):
+    def advance(self, user, conversation_id, message):
+        """
+        Move the user's cursor forward to `message` (a ChatMessage). Never
+        moves it backwards, so late or out-of-order calls are harmless.
+        """
+        position = (message.timestamp, message.id)
+        with transaction.atomic():
+            cursor, created = self.select_for_update().get_or_create(
+                user=user, conversation_id=conversation_id,
+                defaults={'last_read_message': message, 'last_read_at': message.timestamp},
+            )
+            if not created and (cursor.last_read_at, cursor.last_read_message_id or 0) < position:
+                cursor.last_read_message = message
+                cursor.last_read_at = message.timestamp
+                cursor.save(update_fields=['last_read_message', 'last_read_at', 'updated_at'])
+        return cursor
+
+
+class ConversationReadCursor(models.Model):
+    """
+    How far one user has read one conversation. The timestamp of the last read
+    message is copied here so unread counts can seek the (conversation,
+    timestamp, id) message index instead of scanning the conversation.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='read_cursors')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_cursors')
+    last_read_message = models.ForeignKey(ChatMessage, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_read_at = models.DateTimeField()  # timestamp of last_read_message
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ConversationReadCursorManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'conversation'], name='conversation_read_cursor_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} read conversation {self.conversation_id} up to {self.last_read_at}'
+
 class GrievanceComment(models.Model):
     grievance = models.ForeignKey(Grievance, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey('api.CustomUser', on_delete=models.CASCADE)
@@ -70,4 +282,92 @@ class GrievanceComment(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f'Comment by {self.user.username} on {self.grievance.title}'
\ No newline at end of file
+        return f'Comment by {self.user.username} on {self.grievance.title}'
+
+class OutboundEmail(models.Model):
+    """
+    Durable outbox row. Request handlers only insert these (see
+    api.mail_queue); a background worker sends them in batches over one SMTP
+    connection and retries failures with exponential backoff.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest time the row may be (re)tried. A worker that claims a row pushes
+    # this forward by a lease, so a crashed worker's rows are retried later.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.recipients)} ({self.status})'
+
+class NotificationStream(models.Model):
+    """Sequence counter for one notification stream ('user:<id>' or 'staff')."""
+    key = models.CharField(max_length=50, primary_key=True)
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.key} at {self.last_seq}'
+
+
+class NotificationLogManager(models.Manager):
+    def append(self, stream, event_type, payload, exclude_user_id=None):
+        """Log one event under the stream's next sequence number."""
+        with transaction.atomic():
+            counters = NotificationStream.objects.filter(key=stream)
+            if not counters.update(last_seq=F('last_seq') + 1):
+                NotificationStream.objects.get_or_create(key=stream)
+                counters.update(last_seq=F('last_seq') + 1)
+            # The UPDATE holds the counter row's lock until commit
+            seq = counters.values_list('last_seq', flat=True).get()
+            return self.create(
+                stream=stream, seq=seq, event_type=event_type,
+                payload=payload, exclude_user_id=exclude_user_id,
+            )
+
+    def heads(self, streams):
+        """{stream: last sequence number} for the given streams (0 if unused)."""
+        found = dict(NotificationStream.objects.filter(key__in=streams).values_list('key', 'last_seq'))
+        return {stream: found.get(stream, 0) for stream in streams}
+
+
+class NotificationLog(models.Model):
+    """
+    Every notification published through api.notifications, numbered per
+    stream, so a reconnecting NotificationConsumer can replay what it missed.
+    Pruned by the prune_notifications command.
+    """
+    stream = models.CharField(max_length=50)  # 'user:<id>' or 'staff'
+    seq = models.PositiveBigIntegerField()
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    exclude_user_id = models.BigIntegerField(null=True, blank=True)  # not replayed to this user
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = NotificationLogManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stream', 'seq'], name='notification_log_stream_seq_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='notification_log_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.stream}#{self.seq} {self.event_type}'
@@ -0,0 +1,218 @@
+# backend/api/notifications.py
+
+"""
+Fan-out for NotificationConsumer.
+
+Every notification socket joins its user's group (user_notifications_<id>)
+and staff sockets also join admin_notifications. Publishing is one
+group_send per event, whatever the number of staff: the channel layer does
+the fan-out. Events use type 'notify' (NotificationConsumer.notify) and
+reach the client as {'type': event_type, 'payload': ...}.
+
+Events are sent after the surrounding transaction commits. exclude_user_id
+lets a staff member's own message skip their own sockets in the staff group.
+
+Nothing is published to a group with no open socket (api.presence). A chat
+message for an offline student is emailed instead, at most once per
+PRESENCE_EMAIL_COOLDOWN seconds per student; staff who are all offline see
+the message through the inbox's unread counts.
+
+Chat notifications are coalesced per (group, event type, conversation): the
+first one opens a NOTIFICATION_COALESCE_WINDOW_MS window, later ones are
+folded into it, and one event goes out when the window closes, carrying the
+count and the latest preview ("5 new messages from X"). Windows are per
+process; a window of 0 sends every event straight away.
+
+Every event that goes out (merged or not, online or not) is first written to
+NotificationLog under the next sequence number of its stream: 'user:<id>'
+for one user, 'staff' for the staff group. Events carry 'stream' and 'seq',
+so a reconnecting NotificationConsumer replays only what the client missed;
+an offline user's events wait there for their next connection.
+"""
+
+import atexit
+import logging
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import metrics
+from .mail_queue import enqueue_email
+from .models import CustomUser, NotificationLog
+from .presence import claim_cooldown, is_online, staff_online
+
+logger = logging.getLogger(__name__)
+
+ADMIN_GROUP = 'admin_notifications'
+STAFF_STREAM = 'staff'
+STAFF_ROLES = ('admin', 'grievance_cell')
+PREVIEW_LENGTH = 200
+
+
+def user_group(user_id):
+    return f'user_notifications_{user_id}'
+
+
+def user_stream(user_id):
+    return f'user:{user_id}'
+
+
+def targets_for(user):
+    """(stream, group) pairs a NotificationConsumer for `user` follows."""
+    targets = [(user_stream(user.id), user_group(user.id))]
+    if user.role in STAFF_ROLES:
+        targets.append((STAFF_STREAM, ADMIN_GROUP))
+    return targets
+
+
+def _send(group, event):
+    try:
+        with metrics.channel_layer_send_seconds.time('notification'):
+            async_to_sync(get_channel_layer().group_send)(group, event)
+        metrics.ws_messages_broadcast.inc('notification')
+    except Exception:
+        logger.exception("Could not publish %s to %s", event.get('event_type'), group)
+
+
+def _record_and_send(target, event, live):
+    """Log the event under its stream's next seq; push it if anyone is listening."""
+    stream, group = target
+    try:
+        entry = NotificationLog.objects.append(
+            stream, event['event_type'], event['payload'], event.get('exclude_user_id'),
+        )
+        event = {**event, 'stream': stream, 'seq': entry.seq}
+    except Exception:
+        # Still push it live, unnumbered; only replay loses it
+        logger.exception("Could not log %s for %s", event['event_type'], stream)
+    if live:
+        _send(group, event)
+
+
+class NotificationCoalescer:
+    """Holds events for a short window and sends one merged event per key."""
+
+    def __init__(self):
+        self._pending = {}  # key -> [target, event, live]
+        self._lock = threading.Lock()
+
+    def add(self, key, target, event, live):
+        window = getattr(settings, 'NOTIFICATION_COALESCE_WINDOW_MS', 2000) / 1000.0
+        if window <= 0:
+            _record_and_send(target, event, live)
+            return
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1] = _merge(entry[1], event)
+                entry[2] = entry[2] or live
+                return
+            self._pending[key] = [target, event, live]
+        timer = threading.Timer(window, self._flush_from_timer, args=(key,))
+        timer.daemon = True
+        timer.start()
+
+    def _flush_from_timer(self, key):
+        try:
+            self.flush(key)
+        finally:
+            close_old_connections()
+
+    def flush(self, key):
+        with self._lock:
+            entry = self._pending.pop(key, None)
+        if entry is not None:
+            _record_and_send(*entry)
+
+    def flush_all(self):
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self.flush(key)
+
+
+def _merge(held, new):
+    """The newer event, counting everything folded into it."""
+    payload = dict(new['payload'])
+    payload['count'] = held['payload'].get('count', 1) + payload.get('count', 1)
+    payload['message'] = f"{payload['count']} new messages from {payload['sender_name']}"
+    return {**new, 'payload': payload}
+
+
+coalescer = NotificationCoalescer()
+atexit.register(coalescer.flush_all)
+
+
+def _deliver(target, event, live, coalesce_key=None):
+    if coalesce_key is None:
+        _record_and_send(target, event, live)
+    else:
+        coalescer.add((target, event['event_type'], coalesce_key), target, event, live)
+
+
+def _event(event_type, payload, exclude_user_id=None):
+    event = {'type': 'notify', 'event_type': event_type, 'payload': payload}
+    if exclude_user_id is not None:
+        event['exclude_user_id'] = exclude_user_id
+    return event
+
+
+def notify_user(user_id, event_type, payload, offline=None, coalesce_key=None):
+    """Log and send to one user's sockets; if they have none, call `offline()`."""
+    event = _event(event_type, payload)
+
+    def deliver():
+        online = is_online(user_id)
+        _deliver((user_stream(user_id), user_group(user_id)), event, online, coalesce_key)
+        if not online and offline is not None:
+            offline()
+    transaction.on_commit(deliver)
+
+
+def notify_staff(event_type, payload, exclude_user_id=None, coalesce_key=None):
+    event = _event(event_type, payload, exclude_user_id)
+
+    def deliver():
+        _deliver((STAFF_STREAM, ADMIN_GROUP), event, staff_online(), coalesce_key)
+    transaction.on_commit(deliver)
+
+
+def _email_offline_user(user_id, subject, body):
+    if not claim_cooldown(f'email:{user_id}', getattr(settings, 'PRESENCE_EMAIL_COOLDOWN', 900)):
+        return
+    addresses = CustomUser.objects.filter(id=user_id).values_list('college_email', 'email').first()
+    if addresses:
+        enqueue_email(subject, body, [addresses[0] or addresses[1]])
+
+
+def notify_chat_message(message):
+    """
+    A student's message goes to every staff member at once; a staff reply
+    goes to the student who owns the conversation.
+    """
+    sender = message.user
+    payload = {
+        'message': f'New message from {sender.name or sender.username}',
+        'sender_name': sender.name or sender.username,
+        'conversation_id': message.conversation_id,
+        'message_id': message.id,
+        'preview': message.message[:PREVIEW_LENGTH],
+        'count': 1,
+    }
+    if sender.role in STAFF_ROLES:
+        owner_id = message.conversation.user_id
+        if owner_id != sender.id:
+            notify_user(
+                owner_id, 'new_chat_message', payload, coalesce_key=message.conversation_id,
+                offline=lambda: _email_offline_user(
+                    owner_id,
+                    f"New message from {payload['sender_name']}",
+                    f"{payload['sender_name']} replied in your grievance chat:\n\n{payload['preview']}\n\n"
+                    "Sign in to the grievance portal to reply.",
+                ),
+            )
+    else:
+        notify_staff('new_chat_message', payload, exclude_user_id=sender.id, coalesce_key=message.conversation_id)
@@ -0,0 +1,236 @@
+# backend/api/pagination.py
+
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a fixed, unique ordering.
+
+    The cursor carries the ordering values of the last row served, so each
+    page is fetched with a `WHERE (a, b) < (x, y) ... LIMIT n` query instead of
+    an OFFSET scan. Page cost stays constant however deep the client goes, and
+    rows inserted while a client is paging never shift later pages.
+
+    `ordering` must end in a unique column (normally `id`) and every field
+    must sort in the same direction.
+    """
+    ordering = ('-id',)
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        fields = self.get_ordering(view)
+        self.fields = fields
+        self.descending = fields[0].startswith('-')
+        self.field_names = [f.lstrip('-') for f in fields]
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor['reverse'])
+
+        queryset = queryset.order_by(*self._ordering(reverse))
+        if cursor:
+            queryset = queryset.filter(self._seek_filter(cursor['position'], reverse))
+
+        # Fetch one extra row to learn whether another page exists.
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.page = rows
+        if reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    # --- Configuration -------------------------------------------------
+
+    def get_ordering(self, view):
+        ordering = getattr(view, 'pagination_ordering', None) or self.ordering
+        directions = {f.startswith('-') for f in ordering}
+        assert len(directions) == 1, 'KeysetPagination fields must all sort in the same direction.'
+        return tuple(ordering)
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+        try:
+            size = int(raw)
+        except (TypeError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    # --- Links ---------------------------------------------------------
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Ran off the end: step back from wherever the cursor pointed.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii'))
+            position = payload['p']
+            if not isinstance(position, list) or len(position) != len(self.field_names):
+                raise ValueError
+            values = [self._to_python(model, name, value) for name, value in zip(self.field_names, position)]
+            return {'position': values, 'reverse': bool(payload.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    # --- Query building ------------------------------------------------
+
+    def _ordering(self, reverse):
+        if not reverse:
+            return self.fields
+        return tuple(name if f.startswith('-') else '-' + name for f, name in zip(self.fields, self.field_names))
+
+    def _seek_filter(self, position, reverse):
+        # Rows strictly "after" the cursor in the direction being walked:
+        # (a < x) OR (a = x AND b < y) OR ... for a descending walk.
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.field_names):
+            term = Q(**{f'{name}__{lookup}': position[i]})
+            for prior, value in zip(self.field_names[:i], position[:i]):
+                term &= Q(**{prior: value})
+            condition |= term
+        return condition
+
+    def _position(self, instance):
+        return [self._to_json(getattr(instance, name)) for name in self.field_names]
+
+    @staticmethod
+    def _to_json(value):
+        # isoformat() keeps microseconds, which the cursor needs to be exact.
+        if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotated ordering values (e.g. a rank) are plain JSON numbers.
+            return value
+        return field.to_python(value)
+
+
+class GrievanceCursorPagination(KeysetPagination):
+    """Newest-first pages of grievances, keyed on (created_at, id)."""
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'GRIEVANCE_PAGE_SIZE', 50)
+    max_page_size = getattr(settings, 'GRIEVANCE_MAX_PAGE_SIZE', 200)
+
+
+class ChatMessagePagination(KeysetPagination):
+    """
+    One conversation's messages, newest first, keyed on (timestamp, id).
+
+    `?before=<cursor>` pages back into older messages and `?after=<cursor>`
+    fetches newer ones (e.g. to catch up after a reconnect). The `next` link
+    always points at older messages and `previous` at newer ones.
+    """
+    ordering = ('-timestamp', '-id')
+    page_size = getattr(settings, 'CHAT_PAGE_SIZE', 50)
+    max_page_size = getattr(settings, 'CHAT_MAX_PAGE_SIZE', 200)
+    before_query_param = 'before'
+    after_query_param = 'after'
+
+    def encode_cursor(self, position, reverse):
+        token = base64.urlsafe_b64encode(
+            json.dumps(position, separators=(',', ':')).encode('ascii')
+        ).decode('ascii')
+        param, other = (
+            (self.after_query_param, self.before_query_param) if reverse
+            else (self.before_query_param, self.after_query_param)
+        )
+        return replace_query_param(remove_query_param(self.base_url, other), param, token)
+
+    def decode_cursor(self, request, model):
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+        if before and after:
+            raise NotFound('Use either before or after, not both.')
+        token = before or after
+        if not token:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii'))
+            if not isinstance(position, list) or len(position) != len(self.field_names):
+                raise ValueError
+            values = [self._to_python(model, name, value) for name, value in zip(self.field_names, position)]
+        except (TypeError, ValueError, UnicodeError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'position': values, 'reverse': bool(after)}
+
+    def get_previous_link(self):
+        if self.has_previous and not self.page:
+            # Paged past the oldest message: newer ones start from the top.
+            return remove_query_param(
+                remove_query_param(self.base_url, self.before_query_param), self.after_query_param
+            )
+        return super().get_previous_link()
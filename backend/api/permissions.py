@@ -1,5 +1,24 @@
 # api/permissions.py
 from rest_framework import permissions
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+def authenticated_user(request):
+    """
+    The user behind a plain Django request: the session user if there is
+    one, else the user of a valid JWT bearer token, else None. For views and
+    middleware that run outside DRF's authentication.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except APIException:
+        return None
+    return result[0] if result else None
+
 
 class IsAdminOrGrievanceCell(permissions.BasePermission):
     """
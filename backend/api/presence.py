@@ -0,0 +1,228 @@
+# backend/api/presence.py
+
+"""
+Who has a socket open right now.
+
+ChatConsumer and NotificationConsumer register each socket on connect,
+refresh it on every client heartbeat and drop it on disconnect. A socket
+whose heartbeats stop (a dead worker, a lost network) expires after
+PRESENCE_TTL seconds. api.notifications asks the registry before publishing,
+so events for users with no open socket never reach the channel layer.
+
+Two backends, chosen by PRESENCE_BACKEND ('auto' by default):
+- 'redis' keeps one sorted set per online user (socket -> expiry) in the
+  channel layer's Redis, so every worker sees the same state. Keys exist only
+  while the user is online, so Redis usage follows online users.
+- 'memory' keeps the same structure in this process. 'auto' uses it whenever
+  the channel layer is InMemoryChannelLayer (development, tests), which is
+  single-process anyway.
+
+Registry errors fail open: a user is treated as online, which is the
+behaviour from before presence existed.
+"""
+
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STAFF_KEY = 'staff'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _ttl():
+    return _setting('PRESENCE_TTL', 90)
+
+
+class MemoryPresence:
+    def __init__(self):
+        self._sockets = {}  # key -> {channel_name: expires_at}
+        self._cooldowns = {}  # key -> expires_at
+        self._lock = threading.Lock()
+
+    def _live(self, key, now):
+        sockets = self._sockets.get(key)
+        if not sockets:
+            return 0
+        for channel_name in [c for c, expires in sockets.items() if expires <= now]:
+            del sockets[channel_name]
+        if not sockets:
+            del self._sockets[key]
+        return len(sockets)
+
+    def add(self, keys, channel_name):
+        expires = time.time() + _ttl()
+        with self._lock:
+            for key in keys:
+                self._sockets.setdefault(key, {})[channel_name] = expires
+
+    def remove(self, keys, channel_name):
+        with self._lock:
+            for key in keys:
+                sockets = self._sockets.get(key, {})
+                sockets.pop(channel_name, None)
+                if not sockets:
+                    self._sockets.pop(key, None)
+
+    def online(self, keys):
+        now = time.time()
+        with self._lock:
+            return {key for key in keys if self._live(key, now)}
+
+    def claim(self, key, seconds):
+        now = time.time()
+        with self._lock:
+            if self._cooldowns.get(key, 0) > now:
+                return False
+            self._cooldowns[key] = now + seconds
+            return True
+
+
+class RedisPresence:
+    prefix = 'presence:'
+
+    def __init__(self, url):
+        import redis  # installed with channels_redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def add(self, keys, channel_name):
+        now = time.time()
+        ttl = _ttl()
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            name = self.prefix + key
+            pipe.zremrangebyscore(name, '-inf', now)
+            pipe.zadd(name, {channel_name: now + ttl})
+            pipe.expire(name, ttl)
+        pipe.execute()
+
+    def remove(self, keys, channel_name):
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zrem(self.prefix + key, channel_name)
+        pipe.execute()
+
+    def online(self, keys):
+        keys = list(keys)
+        if not keys:
+            return set()
+        now = time.time()
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zcount(self.prefix + key, f'({now}', '+inf')
+        return {key for key, count in zip(keys, pipe.execute()) if count}
+
+    def claim(self, key, seconds):
+        return bool(self._client.set(f'{self.prefix}cooldown:{key}', 1, nx=True, ex=max(1, int(seconds))))
+
+
+def _redis_url():
+    url = _setting('PRESENCE_REDIS_URL', None)
+    if url:
+        return url
+    hosts = _setting('CHANNEL_LAYERS', {}).get('default', {}).get('CONFIG', {}).get('hosts') or []
+    host = hosts[0] if hosts else ('127.0.0.1', 6379)
+    if isinstance(host, str):
+        return host
+    if isinstance(host, dict):
+        return host.get('address', 'redis://127.0.0.1:6379')
+    return f'redis://{host[0]}:{host[1]}'
+
+
+def _build():
+    backend = _setting('PRESENCE_BACKEND', 'auto')
+    if backend == 'auto':
+        layer = _setting('CHANNEL_LAYERS', {}).get('default', {}).get('BACKEND', '')
+        backend = 'memory' if layer.endswith('InMemoryChannelLayer') else 'redis'
+    if backend == 'redis':
+        return RedisPresence(_redis_url())
+    return MemoryPresence()
+
+
+_registry = None
+_registry_key = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry, _registry_key
+    # Rebuilt when the settings it depends on change (override_settings in tests)
+    key = (
+        _setting('PRESENCE_BACKEND', 'auto'), _setting('PRESENCE_REDIS_URL', None),
+        repr(_setting('CHANNEL_LAYERS', {}).get('default')),
+    )
+    with _registry_lock:
+        if _registry is None or _registry_key != key:
+            _registry = _build()
+            _registry_key = key
+    return _registry
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def _keys_for(user):
+    keys = [user_key(user.id)]
+    if user.role in ('admin', 'grievance_cell'):
+        keys.append(STAFF_KEY)
+    return keys
+
+
+def mark_online(user, channel_name):
+    """Register (or refresh, on heartbeat) one open socket."""
+    try:
+        get_registry().add(_keys_for(user), channel_name)
+    except Exception:
+        logger.exception("Presence update failed for user %s", user.id)
+
+
+def mark_offline(user, channel_name):
+    try:
+        get_registry().remove(_keys_for(user), channel_name)
+    except Exception:
+        logger.exception("Presence removal failed for user %s", user.id)
+
+
+def online_user_ids(user_ids):
+    user_ids = set(user_ids)
+    try:
+        online = get_registry().online(user_key(user_id) for user_id in user_ids)
+    except Exception:
+        logger.exception("Presence lookup failed")
+        return user_ids
+    return {user_id for user_id in user_ids if user_key(user_id) in online}
+
+
+def is_online(user_id):
+    return user_id in online_user_ids([user_id])
+
+
+def staff_online():
+    try:
+        return bool(get_registry().online([STAFF_KEY]))
+    except Exception:
+        logger.exception("Presence lookup failed")
+        return True
+
+
+def claim_cooldown(key, seconds):
+    """True at most once per `seconds` for `key` (e.g. offline email throttling)."""
+    try:
+        return get_registry().claim(key, seconds)
+    except Exception:
+        logger.exception("Presence cooldown failed for %s", key)
+        return False
+
+
+# Consumers call these; the Redis client is blocking, so run it off the loop
+amark_online = sync_to_async(mark_online, thread_sensitive=False)
+amark_offline = sync_to_async(mark_offline, thread_sensitive=False)
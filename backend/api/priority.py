@@ -0,0 +1,104 @@
+# backend/api/priority.py
+
+"""
+Priority classification for new grievances.
+
+Active PriorityRule rows are compiled into a word-level trie: the text is
+tokenised once, and a match is attempted from each token by walking the trie.
+The cost is O(tokens x longest phrase), independent of how many rules exist,
+and every match is on whole words by construction.
+
+The compiled classifier is cached per process. Saving or deleting a rule
+drops the local copy immediately (signals.py); other processes notice within
+PRIORITY_RULES_RECHECK_SECONDS by comparing a cheap (count, max updated_at)
+version of the rule table.
+"""
+
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import PriorityRule
+
+DEFAULT_PRIORITY = 'LOW'
+PRIORITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2}
+TOP_PRIORITY = max(PRIORITY_RANK, key=PRIORITY_RANK.get)
+
+_WORD_RE = re.compile(r'\w+')
+_END = object()  # trie key marking "a phrase ends here"
+
+
+def tokenize(text):
+    return _WORD_RE.findall((text or '').lower())
+
+
+class PriorityClassifier:
+    def __init__(self, rules):
+        """`rules` is an iterable of (pattern, priority) pairs."""
+        self._trie = {}
+        self.rule_count = 0
+        for pattern, priority in rules:
+            words = tokenize(pattern)
+            if not words:
+                continue
+            node = self._trie
+            for word in words:
+                node = node.setdefault(word, {})
+            # Two rules with the same words keep the higher priority.
+            current = node.get(_END)
+            if current is None or PRIORITY_RANK[priority] > PRIORITY_RANK[current]:
+                node[_END] = priority
+            self.rule_count += 1
+
+    def classify(self, *texts):
+        best = DEFAULT_PRIORITY
+        for text in texts:
+            tokens = tokenize(text)
+            for start in range(len(tokens)):
+                node = self._trie
+                for token in tokens[start:]:
+                    node = node.get(token)
+                    if node is None:
+                        break
+                    priority = node.get(_END)
+                    if priority and PRIORITY_RANK[priority] > PRIORITY_RANK[best]:
+                        best = priority
+                        if best == TOP_PRIORITY:
+                            return best
+        return best
+
+
+_lock = threading.Lock()
+_cached = {'classifier': None, 'version': None, 'checked_at': 0.0}
+
+
+def _rules_version():
+    stats = PriorityRule.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    return (stats['count'], stats['latest'])
+
+
+def get_classifier():
+    recheck = getattr(settings, 'PRIORITY_RULES_RECHECK_SECONDS', 30)
+    now = time.monotonic()
+    with _lock:
+        if _cached['classifier'] is not None and now - _cached['checked_at'] < recheck:
+            return _cached['classifier']
+        version = _rules_version()
+        if _cached['classifier'] is None or version != _cached['version']:
+            rules = PriorityRule.objects.filter(is_active=True).values_list('pattern', 'priority')
+            _cached['classifier'] = PriorityClassifier(rules)
+            _cached['version'] = version
+        _cached['checked_at'] = now
+        return _cached['classifier']
+
+
+def invalidate_classifier():
+    with _lock:
+        _cached['classifier'] = None
+
+
+def classify_priority(title, description=''):
+    return get_classifier().classify(title, description)
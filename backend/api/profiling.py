@@ -0,0 +1,201 @@
+# backend/api/profiling.py
+
+"""
+Per-request profiling for the REST API.
+
+ProfilingMiddleware profiles a request when an admin sends the
+PROFILING_HEADER header (X-Profile: 1), or at random for a
+PROFILING_SAMPLE_RATE fraction of all requests. A profiled request records
+its wall time, number of queries, total time spent in the database, the
+PROFILING_TOP_QUERIES slowest statements with the line of project code that
+ran them, and the statements repeated most often (N+1 lookups).
+
+The totals go back to the client in a Server-Timing header (visible in the
+browser's network panel), and the whole profile is appended as one JSON
+line to PROFILING_LOG_PATH, rotated at PROFILING_LOG_MAX_BYTES. Statements
+slower than PROFILING_SLOW_QUERY_MS are also logged as warnings.
+`manage.py summarize_profiles` aggregates the log per endpoint.
+
+Requests that are not profiled pay for one header lookup and, with
+sampling on, one random number.
+"""
+
+import heapq
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import connection
+
+from .permissions import authenticated_user
+
+logger = logging.getLogger(__name__)
+
+SQL_PREVIEW_LENGTH = 500
+# Literals and placeholders, so the same statement with other values counts as a repeat
+_SQL_VALUES = re.compile(r"'(?:[^']|'')*'|\b\d+\b|%s|\?")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _project_root():
+    return os.path.abspath(str(settings.BASE_DIR)) + os.sep
+
+
+def _origin():
+    """'api/views.py:123 in stats' for the innermost project frame running the query."""
+    root = _project_root()
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and 'site-packages' not in filename and filename != __file__:
+            return f'{filename[len(root):]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that accounts every statement of one request."""
+
+    def __init__(self, top):
+        self.top = top
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []  # min-heap of (duration, seq, sql, origin)
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total += duration
+            self.statements[_SQL_VALUES.sub('?', sql)] += 1
+            # Only walk the stack for statements that make the top N
+            if len(self.slowest) < self.top or duration > self.slowest[0][0]:
+                entry = (duration, self.count, sql[:SQL_PREVIEW_LENGTH], _origin())
+                if len(self.slowest) < self.top:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heapreplace(self.slowest, entry)
+            if duration * 1000 >= _setting('PROFILING_SLOW_QUERY_MS', 100):
+                logger.warning("Slow query (%.1fms) at %s: %s", duration * 1000, _origin(), sql[:SQL_PREVIEW_LENGTH])
+
+    def slowest_queries(self):
+        return [
+            {'ms': round(duration * 1000, 3), 'sql': sql, 'origin': origin}
+            for duration, _, sql, origin in sorted(self.slowest, reverse=True)
+        ]
+
+    def repeated_queries(self, limit=3):
+        return [
+            {'count': count, 'sql': sql[:SQL_PREVIEW_LENGTH]}
+            for sql, count in self.statements.most_common(limit) if count > 1
+        ]
+
+
+_profile_log = None
+_profile_log_lock = threading.Lock()
+
+
+def profile_log():
+    """The logger writing profiles to PROFILING_LOG_PATH, created on first use."""
+    global _profile_log
+    with _profile_log_lock:
+        path = _setting('PROFILING_LOG_PATH', os.path.join(settings.BASE_DIR, 'profiles', 'profiles.jsonl'))
+        if _profile_log is None or _profile_log.path != path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=_setting('PROFILING_LOG_MAX_BYTES', 10 * 1024 * 1024),
+                backupCount=_setting('PROFILING_LOG_BACKUPS', 5), encoding='utf-8',
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            records = logging.Logger('api.profiling.records')  # not in the logging tree
+            records.addHandler(handler)
+            records.path = path
+            if _profile_log is not None:
+                for old in _profile_log.handlers:
+                    old.close()
+            _profile_log = records
+        return _profile_log
+
+
+def _requesting_admin(request):
+    """The user behind the request if they are an admin, by session or JWT."""
+    user = authenticated_user(request)
+    if user is not None and (user.is_superuser or getattr(user, 'role', None) == 'admin'):
+        return user
+    return None
+
+
+def _server_timing(profile):
+    return (
+        f'total;dur={profile["wall_ms"]}, '
+        f'db;dur={profile["db_ms"]};desc="{profile["queries"]} queries", '
+        f'profile;desc="{profile["id"]}"'
+    )
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def trigger(self, request):
+        if not _setting('PROFILING_ENABLED', True):
+            return None
+        header = _setting('PROFILING_HEADER', 'X-Profile')
+        if request.headers.get(header) and _requesting_admin(request) is not None:
+            return 'header'
+        rate = _setting('PROFILING_SAMPLE_RATE', 0.0)
+        if rate > 0 and random.random() < rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        trigger = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        queries = QueryRecorder(_setting('PROFILING_TOP_QUERIES', 5))
+        start = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        wall = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        profile = {
+            'id': uuid.uuid4().hex[:12],
+            'time': datetime.now(dt_timezone.utc).isoformat(),
+            'trigger': trigger,
+            'method': request.method,
+            'path': request.path,
+            'route': (match.view_name or match.route) if match else None,
+            'status': response.status_code,
+            'user_id': user.id if user is not None and user.is_authenticated else None,
+            'wall_ms': round(wall * 1000, 3),
+            'queries': queries.count,
+            'db_ms': round(queries.total * 1000, 3),
+            'slowest': queries.slowest_queries(),
+            'repeated': queries.repeated_queries(),
+        }
+        response['Server-Timing'] = _server_timing(profile)
+        try:
+            profile_log().info(json.dumps(profile))
+        except OSError:
+            logger.exception("Could not write profile %s", profile['id'])
+        return response
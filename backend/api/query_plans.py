@@ -0,0 +1,124 @@
+# backend/api/query_plans.py
+
+"""
+Query plans for the grievance and inbox read paths.
+
+Each function returns a queryset shaped for one serializer, so the number of
+SQL statements a response costs is fixed by the plan rather than by the
+number of rows. Views should build their querysets through these helpers
+instead of calling select_related/prefetch_related ad hoc.
+"""
+
+import datetime
+
+from django.db.models import Count, F, FilteredRelation, IntegerField, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Left
+
+from .models import ChatMessage, Conversation, Grievance, GrievanceComment
+
+# Longest last-message preview the inbox list carries
+INBOX_PREVIEW_LENGTH = 200
+_NEVER = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def grievance_comments_prefetch():
+    """Comments in posting order, each with its author joined in."""
+    return Prefetch(
+        'comments',
+        queryset=GrievanceComment.objects.select_related('user').order_by('timestamp', 'id'),
+    )
+
+
+def grievance_detail_queryset(queryset=None):
+    """
+    Plan for GrievanceSerializer: one query for the grievances (with
+    submitted_by and assigned_to joined) plus one for all of their comments.
+    """
+    if queryset is None:
+        queryset = Grievance.objects.all()
+    return queryset.select_related('submitted_by', 'assigned_to').prefetch_related(
+        grievance_comments_prefetch()
+    )
+
+
+def grievance_write_queryset(queryset=None):
+    """
+    Plan for actions that load a single grievance to modify it. Only the
+    users are joined (they are needed for notification emails); comments are
+    not loaded since the responses never include them.
+    """
+    if queryset is None:
+        queryset = Grievance.objects.all()
+    return queryset.select_related('submitted_by', 'assigned_to')
+
+
+def grievance_counter_snapshot():
+    """
+    Exact {(status, priority): count} for the whole grievance table, computed
+    with one conditional-aggregation pass. Used to reconcile GrievanceStatCounter.
+    """
+    statuses = [value for value, _label in Grievance.STATUS_CHOICES] + list(Grievance.LEGACY_STATUSES)
+    priorities = [value for value, _label in Grievance.PRIORITY_CHOICES]
+    aggregates = {
+        f'{status}__{priority}': Count('id', filter=Q(status=status, priority=priority))
+        for status in statuses
+        for priority in priorities
+    }
+    aggregates['total'] = Count('id')
+    result = Grievance.objects.order_by().aggregate(**aggregates)
+    snapshot = {
+        (status, priority): result[f'{status}__{priority}']
+        for status in statuses
+        for priority in priorities
+    }
+    # Rows with a status/priority outside the known choices are reported
+    # under their own keys so the counters still add up to the table size.
+    if sum(snapshot.values()) != result['total']:
+        known = Q(status__in=statuses, priority__in=priorities)
+        for row in Grievance.objects.order_by().exclude(known).values('status', 'priority').annotate(n=Count('id')):
+            snapshot[(row['status'], row['priority'])] = row['n']
+    return snapshot
+
+
+def conversation_inbox_queryset(user, queryset=None):
+    """
+    Plan for the inbox list: every conversation with its user joined in and
+    annotated, in the same statement, with
+
+      last_message / last_message_at - the newest message (preview) and time
+      unread_count - messages from others after `user`'s read cursor
+
+    sorted by latest activity. Each subquery is a seek on the
+    (conversation, timestamp, id) message index, so the cost grows with the
+    number of conversations, not with the number of messages.
+    """
+    if queryset is None:
+        queryset = Conversation.objects.all()
+    latest = ChatMessage.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-id')
+    unread = (
+        ChatMessage.objects
+        .filter(conversation=OuterRef('pk'))
+        .filter(
+            Q(timestamp__gt=OuterRef('read_at'))
+            | Q(timestamp=OuterRef('read_at'), id__gt=OuterRef('read_message_id'))
+        )
+        .exclude(user=user)
+        .order_by()
+        .values('conversation')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return (
+        queryset
+        .select_related('user')
+        # LEFT JOIN to this user's read cursor (at most one row per conversation)
+        .annotate(my_cursor=FilteredRelation('read_cursors', condition=Q(read_cursors__user=user)))
+        .annotate(
+            last_message=Subquery(latest.annotate(preview=Left('message', INBOX_PREVIEW_LENGTH)).values('preview')[:1]),
+            last_message_at=Subquery(latest.values('timestamp')[:1]),
+            read_at=Coalesce(F('my_cursor__last_read_at'), Value(_NEVER)),
+            read_message_id=Coalesce(F('my_cursor__last_read_message_id'), Value(0), output_field=IntegerField()),
+        )
+        .annotate(unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0)))
+        .order_by(F('last_message_at').desc(nulls_last=True), '-created_at', '-id')
+    )
@@ -0,0 +1,153 @@
+# backend/api/search.py
+
+"""
+Full-text search over grievance title and description.
+
+PostgreSQL: a generated `search_vector` tsvector column (title weighted above
+description) with a GIN index, matched with websearch_to_tsquery and ranked
+with ts_rank. SQLite: an FTS5 table keyed by grievance id (GrievanceSearchEntry),
+kept in sync by the post_save/post_delete receivers in signals.py, joined once
+and ranked with bm25. Both are created by migration 0026; other backends fall
+back to icontains.
+
+Queries use web-search syntax on both backends: words are ANDed, `"quoted
+phrase"` matches adjacent words, `-word` excludes and `or` between terms
+gives either. parse_query() reads it the way websearch_to_tsquery does and
+fts5_query() rewrites it for FTS5, which has no unary NOT: an exclusion-only
+query becomes "everything except the matches", and an exclusion-only
+alternative inside an `or` is dropped.
+
+search_grievances() annotates `search_rank` (higher is better) so the list
+endpoint can keyset-paginate on (-search_rank, -id).
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Lookup, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Grievance, GrievanceSearchEntry
+
+FTS_TABLE = GrievanceSearchEntry._meta.db_table
+# bm25 column weights (title, description), mirroring the A/B tsvector weights
+FTS_WEIGHTS = (10.0, 1.0)
+
+# An optional leading '-', then a quoted phrase (closing quote optional) or a bare term
+_TERM = re.compile(r'(-?)(?:"([^"]*)"?|([^\s"]+))')
+
+
+class FTS5Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+GrievanceSearchEntry._meta.get_field('document').register_lookup(FTS5Match)
+
+
+def parse_query(text):
+    """
+    Split web-search text into alternatives (split on `or`), each a pair of
+    (required, excluded) lists of phrases; a phrase is a tuple of words.
+    Operators with nothing to apply to are ignored, as in websearch_to_tsquery.
+    """
+    alternatives = [([], [])]
+    for minus, phrase, term in _TERM.findall(text):
+        if not minus and term.lower() == 'or':
+            if any(alternatives[-1]):
+                alternatives.append(([], []))
+            continue
+        words = tuple(re.findall(r'\w+', phrase or term))
+        if words:
+            alternatives[-1][1 if minus else 0].append(words)
+    return [alternative for alternative in alternatives if any(alternative)]
+
+
+def _fts5_phrase(words):
+    return '"%s"' % ' '.join(words)
+
+
+def fts5_query(text):
+    """
+    The FTS5 MATCH expression for web-search text, as (expression, exclude):
+    with exclude=True the results are the rows that do NOT match it.
+    (None, False) when the text has no searchable words.
+    """
+    alternatives = parse_query(text)
+    clauses = []
+    for required, excluded in alternatives:
+        if required:
+            clause = ' AND '.join(_fts5_phrase(words) for words in required)
+            clause += ''.join(' NOT ' + _fts5_phrase(words) for words in excluded)
+            clauses.append(f'({clause})')
+    if clauses:
+        return ' OR '.join(clauses), False
+    if alternatives:
+        # Only exclusions: "-a -b or -c" is NOT ((a OR b) AND c)
+        return ' AND '.join(
+            '(%s)' % ' OR '.join(_fts5_phrase(words) for words in excluded)
+            for _required, excluded in alternatives
+        ), True
+    return None, False
+
+
+def search_grievances(queryset, text):
+    text = (text or '').strip()
+    if not text:
+        return queryset
+    table = Grievance._meta.db_table
+    vendor = connection.vendor
+
+    if vendor == 'postgresql':
+        tsquery = "websearch_to_tsquery('english', %s)"
+        return queryset.filter(RawSQL(
+            f'"{table}"."search_vector" @@ {tsquery}', (text,), output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            # ts_rank() is float4; as float8 the value survives the round trip
+            # through the keyset cursor's JSON and compares equal again
+            f'ts_rank("{table}"."search_vector", {tsquery})::float8', (text,), output_field=FloatField()
+        ))
+
+    if vendor == 'sqlite':
+        match, exclude = fts5_query(text)
+        if match is None:
+            return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+        if exclude:
+            # Nothing to rank by: every result contains none of the terms
+            return queryset.exclude(
+                id__in=GrievanceSearchEntry.objects.filter(document__match=match).values('grievance')
+            ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        # Joins the FTS table (unaliased, as bm25() requires) and reads the
+        # rank from the matched row instead of re-running MATCH per grievance
+        return queryset.filter(search_entry__document__match=match).annotate(
+            # bm25() is lower-is-better; negate it so every backend sorts descending
+            search_rank=RawSQL(f'-bm25({FTS_TABLE}, {weights})', (), output_field=FloatField())
+        )
+
+    return queryset.filter(
+        Q(title__icontains=text) | Q(description__icontains=text)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def index_grievance(grievance):
+    """Refresh one grievance in the SQLite FTS table (PostgreSQL's column is generated)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [grievance.id])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [grievance.id, grievance.title, grievance.description],
+        )
+
+
+def unindex_grievance(grievance_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [grievance_id])
@@ -2,6 +2,7 @@
 
 from rest_framework import serializers
 from .models import CustomUser, Grievance, GrievanceComment, ChatMessage, Conversation
+from .presence import is_online
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 class AdminUserCreateSerializer(serializers.ModelSerializer):
@@ -57,6 +58,8 @@ class UserSerializer(serializers.ModelSerializer):
             'role',
             'college_email',
             'profile_image', # Will provide the URL path
+            'profile_image_thumbnail', # 160x160 WebP, null until processed
+            'profile_image_preview', # <=1024px WebP, null until processed
             'phone_number',
             'designation',
             'is_active', # Useful for admin views
@@ -64,7 +67,8 @@ class UserSerializer(serializers.ModelSerializer):
             'last_login'
         )
         # Fields that shouldn't typically be changed via this serializer directly
-        read_only_fields = ('username', 'role', 'is_active', 'date_joined', 'last_login')
+        read_only_fields = ('username', 'role', 'is_active', 'date_joined', 'last_login',
+                            'profile_image_thumbnail', 'profile_image_preview')
 
 class UserProfileUpdateSerializer(serializers.ModelSerializer):
     # Serializer used for updating specific user fields,
@@ -106,12 +110,24 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 class ConversationSerializer(serializers.ModelSerializer):
     # Embed info of the user associated with the conversation (usually the student)
     user = UserSerializer(read_only=True)
-    # Embed related messages, potentially limited or paginated in the view if needed
-    messages = ChatMessageSerializer(many=True, read_only=True)
+    # Messages are not embedded; clients page through /conversations/{id}/messages/
+    # Inbox summary, annotated by query_plans.conversation_inbox_queryset
+    last_message = serializers.CharField(read_only=True, allow_null=True, default=None)
+    last_message_at = serializers.DateTimeField(read_only=True, allow_null=True, default=None)
+    unread_count = serializers.IntegerField(read_only=True, default=0)
+    # Whether the conversation's owner has a socket open (api.presence)
+    is_online = serializers.SerializerMethodField()
     class Meta:
         model = Conversation
-        fields = ('id', 'user', 'created_at', 'messages')
-        read_only_fields = ('user', 'created_at', 'messages', 'id')
+        fields = ('id', 'user', 'created_at', 'last_message', 'last_message_at', 'unread_count', 'is_online')
+        read_only_fields = ('user', 'created_at', 'id')
+
+    def get_is_online(self, obj):
+        # Lists pass the whole page's presence in one lookup (ConversationViewSet.list)
+        online = self.context.get('online_user_ids')
+        if online is None:
+            return is_online(obj.user_id)
+        return obj.user_id in online
 
 class GrievanceSerializer(serializers.ModelSerializer):
     # Embed details of the submitting user and potentially assigned user
@@ -126,10 +142,12 @@ class GrievanceSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'title', 'description', 'status', 'priority',
             'created_at', 'updated_at', 'submitted_by', 'assigned_to',
-            'comments', 'evidence_image' # Will provide URL path
+            'comments', 'evidence_image', # Will provide URL path
+            'evidence_thumbnail', 'evidence_preview' # Renditions, null until processed
         )
         # Fields that are set automatically or read-only in standard GET/POST
-        read_only_fields = ('id', 'created_at', 'updated_at', 'submitted_by', 'assigned_to', 'comments')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'submitted_by', 'assigned_to', 'comments',
+                            'evidence_thumbnail', 'evidence_preview')
         # Fields required when creating (POST) a grievance
         # Note: 'status' and 'priority' often have defaults or are set in perform_create
         # Note: 'evidence_image' is handled via multipart/form-data
@@ -159,4 +177,13 @@ class GrievanceStatusSerializer(serializers.ModelSerializer):
     #    # Add logic here, e.g., prevent moving from RESOLVED back to PENDING
     #    if instance and instance.status == 'RESOLVED' and value != 'RESOLVED':
     #        raise serializers.ValidationError("Cannot change status once resolved.")
-    #    return value
\ No newline at end of file
+    #    return value
+
+class GrievanceBulkStatusSerializer(serializers.Serializer):
+    # Payload for the bulk status action: {"ids": [1, 2, 3], "status": "RESOLVED"}
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000,
+    )
+    status = serializers.ChoiceField(choices=Grievance.STATUS_CHOICES)
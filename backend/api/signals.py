@@ -1,61 +1,55 @@
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync  # This was the line with the typo
-from .models import ChatMessage, CustomUser, Grievance, Conversation
+from .models import ChatMessage, CustomUser, Grievance, Conversation, GrievanceStatCounter, PriorityRule
+from .consumers import avatar_url
+from .images import prepare_renditions, schedule_renditions
+from .middleware import invalidate_cached_user
+from .notifications import notify_chat_message, notify_user
+from .priority import invalidate_classifier
+from .search import index_grievance, unindex_grievance
 
 @receiver(post_save, sender=ChatMessage)
 def send_chat_notification(sender, instance, created, **kwargs):
     if created:
-        print("--- NEW CHAT MESSAGE SIGNAL FIRED ---")
-        channel_layer = get_channel_layer()
-        sender_user = instance.user
-        conversation = instance.conversation
-        
-        recipients = []
-        
-        if sender_user.role in ['admin', 'grievance_cell']:
-            recipients.append(conversation.user)
-        else:
-            recipients.extend(
-                CustomUser.objects.filter(role__in=['admin', 'grievance_cell'])
-            )
-
-        for recipient in recipients:
-            if recipient and recipient.is_active and recipient.id != sender_user.id:
-                transaction.on_commit(
-                    lambda: async_to_sync(channel_layer.group_send)(
-                        f'notifications_{recipient.id}',
-                        {
-                            'type': 'send_notification',
-                            'message': f'New message from {sender_user.name}',
-                            'sender_name': sender_user.name
-                        }
-                    )
-                )
+        # One publish to the staff group or the owner's group (api.notifications)
+        notify_chat_message(instance)
 
 @receiver(post_save, sender=CustomUser)
 def send_profile_update_notification(sender, instance, created, **kwargs):
     if not created:
-        print("--- PROFILE UPDATE SIGNAL FIRED ---")
-        channel_layer = get_channel_layer()
-        user = instance
-        image_url = user.profile_image.url if user.profile_image else None
-        
-        transaction.on_commit(
-            lambda: async_to_sync(channel_layer.group_send)(
-                f'notifications_{user.id}',
-                {
-                    'type': 'profile_updated',
-                    'user': {
-                        'id': user.id,
-                        'name': user.name,
-                        'profile_image': image_url
-                    }
-                }
-            )
-        )
+        notify_user(instance.id, 'profile_updated', {
+            'user': {
+                'id': instance.id,
+                'name': instance.name,
+                'profile_image': avatar_url(instance),
+            }
+        })
+
+@receiver(post_save, sender=CustomUser)
+def revoke_chat_access(sender, instance, created, **kwargs):
+    # Open chat sockets cache the user's authorization; tell them when it changes
+    if created or getattr(instance, '_access_key', None) == (instance.role, instance.is_active):
+        return
+    _send_chat_access_changed(instance.id, instance.role, instance.is_active)
+
+@receiver(post_delete, sender=CustomUser)
+def revoke_chat_access_on_delete(sender, instance, **kwargs):
+    _send_chat_access_changed(instance.id, instance.role, False)
+
+def _send_chat_access_changed(user_id, role, is_active):
+    event = {'type': 'chat_access_changed', 'role': role, 'is_active': is_active}
+    transaction.on_commit(
+        lambda: async_to_sync(get_channel_layer().group_send)(f'chat_user_{user_id}', event)
+    )
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_websocket_user(sender, instance, **kwargs):
+    # Drop the snapshot TokenAuthMiddleware caches for WebSocket handshakes
+    invalidate_cached_user(instance.id)
 
 @receiver(post_save, sender=CustomUser)
 def create_user_conversation(sender, instance, created, **kwargs):
@@ -65,4 +59,43 @@ def create_user_conversation(sender, instance, created, **kwargs):
 # This signal was for the old chat-request system and is no longer needed
 @receiver(post_save, sender=Grievance)
 def send_chat_request_notification(sender, instance, created, **kwargs):
-    pass
\ No newline at end of file
+    pass
+
+# Runs inside the deletion's transaction, so the counters drop with the row
+@receiver(post_delete, sender=Grievance)
+def decrement_grievance_counters(sender, instance, **kwargs):
+    key = getattr(instance, '_counted_key', (instance.status, instance.priority))
+    GrievanceStatCounter.objects.adjust_many({key: -1})
+
+# Keeps the SQLite FTS5 search table in step (no-op on PostgreSQL, where the
+# search column is generated by the database)
+@receiver(post_save, sender=Grievance)
+def update_grievance_search_index(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    index_grievance(instance)
+
+@receiver(post_delete, sender=Grievance)
+def remove_grievance_search_index(sender, instance, **kwargs):
+    unindex_grievance(instance.id)
+
+# Recompile the priority classifier only when its rules change
+@receiver(post_save, sender=PriorityRule)
+@receiver(post_delete, sender=PriorityRule)
+def refresh_priority_rules(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_classifier)
+
+# New evidence/profile uploads are re-encoded and thumbnailed after commit,
+# off the request thread (see api.images)
+@receiver(pre_save, sender=Grievance)
+@receiver(pre_save, sender=CustomUser)
+def detect_new_image_uploads(sender, instance, **kwargs):
+    instance._pending_renditions = prepare_renditions(instance)
+
+@receiver(post_save, sender=Grievance)
+@receiver(post_save, sender=CustomUser)
+def process_new_image_uploads(sender, instance, **kwargs):
+    pending = getattr(instance, '_pending_renditions', None)
+    if pending:
+        instance._pending_renditions = []
+        schedule_renditions(instance, pending)
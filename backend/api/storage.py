@@ -0,0 +1,62 @@
+# backend/api/storage.py
+
+"""
+Content-addressed media storage.
+
+Uploads are saved as <upload_to>/<aa>/<sha256><ext>, where aa is the first
+two hex digits of the digest, so identical files share one path and one copy
+on disk no matter how often they are uploaded. A name therefore never
+changes content, which lets serve_media() send immutable cache headers.
+URLs carry a signature that serve_media() checks.
+
+Because several rows can point at the same file, deleting one row's file is
+unsafe: callers check `shares_files` and only delete a file no row refers to
+(api.images), leaving anything else to the `collect_unreferenced_media`
+command.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_NAME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:\.[A-Za-z0-9]+)?$')
+
+
+def content_digest(name):
+    """The sha256 hex digest encoded in a content-addressed name, or None."""
+    match = HASH_NAME_RE.search(name or '')
+    return match.group('digest') if match else None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    shares_files = True
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name.replace(os.sep, '/'))
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def url(self, name):
+        # Media is only served with a signature (api.media)
+        from .media import signed_query
+        return f'{super().url(name)}?{signed_query(name)}'
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        saved = super()._save(name, content)
+        if saved != name:
+            # Another request stored the same bytes between exists() and the
+            # write, so FileSystemStorage picked an alternative name; keep one copy.
+            self.delete(saved)
+        return name
@@ -1,3 +1,1330 @@
-from django.test import TestCase
+import csv
+import datetime
+import glob
+import ipaddress
+import json
+import os
+import re
+import ssl
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+from django.conf import settings
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .chat_persistence import ChatMessageWriter, replay_spool, spool
+from .consumers import ChatConsumer, NotificationConsumer, chat_message_event
+from . import google_drive_utils, metrics, presence
+from .mail_queue import enqueue_email, process_email_queue, retry_delay, start_worker_for_server
+from .management.commands.explain_grievance_queries import Command as ExplainCommand
+from .media import signed_query
+from .middleware import get_user_from_token, user_cache
+from .notifications import coalescer
+from .models import (
+    ChatMessage, Conversation, CustomUser, Grievance, GrievanceComment, GrievanceStatCounter, NotificationLog,
+    OutboundEmail, PriorityRule,
+)
+from .priority import PriorityClassifier, invalidate_classifier
+from .query_plans import grievance_counter_snapshot
+from .search import search_grievances
+from .serializers import MyTokenObtainPairSerializer
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def walk_pages(client, url, params, between_pages=None):
+    """Follow `next` links from the first page; returns the ids of every page."""
+    pages = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == 200, response.content
+        pages.append([row['id'] for row in response.data['results']])
+        if between_pages is not None:
+            between_pages(len(pages))
+        if not response.data['next']:
+            return pages
+        response = client.get(response.data['next'])
+
+
+class CounterSnapshotAssertions:
+    """Compare the stored grievance counters with a fresh GROUP BY over the table."""
+
+    def assertCountersMatchTable(self):
+        counters = {(c.status, c.priority): c.count for c in GrievanceStatCounter.objects.all() if c.count}
+        self.assertEqual(counters, {key: count for key, count in grievance_counter_snapshot().items() if count})
+
+
+class GrievanceQueryPlanTests(TestCase):
+    """The grievance read paths must cost a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        cls.staff = CustomUser.objects.create_user(username='cell1', password='pass1234', role='grievance_cell')
+        cls.students = [
+            CustomUser.objects.create_user(username=f'student{i}', password='pass1234', role='student')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _seed(self, count):
+        Grievance.objects.bulk_create([
+            Grievance(
+                submitted_by=self.students[i % len(self.students)],
+                assigned_to=self.staff if i % 2 else None,
+                title=f'Grievance {i}',
+                description='Details',
+                status=['SUBMITTED', 'IN_PROGRESS', 'RESOLVED'][i % 3],
+            )
+            for i in range(count)
+        ], batch_size=500)
+        grievances = list(Grievance.objects.order_by('id'))
+        GrievanceComment.objects.bulk_create([
+            GrievanceComment(grievance=grievance, user=self.staff, comment_text='Looking into it')
+            for grievance in grievances
+            for _ in range(2)
+        ], batch_size=500)
+        return grievances
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def _read_path_costs(self, grievance_id):
+        return {
+            'list': self._count_queries('/api/grievances/?page_size=200'),
+            'list_filtered': self._count_queries('/api/grievances/?page_size=200&status_filter=unresolved'),
+            'retrieve': self._count_queries(f'/api/grievances/{grievance_id}/'),
+            'stats': self._count_queries('/api/grievances/stats/'),
+        }
+
+    def test_query_count_is_independent_of_row_count(self):
+        grievances = self._seed(10)
+        small = self._read_path_costs(grievances[0].id)
+
+        self._seed(10_000 - 10)
+        large = self._read_path_costs(grievances[0].id)
+
+        self.assertEqual(small, large)
+        # Page of grievances + one prefetch for comments (with their authors).
+        self.assertEqual(large['list'], 2)
+        self.assertEqual(large['stats'], 1)
+
+    def test_every_read_path_is_served_by_an_index(self):
+        self._seed(30)
+        Grievance.objects.filter(pk__in=Grievance.objects.filter(status='RESOLVED').values('pk')[:2]).update(status='PENDING')
+        response = self.client.get('/api/grievances/?page_size=200&status_filter=unresolved')
+        self.assertEqual({row['status'] for row in response.data['results']}, {'SUBMITTED', 'PENDING'})
+        self.assertEqual(len(response.data['results']), 12)
+
+        out = StringIO()
+        call_command('explain_grievance_queries', stdout=out)
+        self.assertIn('All grievance queries use an index.', out.getvalue())
+        # Search reads matches off the search index and sorts them by rank;
+        # stats reads the counters, not the grievance table
+        self.assertIn('RANKED list role=admin search', out.getvalue())
+        self.assertIn('NONE   stats', out.getvalue())
+        # A sort step is a failure, not a pass with a warning
+        with mock.patch.object(ExplainCommand, '_classify', return_value='SORT'):
+            with self.assertRaises(CommandError):
+                call_command('explain_grievance_queries', stdout=StringIO())
+
+    def test_update_status_query_count_is_fixed(self):
+        grievance = self._seed(10)[0]
+        url = f'/api/grievances/{grievance.id}/update_status/'
+        # Warm up so both measured transitions find their stats counter rows.
+        self.client.patch(url, {'status': 'RESOLVED'}, format='json')
+        self.client.patch(url, {'status': 'IN_PROGRESS'}, format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.patch(url, {'status': 'RESOLVED'}, format='json')
+        self._seed(500)
+        with CaptureQueriesContext(connection) as large:
+            self.client.patch(url, {'status': 'IN_PROGRESS'}, format='json')
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class GrievanceCursorPaginationTests(TestCase):
+    """Walking `next` links serves every grievance exactly once, in order, while rows keep arriving."""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        for i in range(14):
+            self._create(['SUBMITTED', 'IN_PROGRESS', 'RESOLVED', 'PENDING'][i % 4])
+        # Several rows share a created_at, so the id tiebreak is exercised too
+        Grievance.objects.filter(pk__in=Grievance.objects.order_by('id').values('pk')[:6]).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _create(self, status, **fields):
+        return Grievance.objects.create(submitted_by=self.student, title='t', description='d', status=status, **fields)
+
+    def _expected(self, queryset):
+        return list(queryset.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_unresolved_walk_survives_concurrent_inserts(self):
+        expected = self._expected(Grievance.objects.filter(status__in=Grievance.UNRESOLVED_STATUSES))
+        old = timezone.now() - timedelta(days=30)
+        backdated = []
+
+        def insert(page_number):
+            # Newer rows land before the cursor and are not served on this walk;
+            # an older one lands after it and is.
+            self._create('SUBMITTED')
+            self._create('RESOLVED')
+            if page_number == 2:
+                row = self._create('PENDING')
+                Grievance.objects.filter(pk=row.pk).update(created_at=old)
+                backdated.append(row.id)
+
+        pages = walk_pages(
+            self.client, '/api/grievances/', {'status_filter': 'unresolved', 'page_size': 3}, between_pages=insert,
+        )
+        self.assertTrue(all(len(page) == 3 for page in pages[:-1]))
+        self.assertEqual(sum(pages, []), expected + backdated)
+
+    def test_every_status_filter_pages_completely(self):
+        filters = {
+            None: Grievance.objects.all(),
+            'unresolved': Grievance.objects.filter(status__in=Grievance.UNRESOLVED_STATUSES),
+            'resolved': Grievance.objects.filter(status='RESOLVED'),
+            'in_progress': Grievance.objects.filter(status='IN_PROGRESS'),
+        }
+        for status_filter, queryset in filters.items():
+            params = {'page_size': 2}
+            if status_filter:
+                params['status_filter'] = status_filter
+            with self.subTest(status_filter=status_filter):
+                pages = walk_pages(self.client, '/api/grievances/', params)
+                self.assertEqual(sum(pages, []), self._expected(queryset))
+
+    def test_previous_link_walks_back(self):
+        first = self.client.get('/api/grievances/', {'page_size': 4})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([row['id'] for row in back.data['results']], [row['id'] for row in first.data['results']])
+
+
+class GrievanceStatCounterTests(CounterSnapshotAssertions, TestCase):
+    """The stats counters must follow every create, status change and delete."""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _stats(self):
+        response = self.client.get('/api/grievances/stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counters_follow_grievance_lifecycle(self):
+        first = Grievance.objects.create(submitted_by=self.student, title='Water', description='No water')
+        second = Grievance.objects.create(submitted_by=self.student, title='Lab', description='Broken', priority='HIGH')
+        self.assertEqual(self._stats()['pending_grievances'], 2)
+
+        self.client.patch(f'/api/grievances/{first.id}/update_status/', {'status': 'RESOLVED'}, format='json')
+        stats = self._stats()
+        self.assertEqual(stats['resolved_grievances'], 1)
+        self.assertEqual(stats['pending_grievances'], 1)
+
+        second.delete()
+        stats = self._stats()
+        self.assertEqual(stats['total_grievances'], 1)
+        self.assertEqual(stats['unresolved_total'], 0)
+
+        # Cascading deletes go through post_delete as well.
+        self.student.delete()
+        self.assertEqual(self._stats()['total_grievances'], 0)
+
+    def test_counters_stay_consistent_after_repeated_status_changes(self):
+        grievance = Grievance.objects.create(submitted_by=self.student, title='Water', description='No water')
+        for new_status in ['IN_PROGRESS', 'ACTION_TAKEN', 'IN_PROGRESS', 'RESOLVED', 'RESOLVED', 'SUBMITTED']:
+            response = self.client.patch(
+                f'/api/grievances/{grievance.id}/update_status/', {'status': new_status}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+        # Two requests that loaded the row before either saved: the second
+        # must move the counters from the first one's status, not its own stale copy.
+        first, second = Grievance.objects.get(pk=grievance.pk), Grievance.objects.get(pk=grievance.pk)
+        first.status = 'IN_PROGRESS'
+        first.save()
+        second.status = 'RESOLVED'
+        second.save()
+
+        self.assertCountersMatchTable()
+        stats = self._stats()
+        self.assertEqual((stats['total_grievances'], stats['resolved_grievances']), (1, 1))
+
+    def test_rebuild_command_corrects_drift(self):
+        Grievance.objects.create(submitted_by=self.student, title='Water', description='No water')
+        # bulk_create bypasses save(), so the counters drift.
+        Grievance.objects.bulk_create([
+            Grievance(submitted_by=self.student, title='Bulk', description='x', status='IN_PROGRESS')
+            for _ in range(3)
+        ])
+        self.assertEqual(self._stats()['total_grievances'], 1)
+
+        call_command('rebuild_grievance_stats', stdout=StringIO())
+        self.assertEqual(self._stats()['total_grievances'], 4)
+        self.assertCountersMatchTable()
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    EMAIL_QUEUE_WORKER_ENABLED=False,
+)
+class EmailQueueTests(TestCase):
+    """Request handlers only enqueue; the queue sends and retries."""
+
+    def setUp(self):
+        self.student = CustomUser.objects.create_user(
+            username='student1', password='pass1234', role='student', college_email='student1@example.com'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_create_enqueues_and_worker_sends(self):
+        response = self.client.post('/api/grievances/', {'title': 'Water', 'description': 'No water'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status='PENDING').count(), 1)
+
+        self.assertEqual(process_email_queue(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['student1@example.com'])
+        self.assertEqual(OutboundEmail.objects.get().status, 'SENT')
+
+    def test_failed_send_is_retried_with_backoff(self):
+        enqueue_email('Subject', 'Body', ['student1@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(process_email_queue(), 0)
+        row = OutboundEmail.objects.get()
+        self.assertEqual((row.status, row.attempts), ('PENDING', 1))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+
+        # Not due yet, so nothing is sent until the backoff has passed.
+        self.assertEqual(process_email_queue(), 0)
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_email_queue(), 1)
+        self.assertEqual(OutboundEmail.objects.get().status, 'SENT')
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=3, EMAIL_QUEUE_BACKOFF_SECONDS=30, EMAIL_QUEUE_MAX_BACKOFF_SECONDS=90)
+    def test_backoff_doubles_up_to_the_cap_then_gives_up(self):
+        self.assertEqual([retry_delay(n).total_seconds() for n in (1, 2, 3, 4)], [30, 60, 90, 90])
+        enqueue_email('Subject', 'Body', ['student1@example.com'])
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            for attempt in (1, 2):
+                before = timezone.now()
+                process_email_queue()
+                row = OutboundEmail.objects.get()
+                self.assertEqual((row.status, row.attempts, row.last_error), ('PENDING', attempt, 'down'))
+                self.assertGreaterEqual(row.next_attempt_at, before + retry_delay(attempt))
+                OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs('api.mail_queue', 'ERROR'):
+                process_email_queue()
+        self.assertEqual(OutboundEmail.objects.get().status, 'FAILED')
+        self.assertEqual(process_email_queue(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_worker_starts_with_server_processes_only(self):
+        with mock.patch('api.mail_queue.wake_worker') as wake, mock.patch.dict(os.environ, {'RUN_MAIN': ''}):
+            for argv in (
+                ['manage.py', 'migrate'], ['manage.py', 'test', 'api'], ['manage.py', 'runserver'],
+                ['/usr/bin/gunicorn', 'backend.wsgi'], ['/venv/bin/pytest'], ['-c'], [],
+            ):
+                start_worker_for_server(argv)
+            wake.assert_not_called()
+
+            start_worker_for_server(['manage.py', 'runserver', '--noreload'])
+            with mock.patch.dict(os.environ, {'RUN_MAIN': 'true'}):
+                start_worker_for_server(['./manage.py', 'runserver', '0.0.0.0:8000'])
+            self.assertEqual(wake.call_count, 2)
+
+            # backend/asgi.py and backend/wsgi.py turn the flag on for any server program
+            with override_settings(EMAIL_QUEUE_START_WORKER=True):
+                start_worker_for_server(['/usr/bin/gunicorn', 'backend.wsgi'])
+            self.assertEqual(wake.call_count, 3)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatHistoryTests(TestCase):
+    """The inbox lists conversation metadata; history is paged per conversation."""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        self.conversation, _ = Conversation.objects.get_or_create(user=self.student)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(conversation=self.conversation, user=self.student, message=f'message {i}')
+            for i in range(120)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_conversation_list_does_not_embed_messages(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/conversations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('messages', response.data[0])
+        self.assertEqual(len(queries), 1)
+
+    def test_before_cursor_walks_history_once(self):
+        url = f'/api/conversations/{self.conversation.id}/messages/?page_size=50'
+        seen = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(len(queries), 2)
+            seen += [message['message'] for message in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, [f'message {i}' for i in reversed(range(120))])
+
+    def test_unread_count_follows_read_cursor(self):
+        url = f'/api/conversations/{self.conversation.id}/'
+        summary = self.client.get(url).data
+        self.assertEqual(summary['unread_count'], 120)
+        self.assertEqual(summary['last_message'], 'message 119')
+
+        oldest = ChatMessage.objects.filter(conversation=self.conversation).order_by('timestamp', 'id')[19]
+        response = self.client.post(f'{url}read/', {'message_id': oldest.id}, format='json')
+        self.assertEqual(response.data['unread_count'], 100)
+        self.assertEqual(self.client.post(f'{url}read/').data['unread_count'], 0)
+        # Marking an earlier message never moves the cursor back
+        response = self.client.post(f'{url}read/', {'message_id': oldest.id}, format='json')
+        self.assertEqual(response.data['unread_count'], 0)
+
+    def test_other_students_cannot_read_history(self):
+        other = CustomUser.objects.create_user(username='student2', password='pass1234', role='student')
+        self.client.force_authenticate(other)
+        response = self.client.get(f'/api/conversations/{self.conversation.id}/messages/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ChatConsumerTests(TestCase):
+    """Access is checked once per socket; each message is then a single INSERT."""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        self.conversation, _ = Conversation.objects.get_or_create(user=self.student)
+
+    async def _connect(self, user, query=''):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.conversation.id}/?{query}')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'conversation_id': str(self.conversation.id)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def test_message_costs_one_write(self):
+        async def chat(queries):
+            communicator = await self._connect(self.admin)
+            # connection is per thread; the ORM calls run on this test's thread
+            start = await database_sync_to_async(len)(queries)
+            await communicator.send_json_to({'message': 'hello'})
+            payload = (await communicator.receive_json_from())['payload']
+            end = await database_sync_to_async(len)(queries)
+            await communicator.disconnect()
+            return start, end, payload
+
+        with CaptureQueriesContext(connection) as queries:
+            start, end, payload = async_to_sync(chat)(queries)
+        self.assertEqual([q['sql'].split()[0] for q in queries.captured_queries[start:end]], ['INSERT'])
+        self.assertEqual(payload['message'], 'hello')
+
+    @override_settings(CHAT_BATCH_WINDOW_MS=50)
+    def test_batched_sockets_get_array_frames(self):
+        async def chat():
+            plain = await self._connect(self.admin)
+            batched = await self._connect(self.student, 'batch=1')
+            for i in range(3):
+                await get_channel_layer().group_send(f'chat_{self.conversation.id}', chat_message_event({'id': i}))
+            plain_frames = [await plain.receive_json_from() for _ in range(3)]
+            batched_frame = await batched.receive_json_from()
+            await plain.disconnect()
+            await batched.disconnect()
+            return plain_frames, batched_frame
+
+        plain_frames, batched_frame = async_to_sync(chat)()
+        expected = [{'type': 'chat_message', 'payload': {'id': i}} for i in range(3)]
+        self.assertEqual(plain_frames, expected)
+        self.assertEqual(batched_frame, expected)
+
+    def test_role_change_revokes_access(self):
+        def demote():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.admin.role = 'student'
+                self.admin.save()
+
+        async def chat():
+            communicator = await self._connect(self.admin)
+            await database_sync_to_async(demote)()
+            return await communicator.receive_output()
+
+        self.assertEqual(async_to_sync(chat)(), {'type': 'websocket.close', 'code': 4403})
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class WebSocketAuthTests(TestCase):
+    """Handshakes resolve users from the snapshot cache or the token claims."""
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = CustomUser.objects.create_user(username='student1', password='pass1234', role='student', name='Stu')
+        self.token = str(MyTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def _authenticate(self):
+        with CaptureQueriesContext(connection) as queries:
+            user = async_to_sync(get_user_from_token)(self.token)
+        return user, len(queries)
+
+    def test_repeat_handshakes_use_the_cache(self):
+        user, query_count = self._authenticate()
+        self.assertEqual((user.id, user.role, query_count), (self.user.id, 'student', 1))
+        user, query_count = self._authenticate()
+        self.assertEqual((user.id, query_count), (self.user.id, 0))
+
+        self.user.role = 'grievance_cell'
+        self.user.save()
+        user, query_count = self._authenticate()
+        self.assertEqual((user.role, query_count), ('grievance_cell', 1))
+
+    @override_settings(WS_AUTH_USE_TOKEN_CLAIMS=True)
+    def test_token_claims_skip_the_database(self):
+        user, query_count = self._authenticate()
+        self.assertEqual((user.id, user.role, user.name, query_count), (self.user.id, 'student', 'Stu', 0))
+
+    def test_invalid_token_is_anonymous(self):
+        user = async_to_sync(get_user_from_token)(str(AccessToken()) + 'x')
+        self.assertFalse(user.is_authenticated)
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, EMAIL_QUEUE_WORKER_ENABLED=False, NOTIFICATION_COALESCE_WINDOW_MS=0,
+)
+class NotificationFanOutTests(TestCase):
+    """Chat notifications are one publish to a group, not a loop over staff."""
+
+    def setUp(self):
+        self.admins = [
+            CustomUser.objects.create_user(username=f'admin{i}', password='pass1234', role='admin')
+            for i in range(3)
+        ]
+        self.student = CustomUser.objects.create_user(
+            username='student1', password='pass1234', role='student', college_email='student1@example.com',
+        )
+        self.conversation, _ = Conversation.objects.get_or_create(user=self.student)
+        presence._registry = None  # fresh in-memory presence and cooldowns
+
+    async def _connect(self, user, query=''):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), f'/ws/notifications/?{query}')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def _connect_live(self, user):
+        communicator = await self._connect(user)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'resume')
+        return communicator
+
+    def _send(self, sender, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                ChatMessage.objects.create(conversation=self.conversation, user=sender, message=text)
+        self.assertEqual(len(queries), 1)
+
+    def test_student_message_reaches_every_admin_once(self):
+        async def run():
+            sockets = [await self._connect_live(admin) for admin in self.admins]
+            student_socket = await self._connect_live(self.student)
+            await database_sync_to_async(self._send)(self.student, 'help please')
+            received = [await socket.receive_json_from() for socket in sockets]
+            nothing_for_student = await student_socket.receive_nothing()
+            for socket in sockets + [student_socket]:
+                await socket.disconnect()
+            return received, nothing_for_student
+
+        received, nothing_for_student = async_to_sync(run)()
+        self.assertEqual({event['type'] for event in received}, {'new_chat_message'})
+        self.assertEqual(received[0]['payload']['preview'], 'help please')
+        self.assertTrue(nothing_for_student)
+
+    def test_staff_reply_goes_to_the_owner_only(self):
+        async def run():
+            admin_socket = await self._connect_live(self.admins[1])
+            student_socket = await self._connect_live(self.student)
+            await database_sync_to_async(self._send)(self.admins[0], 'on it')
+            event = await student_socket.receive_json_from()
+            nothing_for_admin = await admin_socket.receive_nothing()
+            await admin_socket.disconnect()
+            await student_socket.disconnect()
+            return event, nothing_for_admin
+
+        event, nothing_for_admin = async_to_sync(run)()
+        self.assertEqual((event['type'], event['payload']['conversation_id']), ('new_chat_message', self.conversation.id))
+        self.assertTrue(nothing_for_admin)
+
+    def test_offline_student_is_emailed_not_published(self):
+        with mock.patch('api.notifications._send') as send:
+            self._send(self.admins[0], 'first reply')
+            self._send(self.admins[0], 'second reply')
+        send.assert_not_called()
+        # One email per cooldown window, however many replies
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.recipients, ['student1@example.com'])
+        self.assertIn('first reply', email.body)
+
+    def test_inbox_reports_presence(self):
+        client = APIClient()
+        client.force_authenticate(self.admins[0])
+        self.assertFalse(client.get('/api/conversations/').data[0]['is_online'])
+        presence.mark_online(self.student, 'test-channel')
+        self.assertTrue(client.get('/api/conversations/').data[0]['is_online'])
+        presence.mark_offline(self.student, 'test-channel')
+        self.assertFalse(client.get(f'/api/conversations/{self.conversation.id}/').data['is_online'])
+
+    @override_settings(NOTIFICATION_COALESCE_WINDOW_MS=60000)
+    def test_burst_is_coalesced_into_one_push(self):
+        presence.mark_online(self.admins[1], 'test-channel')
+        with mock.patch('api.notifications._send') as send:
+            for i in range(10):
+                self._send(self.student, f'message {i}')
+            send.assert_not_called()
+            coalescer.flush_all()
+        send.assert_called_once()
+        group, event = send.call_args.args
+        self.assertEqual(group, 'admin_notifications')
+        self.assertEqual(event['payload']['count'], 10)
+        self.assertEqual(event['payload']['preview'], 'message 9')
+        self.assertEqual(event['payload']['message'], '10 new messages from student1')
+
+    def test_reconnect_replays_only_missed_events(self):
+        self._send(self.admins[0], 'while you were away')
+        self._send(self.admins[0], 'still away')
+
+        async def reconnect(query):
+            socket = await self._connect(self.student, query)
+            frames = [await socket.receive_json_from()]
+            while frames[-1]['type'] != 'resume':
+                frames.append(await socket.receive_json_from())
+            await socket.disconnect()
+            return frames
+
+        frames = async_to_sync(reconnect)('seq_user=0')
+        self.assertEqual([(f['type'], f.get('seq')) for f in frames[:2]], [('new_chat_message', 1), ('new_chat_message', 2)])
+        self.assertEqual(frames[1]['payload']['preview'], 'still away')
+        self.assertEqual((frames[2]['seqs'], frames[2]['resync']), ({'user': 2}, []))
+        # Up to date: nothing to replay
+        self.assertEqual(len(async_to_sync(reconnect)('seq_user=2')), 1)
+        # A pruned gap cannot be replayed; the client is told to refetch
+        NotificationLog.objects.filter(seq=1).delete()
+        self.assertEqual(async_to_sync(reconnect)('seq_user=0'), [{'type': 'resume', 'seqs': {'user': 2}, 'resync': ['user']}])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, METRICS_TOKEN='scrape-me')
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.clear()
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        self.conversation, _ = Conversation.objects.get_or_create(user=self.student)
+
+    def _scrape(self):
+        response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_rest_requests_are_timed_and_counted(self):
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+        self.client.get('/api/health/')
+        OutboundEmail.objects.create(subject='s', body='b', from_email='a@example.com', recipients=['b@example.com'])
+        body = self._scrape()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="health_check",status="200"} 1', body)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="health_check",status="200",le="+Inf"} 1', body)
+        self.assertIn('http_request_db_queries_count{route="health_check"} 1', body)
+        self.assertIn('email_queue_depth 1', body)
+
+    def test_scraping_needs_the_token_or_debug(self):
+        self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get('/api/metrics').status_code, 200)
+
+    def test_websocket_counters(self):
+        async def chat():
+            communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.conversation.id}/')
+            communicator.scope['user'] = self.student
+            communicator.scope['url_route'] = {'kwargs': {'conversation_id': str(self.conversation.id)}}
+            await communicator.connect()
+            await communicator.send_json_to({'message': 'hello'})
+            await communicator.receive_json_from()
+            await communicator.disconnect()
+
+        async_to_sync(chat)()
+        self.assertEqual(metrics.ws_connects.value('chat', 'accepted'), 1)
+        self.assertEqual(metrics.ws_disconnects.value('chat'), 1)
+        self.assertEqual(metrics.ws_open.value('chat'), 0)
+        self.assertEqual(metrics.ws_messages_received.value('chat'), 1)
+        self.assertEqual(metrics.ws_messages_broadcast.value('chat'), 1)
+        self.assertEqual(metrics.channel_layer_send_seconds.count('chat'), 1)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.log_path = os.path.join(self.log_dir.name, 'profiles.jsonl')
+        self.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+
+    def _get(self, user, **headers):
+        token = AccessToken.for_user(user)
+        with override_settings(PROFILING_LOG_PATH=self.log_path):
+            return self.client.get('/api/grievances/', HTTP_AUTHORIZATION=f'Bearer {token}', **headers)
+
+    def test_admin_header_profiles_the_request(self):
+        response = self._get(self.admin, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        with open(self.log_path, encoding='utf-8') as fh:
+            profile = json.loads(fh.readline())
+        self.assertEqual((profile['route'], profile['trigger'], profile['user_id']), ('grievance-list', 'header', self.admin.id))
+        self.assertGreater(profile['queries'], 0)
+        self.assertTrue(profile['slowest'][0]['origin'].startswith('api/'))
+
+        out = StringIO()
+        call_command('summarize_profiles', path=self.log_path, stdout=out)
+        self.assertIn('GET grievance-list  n=1', out.getvalue())
+
+    def test_header_is_ignored_for_non_admins(self):
+        response = self._get(self.student, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response)
+        self.assertFalse(os.path.exists(self.log_path))
+
+
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, EMAIL_QUEUE_WORKER_ENABLED=False, NOTIFICATION_COALESCE_WINDOW_MS=0,
+)
+class ChatWriteBehindTests(TransactionTestCase):
+    """Rows are committed for real here: foreign keys are only checked at commit."""
+
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_dir = spool_dir.name
+        settings_override = override_settings(CHAT_SPOOL_DIR=self.spool_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        self.conversation, _ = Conversation.objects.get_or_create(user=self.student)
+
+    def _message(self, message_id, conversation_id=None):
+        return ChatMessage(
+            id=message_id, conversation_id=conversation_id or self.conversation.id,
+            user=self.student, message=f'message {message_id}', timestamp=timezone.now(),
+        )
+
+    def _spooled(self, prefix):
+        rows = []
+        for path in glob.glob(os.path.join(self.spool_dir, f'{prefix}-*.jsonl')):
+            with open(path, encoding='utf-8') as fh:
+                rows += [json.loads(line) for line in fh]
+        return rows
+
+    def _stored(self):
+        return sorted(ChatMessage.objects.values_list('id', flat=True))
+
+    def test_writer_thread_flushes_submitted_messages(self):
+        writer = ChatMessageWriter()
+        writer.start()
+        writer.submit(self._message(1001))
+        writer.submit(self._message(1002))
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(self._stored(), [1001, 1002])
+
+    def test_failed_flush_is_spooled_and_replayed_after_restart(self):
+        with mock.patch('api.chat_persistence._bulk_insert', side_effect=OperationalError('database is down')):
+            ChatMessageWriter().write([self._message(1001), self._message(1002)])
+        self.assertEqual(self._stored(), [])
+        self.assertEqual([row['id'] for row in self._spooled('chat')], [1001, 1002])
+
+        # A new process finds the spool and replays it after its first flush
+        ChatMessageWriter().write([self._message(1003)])
+        self.assertEqual(self._stored(), [1001, 1002, 1003])
+        self.assertEqual(self._spooled('chat'), [])
+
+    def test_poison_row_is_dead_lettered_not_retried(self):
+        ChatMessageWriter().write([self._message(1001), self._message(1002, conversation_id=999999)])
+        self.assertEqual(self._stored(), [1001])
+        self.assertEqual([row['id'] for row in self._spooled('dead')], [1002])
+        self.assertEqual(self._spooled('chat'), [])
+
+        # The same row in an old spool file no longer blocks the rest of it
+        spool([self._message(1003), self._message(1004, conversation_id=999999)])
+        self.assertEqual(replay_spool(), 1)
+        self.assertEqual(self._stored(), [1001, 1003])
+        self.assertEqual(sorted(row['id'] for row in self._spooled('dead')), [1002, 1004])
+        self.assertEqual(self._spooled('chat'), [])
+
+
+class MediaAccessTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.name = default_storage.save('grievance_evidence/photo.jpg', ContentFile(b'evidence'))
+        self.legacy = 'grievance_evidence/IMG-20251014-WA0021.jpg'
+        with open(os.path.join(media_root.name, self.legacy), 'wb') as fh:
+            fh.write(b'legacy')
+
+    def test_unsigned_requests_are_refused(self):
+        self.assertEqual(self.client.get(f'/media/{self.legacy}').status_code, 403)
+        url = default_storage.url(self.name)
+        self.assertEqual(self.client.get(url.replace('signature=', 'signature=x')).status_code, 403)
+        student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        response = self.client.get(f'/media/{self.name}', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(student)}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_signed_urls_are_served_with_private_caching(self):
+        response = self.client.get(default_storage.url(self.name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'evidence')
+        self.assertEqual(response['Cache-Control'], f'private, max-age={settings.MEDIA_URL_TTL}, immutable')
+        # The URL, and so the browser's cache key, repeats for the whole window
+        window = 100 * settings.MEDIA_URL_TTL
+        self.assertEqual(signed_query(self.name, now=window), signed_query(self.name, now=window + settings.MEDIA_URL_TTL - 1))
+
+        response = self.client.get(default_storage.url(self.legacy))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_staff_can_read_with_their_token(self):
+        admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        response = self.client.get(f'/media/{self.legacy}', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_signatures_expire(self):
+        url = default_storage.url(self.name)
+        with mock.patch('api.media.time.time', return_value=time.time() + 3 * settings.MEDIA_URL_TTL):
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(IMAGE_PROCESSING_ASYNC=False, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+
+    def _photo(self):
+        # A GPS position in the EXIF data, as phone cameras write it
+        exif = Image.Exif()
+        exif[0x010F] = 'PhoneMaker'
+        exif[0x8825] = {1: 'N', 2: (9.0, 58.0, 0.0)}
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), (200, 30, 30)).save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('IMG-20251014-WA0021.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def _upload(self, user):
+        """Returns the name the raw upload was stored under."""
+        with self.captureOnCommitCallbacks(execute=True):
+            user.profile_image = self._photo()
+            user.save()
+        uploaded = user.profile_image.name
+        user.refresh_from_db()
+        return uploaded
+
+    def test_renditions_are_generated_and_metadata_stripped(self):
+        uploaded = self._upload(self.user)
+
+        self.assertNotEqual(self.user.profile_image.name, uploaded)
+        with default_storage.open(self.user.profile_image.name) as fh, Image.open(fh) as original:
+            self.assertEqual(original.size, (400, 300))
+            self.assertEqual(dict(original.getexif()), {})
+        with default_storage.open(self.user.profile_image_thumbnail.name) as fh, Image.open(fh) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (160, 160)))
+        # The upload with the GPS data is gone
+        self.assertFalse(default_storage.exists(uploaded))
+
+    def test_original_shared_with_another_row_is_kept(self):
+        other = CustomUser.objects.create_user(username='student2', password='pass1234', role='student')
+        with mock.patch('api.images._submit'):
+            uploaded = self._upload(other)  # not processed yet: still points at the raw upload
+        self._upload(self.user)
+        self.assertEqual(other.profile_image.name, uploaded)
+        self.assertTrue(default_storage.exists(uploaded))
+
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    """Token endpoint, resumable upload sessions and permissions of the Drive API."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_POST(self):
+        drive, body = self.server.drive, self._body()
+        if self.path == '/token':
+            self._json(200, {'access_token': 'fake-token', 'expires_in': 3600, 'token_type': 'Bearer'})
+        elif self.path.startswith('/upload/drive/v3/files') and 'uploadType=resumable' in self.path:
+            with drive['lock']:
+                session = f'/upload/session/{len(drive["sessions"]) + 1}'
+                drive['sessions'][session] = {'metadata': json.loads(body), 'chunks': [], 'data': b''}
+            drive['authorization'] = self.headers.get('Authorization')
+            host, port = self.server.server_address[:2]
+            self._json(200, {}, {'Location': f'https://{host}:{port}{session}'})
+        elif self.path.startswith('/drive/v3/files/fake-id-') and self.path.split('?')[0].endswith('/permissions'):
+            drive['permissions'].append(json.loads(body))
+            self._json(200, {'id': 'anyoneWithLink'})
+        else:
+            self._json(404, {'error': self.path})
+
+    def do_PUT(self):
+        drive, body = self.server.drive, self._body()
+        with drive['lock']:
+            drive['in_flight'] += 1
+            drive['max_in_flight'] = max(drive['max_in_flight'], drive['in_flight'])
+            drive['lock'].notify_all()
+            # Hold the chunk until `overlap` uploads are in flight (or give up),
+            # so concurrent uploads overlap without depending on timing
+            drive['lock'].wait_for(lambda: drive['in_flight'] >= drive['overlap'], timeout=0.5)
+        try:
+            self._put_chunk(drive['sessions'][self.path], body)
+        finally:
+            with drive['lock']:
+                drive['in_flight'] -= 1
+
+    def _put_chunk(self, session, body):
+        # "bytes 0-262143/614400", or "bytes 0-262143/*" while the size is unknown
+        first, last, total = re.match(r'bytes (\d+)-(\d+)/(\d+|\*)', self.headers['Content-Range']).groups()
+        session['chunks'].append(int(last) - int(first) + 1)
+        session['data'] += body
+        if total == '*' or int(last) + 1 < int(total):
+            self.send_response(308)
+            self.send_header('Range', f'bytes=0-{last}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            file_id = 'fake-id-' + self.path.rsplit('/', 1)[1]
+            self._json(200, {'id': file_id, 'webViewLink': f'https://drive.example/{file_id}'})
+
+
+@override_settings(GOOGLE_DRIVE_CHUNK_SIZE=256 * 1024, GOOGLE_DRIVE_SET_PUBLIC_PERMISSION=True)
+class DriveUploadTests(TestCase):
+    """Resumable uploads against a local HTTPS stand-in for the Drive API."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cert_path = self._self_signed_cert(tmp.name)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakeDriveHandler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_path)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        server.drive = self.drive = {
+            'sessions': {}, 'permissions': [], 'lock': threading.Condition(),
+            'in_flight': 0, 'max_in_flight': 0, 'overlap': 1,
+        }
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        base = f'https://127.0.0.1:{server.server_address[1]}'
+        override = override_settings(GOOGLE_DRIVE_API_ENDPOINT=f'{base}/drive/v3/', GOOGLE_DRIVE_TOKEN_URI=f'{base}/token')
+        override.enable()
+        self.addCleanup(override.disable)
+        for patcher in (
+            mock.patch('httplib2.CA_CERTS', cert_path),
+            mock.patch.multiple(
+                google_drive_utils, CLIENT_ID='client', CLIENT_SECRET='secret', REFRESH_TOKEN='refresh',
+                PARENT_ID='folder', _credentials=None, _local=threading.local(), _executor=None,
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.drive_utils = google_drive_utils
+        self.upload = google_drive_utils.upload_file_and_get_link
+
+    def _self_signed_cert(self, directory):
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, '127.0.0.1')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder().subject_name(name).issuer_name(name)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(minutes=5)).not_valid_after(now + datetime.timedelta(hours=1))
+            .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address('127.0.0.1'))]), critical=False)
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(key, hashes.SHA256())
+        )
+        path = os.path.join(directory, 'drive.pem')
+        with open(path, 'wb') as fh:
+            fh.write(key.private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption(),
+            ))
+            fh.write(cert.public_bytes(serialization.Encoding.PEM))
+        return path
+
+    def test_large_file_is_sent_in_aligned_chunks(self):
+        content = os.urandom(600 * 1024)
+        upload = SimpleUploadedFile('report.pdf', content, content_type='application/pdf')
+
+        self.assertEqual(self.upload(upload, 'report.pdf'), 'https://drive.example/fake-id-1')
+        session = self.drive['sessions']['/upload/session/1']
+        self.assertEqual(session['data'], content)
+        self.assertEqual(session['chunks'], [256 * 1024, 256 * 1024, 88 * 1024])
+        self.assertEqual(session['metadata'], {'name': 'report.pdf', 'parents': ['folder']})
+        self.assertEqual(self.drive['authorization'], 'Bearer fake-token')
+        self.assertEqual(self.drive['permissions'], [{'role': 'reader', 'type': 'anyone'}])
+
+    def test_failed_upload_returns_none(self):
+        with mock.patch.object(FakeDriveHandler, 'do_PUT', lambda handler: handler._json(403, {'error': 'denied'})):
+            with self.assertLogs('api.google_drive_utils', 'ERROR'):
+                link = self.upload(SimpleUploadedFile('a.bin', os.urandom(300 * 1024)), 'a.bin')
+        self.assertIsNone(link)
+        self.assertEqual(self.drive['permissions'], [])
+
+    @override_settings(GOOGLE_DRIVE_UPLOAD_WORKERS=2)
+    def test_upload_many_overlaps_within_the_worker_cap(self):
+        self.drive['overlap'] = 2
+        contents = [os.urandom(300 * 1024) for _ in range(5)]
+        links = self.drive_utils.upload_many(
+            [(SimpleUploadedFile(f'file{i}.bin', content), f'file{i}.bin') for i, content in enumerate(contents)]
+        )
+        self.addCleanup(self.drive_utils._executor.shutdown)
+
+        self.assertEqual(self.drive['max_in_flight'], 2)
+        # Links come back in input order, each for its own upload session
+        by_name = {session['metadata']['name']: path for path, session in self.drive['sessions'].items()}
+        for i, content in enumerate(contents):
+            session = by_name[f'file{i}.bin']
+            self.assertEqual(self.drive['sessions'][session]['data'], content)
+            self.assertEqual(links[i], 'https://drive.example/fake-id-' + session.rsplit('/', 1)[1])
+        self.assertEqual(len(self.drive['permissions']), 5)
+
+
+class GrievanceSearchTests(TestCase):
+    """?search= ranks title matches first and reads web-search operators on every backend."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+        cls.ids = {}
+        for key, title, description in [
+            ('title', 'Water leak in hostel', 'The corridor floods every night'),
+            ('description', 'Hostel corridor', 'There is a water leak near the stairs'),
+            ('gas', 'Gas smell in lab', 'Smells of gas near the burners'),
+            ('water_only', 'No drinking water', 'The cooler in block B is empty'),
+        ]:
+            cls.ids[key] = Grievance.objects.create(submitted_by=student, title=title, description=description).id
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _search(self, text):
+        response = self.client.get('/api/grievances/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        names = {grievance_id: key for key, grievance_id in self.ids.items()}
+        return [names[row['id']] for row in response.data['results']]
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self._search('leak'), ['title', 'description'])
+
+    def test_operators(self):
+        self.assertEqual(set(self._search('water leak')), {'title', 'description'})
+        self.assertEqual(set(self._search('water or gas')), {'title', 'description', 'gas', 'water_only'})
+        self.assertEqual(self._search('"drinking water"'), ['water_only'])
+        self.assertEqual(set(self._search('water -leak')), {'water_only'})
+        self.assertEqual(set(self._search('-water')), {'gas'})
+        # A dangling operator is ignored rather than matched as a word
+        self.assertEqual(set(self._search('water OR')), set(self._search('water')))
+        self.assertEqual(self._search('or'), [])
+
+    def test_pages_walk_through_tied_ranks(self):
+        student = CustomUser.objects.get(username='student1')
+        tied = [
+            Grievance.objects.create(submitted_by=student, title='Broken fan', description='The fan is broken').id
+            for _ in range(7)
+        ]
+        best = Grievance.objects.create(submitted_by=student, title='Broken fan broken', description='Broken').id
+        pages = walk_pages(self.client, '/api/grievances/', {'search': 'broken', 'page_size': 2})
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 2])
+        self.assertEqual(sum(pages, []), [best] + sorted(tied, reverse=True))
+
+    def test_fts_table_is_joined_once(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite FTS5 plan')
+        queryset = search_grievances(Grievance.objects.all(), 'water or gas')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' | '.join(row[-1] for row in cursor.fetchall())
+        self.assertNotIn('CORRELATED', plan)
+        self.assertEqual(plan.count('api_grievance_fts'), 1, plan)
+
+
+@override_settings(EMAIL_QUEUE_WORKER_ENABLED=False)
+class BulkStatusUpdateTests(CounterSnapshotAssertions, TestCase):
+    """bulk_update_status: staff only, per-id results, counters and one email per change."""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin')
+        self.students = [
+            CustomUser.objects.create_user(
+                username=f'student{i}', password='pass1234', role='student', college_email=f'student{i}@example.com',
+            )
+            for i in range(3)
+        ]
+        self.grievances = [
+            Grievance.objects.create(submitted_by=student, title=f'Grievance {i}', description='Details')
+            for i, student in enumerate(self.students)
+        ]
+        self.grievances.append(Grievance.objects.create(
+            submitted_by=self.students[0], title='Already done', description='Details', status='RESOLVED',
+        ))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _bulk(self, ids, new_status='RESOLVED', client=None):
+        return (client or self.client).post(
+            '/api/grievances/bulk_update_status/', {'ids': ids, 'status': new_status}, format='json'
+        )
+
+    def test_students_are_rejected_and_nothing_changes(self):
+        client = APIClient()
+        client.force_authenticate(self.students[0])
+        # Even for ids the student owns
+        response = self._bulk([self.grievances[0].id], client=client)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Grievance.objects.filter(status='RESOLVED').count(), 1)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_results_cover_every_requested_id(self):
+        missing = max(g.id for g in self.grievances) + 100
+        ids = [self.grievances[0].id, self.grievances[3].id, missing, self.grievances[0].id]
+        response = self._bulk(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([(r['id'], r['result']) for r in response.data['results']], [
+            (self.grievances[0].id, 'updated'), (self.grievances[3].id, 'unchanged'), (missing, 'not_found'),
+        ])
+        self.assertEqual(response.data['results'][0]['previous_status'], 'SUBMITTED')
+
+    def test_counters_and_emails_follow_the_update(self):
+        response = self._bulk([g.id for g in self.grievances])
+        self.assertEqual(response.data['updated'], 3)
+
+        stats = self.client.get('/api/grievances/stats/').data
+        self.assertEqual((stats['total_grievances'], stats['resolved_grievances'], stats['pending_grievances']), (4, 4, 0))
+        self.assertCountersMatchTable()
+
+        # One queued email per changed grievance, to its owner; none for the unchanged one
+        emails = OutboundEmail.objects.order_by('id')
+        self.assertEqual([e.recipients for e in emails], [[s.college_email] for s in self.students])
+        self.assertEqual(
+            [e.subject for e in emails], [f'Update on Grievance #{g.id}: Status Changed' for g in self.grievances[:3]]
+        )
+        self.assertTrue(all('updated to: RESOLVED' in e.body for e in emails))
+
+    def test_query_count_does_not_grow_with_ids(self):
+        self._bulk([self.grievances[3].id], 'IN_PROGRESS')  # creates the IN_PROGRESS counter row
+        with CaptureQueriesContext(connection) as one:
+            self._bulk([self.grievances[0].id], 'IN_PROGRESS')
+        with CaptureQueriesContext(connection) as many:
+            self._bulk([g.id for g in self.grievances[1:]], 'IN_PROGRESS')
+        self.assertEqual(len(one.captured_queries), len(many.captured_queries))
+
+
+@override_settings(GRIEVANCE_EXPORT_CHUNK_SIZE=500)
+class GrievanceExportTests(TestCase):
+    """The export streams every matching grievance with its comments at a fixed query cost."""
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(username='admin1', password='pass1234', role='admin', name='Admin')
+        self.student = CustomUser.objects.create_user(
+            username='student1', password='pass1234', role='student', name='Student', college_email='s1@example.com',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _seed(self, count):
+        grievances = [
+            Grievance.objects.create(
+                submitted_by=self.student, title=f'Grievance {i}', description='Line one,\nline "two"',
+                status='RESOLVED' if i % 2 else 'SUBMITTED', assigned_to=self.admin if i % 2 else None,
+            )
+            for i in range(count)
+        ]
+        for grievance in grievances:
+            GrievanceComment.objects.create(grievance=grievance, user=self.admin, comment_text='Looking into it')
+        return grievances
+
+    def _export(self, **params):
+        response = self.client.get('/api/grievances/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        grievances = self._seed(3)
+        response, body = self._export(file_format='csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="grievances.csv"')
+        rows = list(csv.DictReader(body.splitlines(keepends=True)))
+        self.assertEqual([int(row['id']) for row in rows], [g.id for g in reversed(grievances)])
+        row = rows[-1]
+        self.assertEqual((row['description'], row['submitted_by_email'], row['assigned_to_name']),
+                         ('Line one,\nline "two"', 's1@example.com', ''))
+        self.assertEqual(row['comment_count'], '1')
+        self.assertEqual(json.loads(row['comments'])[0]['comment_text'], 'Looking into it')
+
+    def test_ndjson_applies_the_list_filters(self):
+        self._seed(4)
+        response, body = self._export(file_format='ndjson', status_filter='resolved')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual({record['status'] for record in records}, {'RESOLVED'})
+        self.assertEqual({record['assigned_to_name'] for record in records}, {'Admin'})
+        self.assertEqual(records[0]['comments'][0]['user_name'], 'Admin')
+
+    def test_rejects_unknown_formats_and_students(self):
+        self.assertEqual(self.client.get('/api/grievances/export/', {'file_format': 'xml'}).status_code, 400)
+        student = APIClient()
+        student.force_authenticate(self.student)
+        self.assertEqual(student.get('/api/grievances/export/').status_code, 403)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self._export(file_format='ndjson')
+            return len(queries.captured_queries)
+
+        self._seed(2)
+        few = count_queries()
+        self._seed(20)
+        self.assertEqual(count_queries(), few)
+
+
+class PriorityRuleTests(CounterSnapshotAssertions, TestCase):
+    """Keyword rules set the priority of new grievances and reclassify existing ones."""
+
+    def setUp(self):
+        PriorityRule.objects.bulk_create([
+            PriorityRule(pattern='fire', priority='HIGH'),
+            PriorityRule(pattern='Gas Leak', priority='HIGH'),
+            PriorityRule(pattern='leak', priority='MEDIUM'),
+            PriorityRule(pattern='broken', priority='MEDIUM'),
+            PriorityRule(pattern='ragging', priority='HIGH', is_active=False),
+        ])
+        invalidate_classifier()  # bulk_create sends no signals
+        self.student = CustomUser.objects.create_user(username='student1', password='pass1234', role='student')
+
+    def test_classifier_matches_whole_words_and_phrases(self):
+        classifier = PriorityClassifier([('fire', 'HIGH'), ('gas leak', 'HIGH'), ('leak', 'MEDIUM'), ('Leak', 'LOW')])
+        self.assertEqual(classifier.classify('Small LEAK in the tap'), 'MEDIUM')
+        self.assertEqual(classifier.classify('gas, leak!'), 'HIGH')  # punctuation between words
+        self.assertEqual(classifier.classify('gas cylinder', 'a leak'), 'MEDIUM')  # phrase must be contiguous
+        self.assertEqual(classifier.classify('Fireworks near campfire'), 'LOW')
+        self.assertEqual(classifier.classify('leak', 'and a fire'), 'HIGH')  # the highest match wins
+        self.assertEqual(classifier.classify(''), 'LOW')
+
+    def test_new_grievances_use_the_active_rules(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+
+        def create(title):
+            response = client.post('/api/grievances/', {'title': title, 'description': 'Please help'})
+            self.assertEqual(response.status_code, 201, response.content)
+            return Grievance.objects.get(pk=response.data['id']).priority
+
+        self.assertEqual(create('Gas leak in lab 2'), 'HIGH')
+        self.assertEqual(create('Broken bench'), 'MEDIUM')
+        self.assertEqual(create('Ragging in hostel'), 'LOW')  # inactive rule
+        # Saving a rule drops the cached classifier once it commits
+        rule = PriorityRule.objects.get(pattern='ragging')
+        rule.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.save()
+        self.assertEqual(create('Ragging in hostel'), 'HIGH')
+
+    def test_reclassify_command(self):
+        leak = Grievance.objects.create(submitted_by=self.student, title='Leak in tap', description='x')
+        fire = Grievance.objects.create(submitted_by=self.student, title='Fire alarm beeps', description='x', priority='MEDIUM')
+        done = Grievance.objects.create(submitted_by=self.student, title='Fire drill', description='x', status='RESOLVED')
+        plain = Grievance.objects.create(submitted_by=self.student, title='Fan noise', description='x')
+
+        out = StringIO()
+        call_command('reclassify_grievances', '--dry-run', stdout=out)
+        self.assertIn('would change 2', out.getvalue())
+        self.assertEqual(Grievance.objects.get(pk=leak.pk).priority, 'LOW')
+
+        out = StringIO()
+        call_command('reclassify_grievances', '--batch-size', '1', stdout=out)
+        self.assertIn('Scanned 3 grievance(s); changed 2.', out.getvalue())
+        self.assertIn('LOW -> MEDIUM: 1', out.getvalue())
+        priorities = dict(Grievance.objects.values_list('id', 'priority'))
+        self.assertEqual(
+            [priorities[g.id] for g in (leak, fire, done, plain)], ['MEDIUM', 'HIGH', 'LOW', 'LOW']
+        )
+        self.assertCountersMatchTable()
+
+        call_command('reclassify_grievances', '--include-resolved', stdout=StringIO())
+        self.assertEqual(Grievance.objects.get(pk=done.pk).priority, 'HIGH')
@@ -5,6 +5,7 @@ from .views import (
     ChangePasswordView, ConversationViewSet, RequestPasswordResetAPI, 
     PasswordResetConfirmAPI
 )
+from .metrics import metrics_view
 
 router = DefaultRouter()
 # Ensure base_name is specified if queryset is dynamic or not set on the viewset
@@ -23,6 +24,8 @@ urlpatterns = [
 
     # Health check
     path('health/', HealthCheckAPI.as_view(), name='health_check'),
+    # Prometheus scrape target (api.metrics)
+    path('metrics', metrics_view, name='metrics'),
 
     # Authentication
     path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -1,50 +1,25 @@
-import os
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+import logging
+
 from googleapiclient.http import MediaFileUpload
 from googleapiclient.errors import HttpError
-from dotenv import load_dotenv
 
-load_dotenv()
+# One client per thread, built from the bundled discovery document
+from api.google_drive_utils import PARENT_ID, get_drive_service, upload_media
 
-SCOPES = ['https://www.googleapis.com/auth/drive']
-CLIENT_ID = os.environ.get('CLIENT_ID')
-CLIENT_SECRET = os.environ.get('CLIENT_SECRET')
-REFRESH_TOKEN = os.environ.get('REFRESH_TOKEN')
-PARENT_ID = os.environ.get('FOLDER_ID')
+logger = logging.getLogger(__name__)
 
-def get_drive_service():
-    creds = Credentials.from_authorized_user_info(
-        info={
-            'client_id': CLIENT_ID,
-            'client_secret': CLIENT_SECRET,
-            'refresh_token': REFRESH_TOKEN,
-            'token_uri': 'https://oauth2.googleapis.com/token'
-        },
-        scopes=SCOPES
-    )
-    try:
-        return build('drive', 'v3', credentials=creds)
-    except HttpError as error:
-        print(f'Google Drive error: {error}')
-        return None
-
-def upload_file_to_drive(file_path, filename):
-    service = get_drive_service()
-    if not service:
-        return None
 
+def upload_file_to_drive(file_path, filename, mimetype='application/pdf'):
     try:
-        file_metadata = {'name': filename, 'parents': [PARENT_ID]}
-        media = MediaFileUpload(file_path, mimetype='application/pdf')
-        file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-        return file.get('id')
+        # Streamed from disk in resumable chunks rather than read into memory
+        media = MediaFileUpload(file_path, mimetype=mimetype, resumable=True)
+        file = upload_media(media, filename, parent_id=PARENT_ID)
+        return file.get('id') if file else None
     except HttpError as error:
-        print(f'Upload error: {error}')
+        logger.error('Upload error: %s', error)
+        return None
+    except Exception as e:
+        logger.error('Unexpected upload error: %s', e)
         return None
 
 def generate_public_url(file_id):
@@ -55,7 +30,8 @@ def generate_public_url(file_id):
     try:
         service.permissions().create(
             fileId=file_id,
-            body={'role': 'reader', 'type': 'anyone'}
+            body={'role': 'reader', 'type': 'anyone'},
+            fields='id',
         ).execute()
         file = service.files().get(
             fileId=file_id,
@@ -66,5 +42,5 @@ def generate_public_url(file_id):
             'download_url': file.get('webContentLink')
         }
     except HttpError as error:
-        print(f'Permission error: {error}')
-        return None
\ No newline at end of file
+        logger.error('Permission error: %s', error)
+        return None
@@ -1,5 +1,8 @@
+import logging
+from collections import Counter
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
@@ -8,44 +11,91 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework_simplejwt.views import TokenObtainPairView
-from .models import CustomUser, Grievance, GrievanceComment, Conversation
+from .models import (
+    CustomUser, Grievance, GrievanceComment, Conversation, ChatMessage, ConversationReadCursor, GrievanceStatCounter,
+)
+from .exports import EXPORT_FORMATS, export_response
+from .mail_queue import enqueue_email, enqueue_emails
+from .pagination import ChatMessagePagination, GrievanceCursorPagination
 from .permissions import IsAdminOrGrievanceCell, IsOwner
+from .presence import online_user_ids
+from .priority import classify_priority
+from .query_plans import (
+    conversation_inbox_queryset, grievance_detail_queryset, grievance_write_queryset,
+)
+from .search import search_grievances
 from .serializers import (
     GrievanceSerializer, GrievanceCommentSerializer, MyTokenObtainPairSerializer,
-    GrievanceStatusSerializer, UserSerializer, AdminUserCreateSerializer,
-    ChangePasswordSerializer, ConversationSerializer, UserProfileUpdateSerializer
+    GrievanceStatusSerializer, GrievanceBulkStatusSerializer, UserSerializer, AdminUserCreateSerializer,
+    ChangePasswordSerializer, ConversationSerializer, ChatMessageSerializer, UserProfileUpdateSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+
+def status_update_email(name, title, grievance_id, new_status):
+    """Subject and body of the email sent to a submitter when their grievance changes status."""
+    subject = f"Update on Grievance #{grievance_id}: Status Changed"
+    message = (
+        f"Hi {name},\n\n"
+        f"The status of your grievance titled '{title}' (ID: #{grievance_id}) "
+        f"has been updated to: {new_status}.\n\n"
+        f"Please check the portal for further details.\n\n"
+        f"Regards,\nGrievance Portal Team"
+    )
+    return subject, message
+
+
 # -------------------------------------------------------------------
 # GRIEVANCE VIEWSET
 # -------------------------------------------------------------------
 class GrievanceViewSet(viewsets.ModelViewSet):
     serializer_class = GrievanceSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
+    pagination_class = GrievanceCursorPagination
+
+    @property
+    def pagination_ordering(self):
+        # Search results are paged by relevance; everything else newest first
+        if self.request.query_params.get('search'):
+            return ('-search_rank', '-id')
+        return None
 
     def get_queryset(self):
         user = self.request.user
-        queryset = Grievance.objects.all()
+        # Reads serialize the full grievance (users + comments); the write
+        # actions only need the users for their notification emails.
+        if self.action in ['list', 'retrieve', 'export']:
+            queryset = grievance_detail_queryset()
+        else:
+            queryset = grievance_write_queryset()
 
         if user.role not in ['admin', 'grievance_cell']:
             queryset = queryset.filter(submitted_by=user)
 
         status_filter = self.request.query_params.get('status_filter')
         if status_filter == 'unresolved':
-            queryset = queryset.filter(status__in=['SUBMITTED', 'PENDING'])
+            queryset = queryset.filter(is_unresolved=True)
         elif status_filter == 'resolved':
             queryset = queryset.filter(status='RESOLVED')
         elif status_filter == 'in_progress':
             queryset = queryset.filter(status='IN_PROGRESS')
 
-        return queryset.order_by('-created_at')
+        # ?search= full-text matches on title/description, best matches first
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = search_grievances(queryset, search)
+            return queryset.order_by('-search_rank', '-id')
+
+        # (created_at, id) is unique, so pages stay stable under concurrent inserts
+        return queryset.order_by('-created_at', '-id')
 
     def perform_create(self, serializer):
-        title = serializer.validated_data.get('title', '').lower()
-        priority = 'LOW'
-        high_priority_keywords = ['urgent', 'emergency', 'harassment', 'threat', 'safety', 'abuse', 'immediate']
-        if any(keyword in title for keyword in high_priority_keywords):
-            priority = 'HIGH'
+        # Keyword/phrase rules are edited in the admin (PriorityRule)
+        priority = classify_priority(
+            serializer.validated_data.get('title', ''),
+            serializer.validated_data.get('description', '')
+        )
 
         default_status = 'SUBMITTED'
         grievance = serializer.save(
@@ -64,30 +114,19 @@ class GrievanceViewSet(viewsets.ModelViewSet):
             f"We will review your submission and provide updates.\n\n"
             f"Regards,\nGrievance Portal Team"
         )
-        try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[self.request.user.college_email],
-                fail_silently=False
-            )
-        except Exception as e:
-            print(f"Error sending email for grievance #{grievance.id}: {e}")
+        # Queued in the outbox; the mail worker sends it after this request commits
+        enqueue_email(subject, message, [self.request.user.college_email])
 
     @action(detail=False, methods=['get'], permission_classes=[IsAdminOrGrievanceCell])
     def stats(self, request):
-        user = request.user  # ✅ FIX: define user
-        queryset = Grievance.objects.all()
-
-        if user.role not in ['admin', 'grievance_cell']:
-            queryset = queryset.filter(submitted_by=user)
-
-        total = queryset.count()
-        resolved = queryset.filter(status='RESOLVED').count()
-        pending_count = queryset.filter(status__in=['SUBMITTED', 'PENDING']).count()
-        in_progress_count = queryset.filter(status='IN_PROGRESS').count()
-        action_taken_count = queryset.filter(status='ACTION_TAKEN').count()
+        # Whole-table totals (the action is staff only) come from the maintained
+        # counters, so this is a read of a handful of rows however many grievances exist.
+        counts = GrievanceStatCounter.objects.status_totals()
+        total = counts['total']
+        resolved = counts['RESOLVED']
+        pending_count = sum(counts[value] for value in Grievance.UNRESOLVED_STATUSES)
+        in_progress_count = counts['IN_PROGRESS']
+        action_taken_count = counts['ACTION_TAKEN']
 
         return Response({
             'total_grievances': total,
@@ -114,28 +153,85 @@ class GrievanceViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             updated_grievance = serializer.save()
 
-            subject = f"Update on Grievance #{updated_grievance.id}: Status Changed"
-            message = (
-                f"Hi {updated_grievance.submitted_by.name},\n\n"
-                f"The status of your grievance titled '{updated_grievance.title}' (ID: #{updated_grievance.id}) "
-                f"has been updated to: {updated_grievance.status}.\n\n"
-                f"Please check the portal for further details.\n\n"
-                f"Regards,\nGrievance Portal Team"
+            subject, message = status_update_email(
+                updated_grievance.submitted_by.name, updated_grievance.title,
+                updated_grievance.id, updated_grievance.status
             )
-            try:
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.EMAIL_HOST_USER,
-                    recipient_list=[updated_grievance.submitted_by.college_email],
-                    fail_silently=False
-                )
-            except Exception as e:
-                print(f"Error sending status update email for grievance #{updated_grievance.id}: {e}")
+            enqueue_email(subject, message, [updated_grievance.submitted_by.college_email])
 
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminOrGrievanceCell])
+    def export(self, request):
+        """
+        Stream every grievance matching the usual filters (e.g. ?status_filter=)
+        as CSV or NDJSON: ?file_format=csv|ndjson. Rows are read in chunks from
+        a server-side cursor, so memory stays flat regardless of export size.
+        """
+        export_format = request.query_params.get('file_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported file_format. Choose one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return export_response(
+            request._request, self.get_queryset(), export_format,
+            chunk_size=settings.GRIEVANCE_EXPORT_CHUNK_SIZE
+        )
+
+    @action(detail=False, methods=['post'], url_path='bulk_update_status', permission_classes=[IsAdminOrGrievanceCell])
+    def bulk_update_status(self, request):
+        """
+        Move many grievances to one status with a single UPDATE and queue all
+        notification emails together. Every requested id gets a result entry
+        ('updated', 'unchanged' or 'not_found') so partial failures are visible.
+        """
+        serializer = GrievanceBulkStatusSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))  # de-duplicate, keep order
+        new_status = serializer.validated_data['status']
+
+        with transaction.atomic():
+            rows = {
+                row['id']: row
+                for row in Grievance.objects.select_for_update(of=('self',)).filter(id__in=ids).values(
+                    'id', 'title', 'status', 'priority', 'submitted_by__name', 'submitted_by__college_email'
+                )
+            }
+            changing = [row for row in rows.values() if row['status'] != new_status]
+            if changing:
+                Grievance.objects.filter(id__in=[row['id'] for row in changing]).update(
+                    status=new_status, updated_at=timezone.now()
+                )
+                # queryset.update() bypasses Grievance.save(), so move the counters here
+                deltas = Counter()
+                for row in changing:
+                    deltas[(row['status'], row['priority'])] -= 1
+                    deltas[(new_status, row['priority'])] += 1
+                GrievanceStatCounter.objects.adjust_many(deltas)
+                enqueue_emails([
+                    (*status_update_email(row['submitted_by__name'], row['title'], row['id'], new_status),
+                     [row['submitted_by__college_email']])
+                    for row in changing
+                ])
+
+        results = []
+        for grievance_id in ids:
+            row = rows.get(grievance_id)
+            if row is None:
+                results.append({'id': grievance_id, 'result': 'not_found'})
+            elif row['status'] == new_status:
+                results.append({'id': grievance_id, 'result': 'unchanged', 'status': new_status})
+            else:
+                results.append({'id': grievance_id, 'result': 'updated', 'previous_status': row['status'], 'status': new_status})
+        return Response({
+            'status': new_status,
+            'updated': len(changing),
+            'results': results,
+        })
+
 
 # -------------------------------------------------------------------
 # USER VIEWSET
@@ -209,11 +305,48 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        # Conversations carry metadata only (last message preview, unread
+        # count); history comes from messages() below.
         if user.role in ['admin', 'grievance_cell']:
-            return Conversation.objects.all().order_by('-created_at')
+            return conversation_inbox_queryset(user)
         else:
             Conversation.objects.get_or_create(user=user)
-            return Conversation.objects.filter(user=user)
+            return conversation_inbox_queryset(user, Conversation.objects.filter(user=user))
+
+    def list(self, request, *args, **kwargs):
+        conversations = list(self.filter_queryset(self.get_queryset()))
+        # One presence lookup for the whole inbox rather than one per row
+        context = self.get_serializer_context()
+        context['online_user_ids'] = online_user_ids(c.user_id for c in conversations)
+        return Response(self.get_serializer(conversations, many=True, context=context).data)
+
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """Newest-first page of one conversation's messages (?before= / ?after= cursors)."""
+        conversation = self.get_object()
+        queryset = ChatMessage.objects.filter(conversation=conversation).select_related('user')
+        paginator = ChatMessagePagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = ChatMessageSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """Mark the conversation read up to `message_id` (default: its newest message)."""
+        conversation = self.get_object()
+        messages = ChatMessage.objects.filter(conversation=conversation)
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message = messages.get(id=int(message_id))
+            except (TypeError, ValueError, ChatMessage.DoesNotExist):
+                return Response({'error': 'Message not found in this conversation.'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            message = messages.order_by('-timestamp', '-id').first()
+        if message is not None:
+            ConversationReadCursor.objects.advance(request.user, conversation.id, message)
+        # Re-read so the response carries the new unread_count
+        return Response(self.get_serializer(self.get_queryset().get(pk=conversation.pk)).data)
 
 
 # -------------------------------------------------------------------
@@ -274,9 +407,9 @@ class RequestPasswordResetAPI(APIView):
                     f'If you did not request this, please ignore this email.\n\n'
                     f'Regards,\nGrievance Portal Team'
                 )
-                send_mail(subject, message, settings.EMAIL_HOST_USER, [user.college_email], fail_silently=False)
-        except Exception as e:
-            print(f"Error during password reset request for {email}: {e}")
+                enqueue_email(subject, message, [user.college_email])
+        except Exception:
+            logger.exception("Error during password reset request for %s", email)
 
         return Response({'message': 'If an account with that email exists, a password reset link has been sent.'}, status=status.HTTP_200_OK)
 
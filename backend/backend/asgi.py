@@ -8,6 +8,8 @@ from django.core.asgi import get_asgi_application
 # --- Crucial Setup ---
 # 1. Set the Django settings module environment variable
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# This process serves requests, so it runs the outbound email worker
+os.environ.setdefault('EMAIL_QUEUE_START_WORKER', 'True')
 
 # 2. Configure Django settings and populate the app registry.
 #    This MUST run before importing anything that relies on Django models/settings.
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
 ]
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware', # request latency and query counts (first, to time everything)
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -32,6 +33,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.profiling.ProfilingMiddleware', # X-Profile: 1 from an admin, or PROFILING_SAMPLE_RATE
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -94,6 +96,34 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # -----------------------------------------------
 
+# Uploads are stored under their sha256 (api.storage) so identical files are
+# kept once, and served by api.media (signed URLs, private caching for one MEDIA_URL_TTL).
+# In production set MEDIA_SERVE_MODE to 'x-accel-redirect' (nginx, with an
+# internal location at MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT) or
+# 'x-sendfile' so the proxy sends the bytes. STATICFILES_STORAGE above is not read by this Django version;
+# staticfiles keeps its current default backend.
+STORAGES = {
+    'default': {'BACKEND': 'api.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_SERVE_MODE = os.environ.get('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+# Media URLs from the API are signed (api.media) and stay valid for between
+# MEDIA_URL_TTL and twice that; admins can also fetch media with their JWT.
+MEDIA_URL_TTL = int(os.environ.get('MEDIA_URL_TTL', 6 * 3600))
+
+# Uploaded image processing (api.images): originals are re-encoded without
+# metadata and capped in size; thumbnails/previews are generated as WebP.
+IMAGE_PROCESSING_ASYNC = True
+IMAGE_PROCESSING_WORKERS = 2
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_DIMENSION = 2560
+IMAGE_RENDITION_QUALITY = 80
+IMAGE_RENDITIONS = {
+    'thumbnail': {'size': (160, 160), 'crop': True},
+    'preview': {'size': (1024, 1024), 'crop': False},
+}
+
 if DEBUG:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 else:
@@ -104,6 +134,21 @@ else:
     EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
     EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 
+# Outbound email queue (api.mail_queue). Requests only write to the outbox;
+# an in-process worker thread sends batches over one SMTP connection. It
+# starts with each server process and picks up rows left by earlier ones.
+# Set EMAIL_QUEUE_WORKER=False to run `manage.py process_email_queue` instead.
+EMAIL_QUEUE_WORKER_ENABLED = os.environ.get('EMAIL_QUEUE_WORKER', 'True') == 'True'
+# Start the worker when the app loads. backend/asgi.py and backend/wsgi.py
+# turn this on for server processes; runserver starts it on its own.
+EMAIL_QUEUE_START_WORKER = os.environ.get('EMAIL_QUEUE_START_WORKER') == 'True'
+EMAIL_QUEUE_BATCH_SIZE = 50
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_BACKOFF_SECONDS = 30
+EMAIL_QUEUE_MAX_BACKOFF_SECONDS = 3600
+EMAIL_QUEUE_LEASE_SECONDS = 300
+EMAIL_QUEUE_POLL_SECONDS = 30
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'api.CustomUser'
 REST_FRAMEWORK = {
@@ -113,4 +158,119 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-}
\ No newline at end of file
+}
+
+# Keyset pagination for the grievance list (?page_size= is capped at the max)
+GRIEVANCE_PAGE_SIZE = int(os.environ.get('GRIEVANCE_PAGE_SIZE', 50))
+GRIEVANCE_MAX_PAGE_SIZE = int(os.environ.get('GRIEVANCE_MAX_PAGE_SIZE', 200))
+# Messages per page of /api/conversations/{id}/messages/ (before/after cursors)
+CHAT_PAGE_SIZE = int(os.environ.get('CHAT_PAGE_SIZE', 50))
+CHAT_MAX_PAGE_SIZE = int(os.environ.get('CHAT_MAX_PAGE_SIZE', 200))
+# Rows fetched per server-side cursor round trip by /api/grievances/export/
+GRIEVANCE_EXPORT_CHUNK_SIZE = 500
+# How often a process checks whether PriorityRule rows changed elsewhere
+PRIORITY_RULES_RECHECK_SECONDS = 30
+# Google Drive uploads (api.google_drive_utils). For testing, point the endpoint
+# (e.g. https://127.0.0.1:8443/drive/v3/) and token URI at a local fake server;
+# uploads always use https, so trust its certificate with HTTPLIB2_CA_CERTS.
+# Leave both unset in production.
+GOOGLE_DRIVE_API_ENDPOINT = os.environ.get('GOOGLE_DRIVE_API_ENDPOINT') or None
+GOOGLE_DRIVE_TOKEN_URI = os.environ.get('GOOGLE_DRIVE_TOKEN_URI', 'https://oauth2.googleapis.com/token')
+# Uploads in flight at once per process (api.google_drive_utils.upload_many)
+GOOGLE_DRIVE_UPLOAD_WORKERS = int(os.environ.get('GOOGLE_DRIVE_UPLOAD_WORKERS', 4))
+GOOGLE_DRIVE_CHUNK_SIZE = 8 * 1024 * 1024
+# Set to False when FOLDER_ID is already shared with "anyone with the link"
+GOOGLE_DRIVE_SET_PUBLIC_PERMISSION = os.environ.get('GOOGLE_DRIVE_SET_PUBLIC_PERMISSION', 'True') == 'True'
+
+# Chat write-behind (api.chat_persistence): broadcast first, then insert
+# messages with one bulk_create per CHAT_FLUSH_INTERVAL_MS / CHAT_FLUSH_MAX_BATCH
+# window. Failed batches are spooled to CHAT_SPOOL_DIR and replayed. On SQLite
+# only enable it with a single server process (ids come from a local counter).
+CHAT_WRITE_BEHIND = os.environ.get('CHAT_WRITE_BEHIND', 'False') == 'True'
+CHAT_FLUSH_INTERVAL_MS = int(os.environ.get('CHAT_FLUSH_INTERVAL_MS', 50))
+CHAT_FLUSH_MAX_BATCH = int(os.environ.get('CHAT_FLUSH_MAX_BATCH', 200))
+CHAT_ID_BLOCK_SIZE = 100
+CHAT_SPOOL_DIR = os.environ.get('CHAT_SPOOL_DIR', os.path.join(BASE_DIR, 'chat_spool'))
+
+# WebSocket handshakes (api.middleware): users are cached per process for
+# WS_USER_CACHE_TTL seconds. WS_AUTH_USE_TOKEN_CLAIMS builds the user from the
+# JWT's role/name claims instead and skips the database entirely (role changes
+# then apply when the access token expires).
+WS_USER_CACHE_TTL = int(os.environ.get('WS_USER_CACHE_TTL', 30))
+WS_USER_CACHE_MAX_ENTRIES = 10000
+WS_AUTH_USE_TOKEN_CLAIMS = os.environ.get('WS_AUTH_USE_TOKEN_CLAIMS', 'False') == 'True'
+
+# Presence (api.presence): sockets expire PRESENCE_TTL seconds after their last
+# heartbeat (clients send one every 30s). 'auto' uses the channel layer's Redis,
+# or process memory with InMemoryChannelLayer. Offline students get chat
+# messages by email, at most once per PRESENCE_EMAIL_COOLDOWN seconds.
+PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND', 'auto')
+PRESENCE_REDIS_URL = os.environ.get('PRESENCE_REDIS_URL') or None
+PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', 90))
+PRESENCE_EMAIL_COOLDOWN = int(os.environ.get('PRESENCE_EMAIL_COOLDOWN', 900))
+
+# Chat notifications for one conversation are merged over this window and
+# pushed once with a count (api.notifications); 0 pushes every message.
+NOTIFICATION_COALESCE_WINDOW_MS = int(os.environ.get('NOTIFICATION_COALESCE_WINDOW_MS', 2000))
+
+# NotificationLog (missed-event replay on reconnect): at most this many events
+# are replayed per stream before the client is told to refetch instead, and
+# prune_notifications deletes entries older than the retention period.
+NOTIFICATION_REPLAY_LIMIT = 200
+NOTIFICATION_LOG_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_LOG_RETENTION_DAYS', 7))
+
+# Chat sockets opened with ?batch=1 get broadcasts as JSON array frames, held
+# for up to CHAT_BATCH_WINDOW_MS or CHAT_BATCH_MAX_EVENTS events.
+CHAT_BATCH_WINDOW_MS = int(os.environ.get('CHAT_BATCH_WINDOW_MS', 5))
+CHAT_BATCH_MAX_EVENTS = 50
+
+# Metrics (api.metrics): Prometheus text format at /api/metrics. Scrapers
+# send "Authorization: Bearer <METRICS_TOKEN>"; with no token set the
+# endpoint answers 403 unless DEBUG is on.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Logging (api.log). Per-connection and per-message WebSocket detail is logged
+# at DEBUG: set LOG_LEVEL=DEBUG to see it, and LOG_SAMPLE_RATE below 1 to keep
+# only that fraction of DEBUG/INFO records. LOG_FORMAT=json writes one JSON
+# object per line.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampled': {
+            '()': 'api.log.SampledFilter',
+            'rate': float(os.environ.get('LOG_SAMPLE_RATE', 1.0)),
+        },
+    },
+    'formatters': {
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'()': 'api.log.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['sampled'],
+            'formatter': os.environ.get('LOG_FORMAT', 'text'),
+        },
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False},
+        'django': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Request profiling (api.profiling): admins send "X-Profile: 1" to profile a
+# request, or set PROFILING_SAMPLE_RATE to profile that fraction of all
+# requests. Totals come back in Server-Timing; full profiles (slowest queries
+# with their call site) go to PROFILING_LOG_PATH. See summarize_profiles.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True') == 'True'
+PROFILING_HEADER = 'X-Profile'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.0))
+PROFILING_TOP_QUERIES = 5
+PROFILING_SLOW_QUERY_MS = int(os.environ.get('PROFILING_SLOW_QUERY_MS', 100))
+PROFILING_LOG_PATH = os.environ.get('PROFILING_LOG_PATH', os.path.join(BASE_DIR, 'profiles', 'profiles.jsonl'))
+PROFILING_LOG_MAX_BYTES = 10 * 1024 * 1024
+PROFILING_LOG_BACKUPS = 5
@@ -1,14 +1,17 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from api.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
 ]
 
-# --- THIS IS THE SECOND PART OF THE FIX FOR BROKEN IMAGES ---
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-# -----------------------------------------------------------
\ No newline at end of file
+# Uploaded media, in every environment: signed URLs or a staff JWT only,
+# private caching and Range support, or a hand-off to the front proxy (see
+# MEDIA_SERVE_MODE).
+urlpatterns += [
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+]
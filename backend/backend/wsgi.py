@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# This process serves requests, so it runs the outbound email worker
+os.environ.setdefault('EMAIL_QUEUE_START_WORKER', 'True')
 
 application = get_wsgi_application()
@@ -0,0 +1,69 @@
+// frontend/src/api/notifications.js
+import { startHeartbeat } from './presence';
+
+const SEQS_KEY = 'notificationSeqs';
+const MAX_RETRY_DELAY_MS = 30000;
+
+const loadSeqs = () => {
+  try {
+    return JSON.parse(localStorage.getItem(SEQS_KEY)) || {};
+  } catch (e) {
+    return {};
+  }
+};
+
+const saveSeq = (stream, seq) => {
+  const seqs = loadSeqs();
+  if (seq > (seqs[stream] || 0)) {
+    localStorage.setItem(SEQS_KEY, JSON.stringify({ ...seqs, [stream]: seq }));
+  }
+};
+
+/*
+ * Opens the notification socket and keeps it open: reconnects with backoff,
+ * sends heartbeats, and passes the last seen sequence numbers on every
+ * (re)connect so the server replays only what was missed. `onEvent` gets each
+ * notification; `onResync` gets the streams whose gap was too old to replay
+ * (the only case that needs a full refetch). Returns a function that closes it.
+ */
+export const connectNotifications = (url, { onEvent, onResync } = {}) => {
+  let socket = null;
+  let stopHeartbeat = () => {};
+  let retryTimer = null;
+  let attempts = 0;
+  let closed = false;
+
+  const open = () => {
+    const seqs = loadSeqs();
+    const query = Object.entries(seqs).map(([stream, seq]) => `&seq_${stream}=${seq}`).join('');
+    socket = new WebSocket(`${url}${query}`);
+    stopHeartbeat = startHeartbeat(socket);
+
+    socket.onopen = () => { attempts = 0; };
+    socket.onmessage = (e) => {
+      const data = JSON.parse(e.data);
+      if (data.type === 'resume') {
+        Object.entries(data.seqs || {}).forEach(([stream, seq]) => saveSeq(stream, seq));
+        if (data.resync?.length && onResync) onResync(data.resync);
+        return;
+      }
+      if (data.stream && data.seq != null) saveSeq(data.stream, data.seq);
+      if (onEvent) onEvent(data);
+    };
+    socket.onclose = () => {
+      stopHeartbeat();
+      if (closed) return;
+      const delay = Math.min(MAX_RETRY_DELAY_MS, 1000 * 2 ** attempts);
+      attempts += 1;
+      retryTimer = setTimeout(open, delay);
+    };
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    stopHeartbeat();
+    if (socket) socket.close();
+  };
+};
@@ -0,0 +1,15 @@
+// frontend/src/api/presence.js
+
+// The server drops a socket from its presence registry 90s after the last
+// heartbeat, so send one well inside that window.
+export const HEARTBEAT_INTERVAL_MS = 30000;
+
+// Sends {"type": "heartbeat"} while the socket is open; returns a stop function.
+export const startHeartbeat = (socket) => {
+  const timer = setInterval(() => {
+    if (socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ type: 'heartbeat' }));
+    }
+  }, HEARTBEAT_INTERVAL_MS);
+  return () => clearInterval(timer);
+};
@@ -203,7 +203,7 @@ const AdminCellMembersPage = () => {
                                         <TableCell sx={{ p: 1 }}>
                                              <Box sx={{ display: 'flex', alignItems: 'center', gap: 1}}>
                                                 <Avatar
-                                                    src={getFullUrl(member.profile_image)}
+                                                    src={getFullUrl(member.profile_image_thumbnail || member.profile_image)}
                                                     sx={{ width: 40, height: 40 }}
                                                  >
                                                     {!member.profile_image && (member.name || '?').charAt(0).toUpperCase()}
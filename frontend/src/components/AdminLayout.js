@@ -15,13 +15,14 @@ import {
 import { toast } from 'react-toastify';
 import axios from 'axios';
 import GroupIcon from '@mui/icons-material/Group';
+import { connectNotifications } from '../api/notifications';
 const drawerWidth = 240;
 
 const AdminLayout = () => {
     const location = useLocation();
     const navigate = useNavigate();
     const token = localStorage.getItem('accessToken');
-    const ws = useRef(null);
+    const closeNotifications = useRef(null);
     const [notificationCount, setNotificationCount] = useState(0);
     const [anchorEl, setAnchorEl] = useState(null);
     const [profileAnchorEl, setProfileAnchorEl] = useState(null);
@@ -59,29 +60,20 @@ const AdminLayout = () => {
             });
 
             const wsPath = `${wsUrl}/ws/notifications/admin/?token=${token}`;
-            ws.current = new WebSocket(wsPath);
-
-            ws.current.onopen = () => console.log('Admin Notification WebSocket connected');
-            ws.current.onmessage = (event) => {
-                const data = JSON.parse(event.data);
-                console.log('Admin WebSocket message received:', data);
-                if (data.type === 'new_grievance' || data.type === 'grievance_status_update' || data.type === 'new_comment') {
-                   if (isMounted) setNotificationCount(prev => prev + 1);
-                    toast.info(data.payload?.message || 'New activity!');
-                }
-            };
-            ws.current.onclose = (event) => {
-                console.log('Admin Notification WebSocket disconnected:', event.reason);
-            };
-            ws.current.onerror = (error) => {
-                 console.error('Admin WebSocket error:', error);
-            };
+            // Reconnects on its own; missed events are replayed, not refetched
+            closeNotifications.current = connectNotifications(wsPath, {
+                onEvent: (data) => {
+                    console.log('Admin WebSocket message received:', data);
+                    if (data.type === 'new_grievance' || data.type === 'grievance_status_update' || data.type === 'new_comment' || data.type === 'new_chat_message') {
+                       if (isMounted) setNotificationCount(prev => prev + (data.payload?.count || 1)); // merged chat events carry a count
+                        toast.info(data.payload?.message || 'New activity!');
+                    }
+                },
+            });
 
             return () => {
                 isMounted = false;
-                if (ws.current && ws.current.readyState === WebSocket.OPEN) {
-                    ws.current.close();
-                }
+                closeNotifications.current();
             };
         } else {
              if (isMounted) setLoadingProfile(false);
@@ -91,7 +83,7 @@ const AdminLayout = () => {
 
     const handleLogout = () => {
         localStorage.clear();
-        if (ws.current) ws.current.close();
+        if (closeNotifications.current) closeNotifications.current();
         navigate('/login');
     };
 
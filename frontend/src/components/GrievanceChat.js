@@ -1,8 +1,10 @@
 import React, { useState, useEffect, useRef } from 'react';
-// Removed unused imports: useCallback, useParams, Link, axios, Container, Button, List, ListItemAvatar, ListItemText, CircularProgress, Divider
-import { Paper, Box, TextField, ListItem, Avatar, Typography, Alert, IconButton } from '@mui/material';
+import axios from 'axios';
+// Removed unused imports: useCallback, useParams, Link, Container, List, ListItemAvatar, ListItemText, Divider
+import { Paper, Box, TextField, ListItem, Avatar, Typography, Alert, IconButton, Button, CircularProgress } from '@mui/material';
 import SendIcon from '@mui/icons-material/Send';
 import ArrowBackIcon from '@mui/icons-material/ArrowBack';
+import { startHeartbeat } from '../api/presence';
 
 // Helper function to get full image URL (keep this)
 const getFullUrl = (url) => {
@@ -16,7 +18,10 @@ const getFullUrl = (url) => {
 };
 
 const GrievanceChat = ({ conversation, onBack }) => { // Accept conversation and onBack as props
-    const [messages, setMessages] = useState(conversation ? conversation.messages || [] : []);
+    const [messages, setMessages] = useState([]);
+    const [olderUrl, setOlderUrl] = useState(null); // 'next' link of the history endpoint
+    const [loadingHistory, setLoadingHistory] = useState(false);
+    const skipScrollRef = useRef(false); // don't jump to the bottom when older messages are prepended
     const [input, setInput] = useState('');
     const chatSocket = useRef(null);
     const messagesEndRef = useRef(null);
@@ -26,8 +31,45 @@ const GrievanceChat = ({ conversation, onBack }) => { // Accept conversation and
     const [wsError, setWsError] = useState(''); // Keep state for potential *other* errors
 
     const wsUrl = process.env.REACT_APP_WS_URL || 'ws://localhost:8000';
+    const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:8000';
     const token = localStorage.getItem('accessToken');
 
+    // Merge a page of messages (API pages are newest first) into the chronological list
+    const mergeMessages = (prevMessages, incoming) => {
+        const byId = new Map(prevMessages.map((msg) => [msg.id, msg]));
+        incoming.forEach((msg) => byId.set(msg.id, msg));
+        return Array.from(byId.values()).sort((a, b) =>
+            new Date(a.timestamp) - new Date(b.timestamp) || a.id - b.id
+        );
+    };
+
+    // Fetch one page of history: the latest page first, then older pages on demand
+    const fetchHistory = async (url) => {
+        setLoadingHistory(true);
+        try {
+            const res = await axios.get(url, { headers: { Authorization: `Bearer ${token}` } });
+            setMessages((prevMessages) => mergeMessages(prevMessages, res.data.results));
+            setOlderUrl(res.data.next);
+        } catch (err) {
+            console.error('Error fetching chat history:', err);
+        } finally {
+            setLoadingHistory(false);
+        }
+    };
+
+    useEffect(() => {
+        if (!token || !conversationId) return;
+        setMessages([]);
+        fetchHistory(`${apiUrl}/api/conversations/${conversationId}/messages/`);
+        // eslint-disable-next-line react-hooks/exhaustive-deps
+    }, [conversationId, token, apiUrl]);
+
+    const handleLoadOlder = () => {
+        if (!olderUrl || loadingHistory) return;
+        skipScrollRef.current = true;
+        fetchHistory(olderUrl);
+    };
+
     // Scroll to bottom helper
     const scrollToBottom = () => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -44,9 +86,11 @@ const GrievanceChat = ({ conversation, onBack }) => { // Accept conversation and
         // --- Clear error state BEFORE connecting ---
         setWsError(''); // Clear previous errors
 
-        const wsPath = `${wsUrl}/ws/chat/${conversationId}/?token=${token}`;
+        // batch=1: broadcasts arrive as arrays of events, a few ms' worth per frame
+        const wsPath = `${wsUrl}/ws/chat/${conversationId}/?token=${token}&batch=1`;
         console.log("Attempting to connect WebSocket:", wsPath);
         chatSocket.current = new WebSocket(wsPath);
+        const stopHeartbeat = startHeartbeat(chatSocket.current);
 
         chatSocket.current.onopen = () => {
             console.log(`Chat WebSocket connected for conversation ${conversationId}`);
@@ -56,8 +100,11 @@ const GrievanceChat = ({ conversation, onBack }) => { // Accept conversation and
             try {
                 const data = JSON.parse(event.data);
                 console.log('Chat message received:', data);
-                if (data.type === 'chat_message' && data.payload) {
-                    setMessages((prevMessages) => [...prevMessages, data.payload]);
+                if (Array.isArray(data)) {
+                    const payloads = data.filter((item) => item.type === 'chat_message' && item.payload).map((item) => item.payload);
+                    setMessages((prevMessages) => mergeMessages(prevMessages, payloads));
+                } else if (data.type === 'chat_message' && data.payload) {
+                    setMessages((prevMessages) => mergeMessages(prevMessages, [data.payload]));
                 } else if (data.type === 'error') {
                     console.error("WebSocket error message:", data.message);
                     // Optionally display other types of errors if needed
@@ -89,6 +136,7 @@ const GrievanceChat = ({ conversation, onBack }) => { // Accept conversation and
         };
 
         return () => {
+             stopHeartbeat();
              if (chatSocket.current) {
                  console.log(`Closing WebSocket for conversation ${conversationId}`);
                  chatSocket.current.close();
@@ -98,6 +146,10 @@ const GrievanceChat = ({ conversation, onBack }) => { // Accept conversation and
 
     // Scroll to bottom when new messages arrive
     useEffect(() => {
+        if (skipScrollRef.current) {
+            skipScrollRef.current = false;
+            return;
+        }
         scrollToBottom();
     }, [messages]);
 
@@ -176,6 +228,19 @@ const GrievanceChat = ({ conversation, onBack }) => { // Accept conversation and
                  {wsError && wsError.startsWith("Cannot send") && <Alert severity="error" sx={{ mb: 1 }}>{wsError}</Alert>}
                  {/* --- End Removal --- */}
 
+                {/* Older history is loaded a page at a time */}
+                {(olderUrl || loadingHistory) && (
+                    <Box sx={{ display: 'flex', justifyContent: 'center', mb: 1 }}>
+                        {loadingHistory ? (
+                            <CircularProgress size={20} />
+                        ) : (
+                            <Button size="small" variant="outlined" onClick={handleLoadOlder} sx={{ bgcolor: 'white' }}>
+                                Load earlier messages
+                            </Button>
+                        )}
+                    </Box>
+                )}
+
                 {messages.map((msg, index) => {
                     if (!msg || !msg.user) return null;
                     const isCurrentUser = msg.user.id === currentUser?.id;
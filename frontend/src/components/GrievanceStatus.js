@@ -25,10 +25,18 @@ const GrievanceStatus = () => {
     const fetchGrievances = async () => {
       const token = localStorage.getItem("accessToken");
       try {
-        const response = await axios.get(`${apiUrl}/api/grievances/`, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        setGrievances(response.data);
+        // A student's own list is short, so walk every cursor page up front
+        // and let the DataGrid paginate locally.
+        let url = `${apiUrl}/api/grievances/`;
+        const collected = [];
+        while (url) {
+          const response = await axios.get(url, {
+            headers: { Authorization: `Bearer ${token}` },
+          });
+          collected.push(...response.data.results);
+          url = response.data.next;
+        }
+        setGrievances(collected);
       } catch (err) {
         setError("Failed to fetch grievances.");
         console.error(err);
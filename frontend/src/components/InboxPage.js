@@ -13,6 +13,7 @@ import {
   CircularProgress,
   Alert,
   Box,
+  Badge,
 } from '@mui/material';
 import GrievanceChat from './GrievanceChat';
 
@@ -56,8 +57,27 @@ const InboxPage = () => {
     fetchConversations();
   }, [apiUrl, token]);
 
-  const handleConversationClick = (convo) => {
+  const handleConversationClick = async (convo) => {
     setSelectedConversation(convo);
+    if (!convo.unread_count) return;
+    // Mark read on the server; the response carries the updated summary
+    try {
+      const res = await axios.post(`${apiUrl}/api/conversations/${convo.id}/read/`, {}, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      setConversations((prev) => prev.map((c) => (c.id === convo.id ? res.data : c)));
+    } catch (err) {
+      console.error('Error marking conversation read:', err);
+    }
+  };
+
+  // Short time for today, date otherwise
+  const formatActivity = (timestamp) => {
+    if (!timestamp) return '';
+    const date = new Date(timestamp);
+    return date.toDateString() === new Date().toDateString()
+      ? date.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })
+      : date.toLocaleDateString();
   };
 
   if (loading)
@@ -109,20 +129,35 @@ const InboxPage = () => {
                 sx={{ borderBottom: '1px solid #eee' }}
               >
                 <ListItemAvatar>
-                  <Avatar
-                    alt={convo.user.name || '?'}
-                    src={getFullUrl(convo.user.profile_image)}
+                  {/* Green dot while the student has the portal open */}
+                  <Badge
+                    variant="dot"
+                    color="success"
+                    overlap="circular"
+                    anchorOrigin={{ vertical: 'bottom', horizontal: 'right' }}
+                    invisible={!convo.is_online}
                   >
-                    {!convo.user.profile_image &&
-                      (convo.user.name || '?').charAt(0).toUpperCase()}
-                  </Avatar>
+                    <Avatar
+                      alt={convo.user.name || '?'}
+                      src={getFullUrl(convo.user.profile_image_thumbnail || convo.user.profile_image)}
+                    >
+                      {!convo.user.profile_image &&
+                        (convo.user.name || '?').charAt(0).toUpperCase()}
+                    </Avatar>
+                  </Badge>
                 </ListItemAvatar>
                 <ListItemText
                   primary={convo.user.name || 'Unknown User'}
-                  secondary={convo.user.role?.replace('_', ' ') || 'User'}
-                  primaryTypographyProps={{ noWrap: true }}
+                  secondary={convo.last_message || convo.user.role?.replace('_', ' ') || 'User'}
+                  primaryTypographyProps={{ noWrap: true, fontWeight: convo.unread_count ? 'bold' : 'normal' }}
                   secondaryTypographyProps={{ noWrap: true }}
                 />
+                <Box sx={{ display: 'flex', flexDirection: 'column', alignItems: 'flex-end', ml: 1, flexShrink: 0 }}>
+                  <Typography variant="caption" color="text.secondary">
+                    {formatActivity(convo.last_message_at)}
+                  </Typography>
+                  <Badge badgeContent={convo.unread_count} color="primary" max={99} sx={{ mt: 1.5, mr: 1 }} />
+                </Box>
               </ListItem>
             ))
           ) : (
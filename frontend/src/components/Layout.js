@@ -3,6 +3,7 @@ import { AppBar, Toolbar, Typography, Button, Container, Box, IconButton, Menu,
 import { Link, useNavigate, Outlet } from 'react-router-dom';
 import MenuIcon from '@mui/icons-material/Menu';
 import Chatbot from './Chatbot';
+import { connectNotifications } from '../api/notifications';
 
 const Layout = () => {
     const navigate = useNavigate();
@@ -30,22 +31,23 @@ const Layout = () => {
             const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
             const wsHost = process.env.REACT_APP_API_URL ? new URL(process.env.REACT_APP_API_URL).host : 'localhost:8000';
             const wsUrl = `${protocol}://${wsHost}/ws/notifications/?token=${token}`;
-            const notificationSocket = new WebSocket(wsUrl);
-
-            notificationSocket.onmessage = (e) => {
-                const data = JSON.parse(e.data);
-                if (data.type === 'profile_updated') {
-                    // This handles the real-time update from the database signal
-                    loadUser();
-                } else {
-                    setNotificationCount(prev => prev + 1);
-                }
-            };
-            notificationSocket.onclose = () => console.error('Notification socket closed');
+            // Reconnects on its own and replays anything missed meanwhile
+            const closeNotifications = connectNotifications(wsUrl, {
+                onEvent: (data) => {
+                    if (data.type === 'profile_updated') {
+                        // This handles the real-time update from the database signal
+                        loadUser();
+                    } else {
+                        // Chat notifications are merged server-side and carry a count
+                        setNotificationCount(prev => prev + (data.payload?.count || 1));
+                    }
+                },
+                onResync: () => loadUser(),
+            });
             
             return () => {
                 window.removeEventListener('profileUpdated', handleProfileUpdate);
-                notificationSocket.close();
+                closeNotifications();
             };
         }
 
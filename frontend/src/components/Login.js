@@ -251,7 +251,7 @@ const Login = () => {
                       }}
                     >
                       <Avatar
-                        src={member.profile_image}
+                        src={member.profile_image_thumbnail || member.profile_image}
                         sx={{
                           width: 90,
                           height: 90,
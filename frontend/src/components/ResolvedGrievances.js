@@ -6,11 +6,15 @@ import {
   Paper,
   CircularProgress,
   Alert,
+  Box,
+  Button,
 } from '@mui/material';
 import GrievanceTable from './GrievanceTable'; 
 
 const ResolvedGrievances = () => {
   const [grievances, setGrievances] = useState([]);
+  const [nextUrl, setNextUrl] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const apiUrl = process.env.REACT_APP_API_URL || 'http://localhost:8000';
@@ -28,7 +32,9 @@ const ResolvedGrievances = () => {
         const response = await axios.get(`${apiUrl}/api/grievances/?status_filter=resolved`, {
           headers: { Authorization: `Bearer ${token}` },
         });
-        setGrievances(response.data);
+        // The list is cursor-paginated: { next, previous, results }
+        setGrievances(response.data.results);
+        setNextUrl(response.data.next);
       } catch (err) {
         console.error(err);
         setError('Failed to fetch resolved grievances.');
@@ -39,6 +45,23 @@ const ResolvedGrievances = () => {
     fetchGrievances();
   }, [apiUrl]);
 
+  const loadMore = async () => {
+    if (!nextUrl) return;
+    setLoadingMore(true);
+    try {
+      const token = localStorage.getItem('accessToken');
+      const response = await axios.get(nextUrl, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      setGrievances((prev) => [...prev, ...response.data.results]);
+      setNextUrl(response.data.next);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return (
       <Container sx={{ display: 'flex', justifyContent: 'center', mt: 5 }}>
@@ -66,6 +89,13 @@ const ResolvedGrievances = () => {
         ) : (
           <GrievanceTable grievances={grievances} />
         )}
+        {nextUrl && (
+          <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+            <Button variant="outlined" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </Button>
+          </Box>
+        )}
       </Paper>
     </Container>
   );
@@ -203,7 +203,7 @@ const UserManagementPage = () => {
                                         sx={{ '&:last-child td, &:last-child th': { border: 0 } }}
                                     >
                                         <TableCell sx={{ p: 1}}> {/* Reduced padding */}
-                                            <Avatar src={user.profile_image || undefined} sx={{ width: 32, height: 32 }}>
+                                            <Avatar src={user.profile_image_thumbnail || user.profile_image || undefined} sx={{ width: 32, height: 32 }}>
                                                 {!user.profile_image ? user.name?.charAt(0).toUpperCase() || user.username?.charAt(0).toUpperCase() : null}
                                             </Avatar>
                                         </TableCell>